@@ -1,10 +1,12 @@
 """
 WALL-E AI Language Tutor - VERSION GROQ
-Utilise Groq API (GRATUIT, RAPIDE, ILLIMITÉ)
+Utilise Groq API (GRATUIT, RAPIDE, ILLIMITÉ), avec repli sur un modèle local
 """
 import logging
-from groq import Groq
+from typing import List, Dict, Optional
 from backend.config import settings
+from backend.services.llm_service import llm_router, LLMAuthError, LLMRateLimitError
+from backend.services.context_builder import build_context, truncate_to_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -47,86 +49,127 @@ Toi: "Bonjour! 👋 Je vais très bien, merci! Correction: on dit 'comment vas-t
 """
 }
 
+SUMMARY_PROMPT = """Tu résumes une conversation entre un apprenant et WALL-E, son tuteur de langues.
+Mets à jour le résumé existant avec les nouveaux échanges.
+Conserve: le niveau de l'apprenant, ses erreurs récurrentes, les sujets et règles déjà vus, ses objectifs.
+Maximum 5 phrases, sans salutations. Écris dans la langue de la conversation."""
 
-def call_groq_api(prompt: str, system_prompt: str, context: str = "") -> str:
+# Préfixes des messages de repli renvoyés à l'utilisateur en cas d'échec
+ERROR_PREFIXES = ("❌", "⏱️", "Désolé, je n'ai pas pu")
+
+
+def is_error_answer(text: str) -> bool:
+    """True si la réponse est un message d'erreur (à ne pas mettre en cache)"""
+    return not text or text.startswith(ERROR_PREFIXES)
+
+
+def call_llm(prompt: str, system_prompt: str, context: str = "") -> str:
     """
-    Appelle l'API Groq (GRATUIT)
+    Appelle le LLM via le routeur de fournisseurs (Groq, modèle local)
     
     Args:
         prompt: Question de l'utilisateur
         system_prompt: Instructions système
-        context: Historique de conversation
+        context: Contexte déjà borné en tokens (voir context_builder)
     
     Returns:
         Réponse générée par le modèle
     """
     try:
-        # Vérifier que la clé API est configurée
-        if not settings.GROQ_API_KEY:
-            raise ValueError("GROQ_API_KEY non configurée dans le fichier .env")
-        
-        # Initialiser le client Groq
-        client = Groq(api_key=settings.GROQ_API_KEY)
+        # Vérifier qu'au moins un fournisseur est configuré
+        if not llm_router.available:
+            raise ValueError("Aucun fournisseur LLM configuré (GROQ_API_KEY ou LOCAL_LLM_BASE_URL dans .env)")
         
         # Construire les messages
         messages = [{"role": "system", "content": system_prompt}]
         
-        # Ajouter le contexte si disponible (limité)
+        # Ajouter le contexte si disponible (déjà limité par le budget de tokens)
         if context:
-            context_lines = context.split('\n')[-10:]  # Limiter à 10 dernières lignes
-            limited_context = '\n'.join(context_lines)
             messages.append({
                 "role": "system", 
-                "content": f"Contexte de la conversation:\n{limited_context}"
+                "content": f"Contexte de la conversation:\n{context}"
             })
         
         # Ajouter la question de l'utilisateur
         messages.append({"role": "user", "content": prompt})
         
-        logger.info(f"🤖 Appel Groq API ({settings.GROQ_MODEL})...")
-        
-        # Faire l'appel API
-        response = client.chat.completions.create(
-            model=settings.GROQ_MODEL,
-            messages=messages,
-            temperature=settings.MODEL_TEMPERATURE,
-            max_tokens=settings.MODEL_MAX_TOKENS,
-            top_p=0.9,
-            stream=False
-        )
-        
-        # Extraire la réponse
-        answer = response.choices[0].message.content.strip()
+        result = llm_router.complete(messages)
+        answer = result.text
         
         if not answer:
-            logger.error("❌ Groq a retourné une réponse vide")
+            logger.error(f"❌ {result.provider} a retourné une réponse vide")
             return "Désolé, je n'ai pas pu générer une réponse. Peux-tu reformuler ta question ?"
         
-        logger.info(f"✅ Réponse Groq générée ({len(answer)} caractères)")
+        if result.prompt_tokens is not None:
+            logger.info(
+                f"🧮 Tokens {result.provider}: prompt={result.prompt_tokens} "
+                f"completion={result.completion_tokens}"
+            )
+        
+        logger.info(
+            f"✅ Réponse {result.provider} générée ({len(answer)} caractères, {result.latency:.2f}s)"
+        )
         return answer
     
     except ValueError as e:
         logger.error(f"❌ Configuration error: {e}")
         return f"❌ Erreur de configuration: {str(e)}\n\nObtiens une clé API gratuite sur: https://console.groq.com/"
     
+    except LLMAuthError as e:
+        logger.error(f"❌ LLM authentication error: {e}")
+        return "❌ Clé API Groq invalide. Vérifie ton fichier .env\n\nObtiens une clé gratuite sur: https://console.groq.com/"
+    
+    except LLMRateLimitError as e:
+        # Remonté jusqu'à l'API: 429 + Retry-After plutôt qu'une réponse d'erreur
+        logger.error(f"❌ LLM rate limit: {e}")
+        raise
+    
     except Exception as e:
-        logger.error(f"❌ Groq API error: {e}")
-        error_msg = str(e)
-        
-        # Messages d'erreur plus clairs
-        if "invalid_api_key" in error_msg or "authentication" in error_msg.lower():
-            return "❌ Clé API Groq invalide. Vérifie ton fichier .env\n\nObtiens une clé gratuite sur: https://console.groq.com/"
-        elif "rate_limit" in error_msg.lower():
-            return "⏱️ Limite de requêtes atteinte. Attends quelques secondes et réessaye."
-        else:
-            return f"❌ Erreur Groq: {error_msg}"
+        logger.error(f"❌ LLM error: {e}")
+        return f"❌ Erreur LLM: {str(e)}"
+
+
+def summarize_conversation(previous_summary: str, messages: List[Dict]) -> Optional[str]:
+    """
+    Compresse des anciens tours dans le résumé de session (appelé en arrière-plan)
+    
+    Args:
+        previous_summary: Résumé actuel de la session (peut être vide)
+        messages: Tours à intégrer ({role, content}), du plus ancien au plus récent
+    
+    Returns:
+        Nouveau résumé, ou None en cas d'échec (l'ancien résumé est conservé)
+    """
+    if not llm_router.available or not messages:
+        return None
+    
+    transcript = "\n".join(
+        f"{m['role']}: {truncate_to_tokens(m['content'], settings.CONTEXT_MAX_ITEM_TOKENS)}"
+        for m in messages
+    )
+    content = f"Résumé existant:\n{previous_summary or '(aucun)'}\n\nNouveaux échanges:\n{transcript}"
+    
+    try:
+        result = llm_router.complete(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": content}
+            ],
+            max_tokens=settings.SUMMARY_MAX_TOKENS,
+            temperature=0.3
+        )
+        return result.text or None
+    except Exception as e:
+        logger.error(f"❌ Résumé LLM échoué: {e}")
+        return None
 
 
 def run_teaching_crew(
     query: str,
     language: str = "es",
-    memory_context: str = "",
-    research_context: str = ""
+    history: Optional[List[Dict]] = None,
+    research_context: str = "",
+    summary: str = ""
 ) -> str:
     """
     Traite la requête de l'utilisateur avec Groq
@@ -134,8 +177,9 @@ def run_teaching_crew(
     Args:
         query: Question de l'utilisateur
         language: Code de langue (es, en, fr)
-        memory_context: Historique de conversation
-        research_context: Contexte RAG (optionnel)
+        history: Messages de la conversation ({role, content}), du plus ancien au plus récent
+        research_context: Contexte RAG (optionnel, extraits séparés par une ligne vide)
+        summary: Résumé des anciens tours de la session (optionnel)
     
     Returns:
         Réponse du tuteur
@@ -145,21 +189,24 @@ def run_teaching_crew(
     # Obtenir le prompt système selon la langue
     system_prompt = SYSTEM_PROMPTS.get(language, SYSTEM_PROMPTS["es"])
     
-    # Construire le contexte combiné
-    combined_context = ""
-    
-    if memory_context:
-        combined_context += memory_context
-    
-    if research_context:
-        # Limiter le contexte RAG
-        combined_context += f"\n\nINFO ADDITIONNELLE:\n{research_context[:500]}"
+    # Construire le contexte combiné dans le budget de tokens
+    built = build_context(
+        history=history,
+        research_context=research_context,
+        query=query,
+        summary=summary
+    )
+    logger.info(
+        f"🧮 Contexte: {built.tokens}/{settings.CONTEXT_TOKEN_BUDGET} tokens "
+        f"(récents={built.sections['recent']}, résumé={built.sections['summary']}, rag={built.sections['rag']}, "
+        f"anciens={built.sections['older']})"
+    )
     
-    # Appeler Groq et obtenir la réponse
-    response = call_groq_api(
+    # Appeler le LLM et obtenir la réponse
+    response = call_llm(
         prompt=query,
         system_prompt=system_prompt,
-        context=combined_context
+        context=built.text
     )
     
     logger.info("✅ Réponse générée avec succès")
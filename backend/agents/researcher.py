@@ -1,86 +1,122 @@
-import requests
+import time
 import logging
-from langchain.agents import initialize_agent, AgentType
-from langchain.tools import Tool
-from langchain_community.chat_models import ChatOllama
-from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+import threading
 from backend.config import settings
+from backend.services.http_service import http_service
 
 logger = logging.getLogger(__name__)
 
-# === 1️⃣ Modèle ChatOllama sur CPU ===
-llm = ChatOllama(
-    model=settings.OLLAMA_MODEL,  # par ex. "gemma:2b" pour modèle léger
-    device="cpu",
-    gpu=False,
-    base_url=settings.OLLAMA_BASE_URL,
-    temperature=0.5
-)
+# L'agent (LangChain + ChatOllama) est construit au premier appel, puis réutilisé:
+# importer ce module ne coûte rien et ne touche pas au réseau.
+_agent = None
+_agent_error = None
+_agent_lock = threading.Lock()
 
-# === 2️⃣ Outil de recherche Web ===
-def web_search(query: str) -> str:
-    """Recherche rapide sur DuckDuckGo."""
-    try:
-        r = requests.get(f"https://api.duckduckgo.com/?q={query}&format=json")
-        data = r.json()
-        return data.get("AbstractText") or "Aucune information pertinente trouvée."
-    except Exception as e:
-        logger.error(f"Erreur de recherche : {e}")
-        return f"Erreur de recherche : {e}"
-
-tools = [
-    Tool(
-        name="Web Search",
-        func=web_search,
-        description="Recherche des informations pertinentes pour l'apprentissage des langues."
-    )
-]
-
-# === 3️⃣ Prompt system détaillé (backstory) ===
-system_prompt = SystemMessagePromptTemplate.from_template(
-    """Tu es un expert linguistique et polyglotte spécialisé dans l'enseignement des langues.
+# === Prompt system détaillé (backstory) ===
+SYSTEM_MESSAGE = """Tu es un expert linguistique et polyglotte spécialisé dans l'enseignement des langues.
 Tu excelles à :
 - Trouver des explications claires de règles grammaticales et vocabulaire
 - Fournir des exemples pratiques et des contextes culturels
 - Prioriser les explications accessibles aux débutants
 - Produire des résumés structurés et clairs pour aider l’apprenant"""
-)
 
-# === 4️⃣ Prompt complet pour l'agent ===
-prompt = ChatPromptTemplate.from_messages([
-    system_prompt,
-    HumanMessagePromptTemplate.from_template(
-        """Requête : {input_text}
+INPUT_TEMPLATE = """Requête : {query}
+Contexte disponible : {context}
 
 Utilise les informations de recherche disponibles et fournis :
 - Règles grammaticales importantes
 - Définitions et vocabulaire
 - Exemples pratiques
 - Contexte culturel pertinent"""
+
+
+# === Outil de recherche Web ===
+def web_search(query: str) -> str:
+    """Recherche rapide sur DuckDuckGo (HTTP partagé, timeout borné, cache)."""
+    try:
+        data = http_service.get_json(
+            settings.SEARCH_DDG_API_URL,
+            params={"q": query, "format": "json", "no_html": 1, "skip_disambig": 1},
+            timeout=settings.RESEARCH_TOOL_TIMEOUT_SECONDS
+        )
+        return data.get("AbstractText") or "Aucune information pertinente trouvée."
+    except Exception as e:
+        logger.error(f"Erreur de recherche : {e}")
+        return f"Erreur de recherche : {e}"
+
+
+def _build_agent():
+    """Construit l'agent LangChain (imports lourds faits ici seulement)"""
+    from langchain.agents import initialize_agent, AgentType
+    from langchain.tools import Tool
+    from langchain_community.chat_models import ChatOllama
+
+    # Modèle ChatOllama sur CPU
+    llm = ChatOllama(
+        model=settings.LOCAL_LLM_MODEL,  # par ex. "gemma:2b" pour modèle léger
+        device="cpu",
+        gpu=False,
+        base_url=(settings.LOCAL_LLM_BASE_URL or "http://localhost:11434").rstrip("/").removesuffix("/v1"),
+        temperature=0.5
     )
-])
-
-# === 5️⃣ Création de l'agent LangChain ===
-agent = initialize_agent(
-    tools=tools,
-    llm=llm,
-    agent_type=AgentType.CHAT_CONVERSATIONAL_REACT_DESCRIPTION,  # conversationnel + recherche
-    verbose=True,
-    prompt=prompt
-)
-
-# === 6️⃣ Fonction publique ===
+
+    tools = [
+        Tool(
+            name="Web Search",
+            func=web_search,
+            description="Recherche des informations pertinentes pour l'apprentissage des langues."
+        )
+    ]
+
+    return initialize_agent(
+        tools=tools,
+        llm=llm,
+        agent=AgentType.CHAT_CONVERSATIONAL_REACT_DESCRIPTION,  # conversationnel + recherche
+        agent_kwargs={"system_message": SYSTEM_MESSAGE},
+        verbose=True,
+        handle_parsing_errors=True,
+        # Budget par appel: nombre d'étapes et durée totale
+        max_iterations=settings.RESEARCH_MAX_STEPS,
+        max_execution_time=settings.RESEARCH_TIMEOUT_SECONDS,
+        early_stopping_method="force"
+    )
+
+
+def get_research_agent():
+    """Retourne l'agent partagé (construit une seule fois), ou None s'il est indisponible"""
+    global _agent, _agent_error
+    if _agent is not None or _agent_error is not None:
+        return _agent
+    with _agent_lock:
+        if _agent is None and _agent_error is None:
+            start = time.perf_counter()
+            try:
+                _agent = _build_agent()
+                logger.info(f"✅ Research agent prêt ({time.perf_counter() - start:.2f}s)")
+            except Exception as e:
+                _agent_error = e
+                logger.warning(f"⚠️ Research agent indisponible: {e}")
+    return _agent
+
+
+# === Fonction publique ===
 def run_research_agent(query: str, context: str = "") -> str:
-    """Exécute la recherche et renvoie un résumé structuré."""
-    input_text = f"""
-Query: {query}
-Contexte disponible: {context}
-"""
+    """Exécute la recherche et renvoie un résumé structuré ("" si indisponible)."""
+    agent = get_research_agent()
+    if agent is None:
+        return ""
     try:
         # utiliser invoke() au lieu de run() car run() est déprécié
-        result = agent.invoke({"input": input_text})["output"]
+        result = agent.invoke({
+            "input": INPUT_TEMPLATE.format(query=query, context=context or "aucun"),
+            "chat_history": []
+        })["output"]
+        # Budget épuisé: LangChain renvoie un message d'arrêt, pas une réponse
+        if result.startswith("Agent stopped"):
+            logger.warning("⏱️ Research agent: budget d'étapes/temps épuisé")
+            return ""
         return result
     except Exception as e:
         logger.error(f"❌ Research agent failed: {e}")
         logger.exception("Détails de l'erreur :")
-        return "Le chercheur n'est pas disponible pour le moment."
+        return ""
@@ -16,7 +16,7 @@ class Settings(BaseSettings):
     # CONFIGURATION GROQ (GRATUIT)
     # ========================================
     # Obtenir une clé gratuite sur: https://console.groq.com/
-    GROQ_API_KEY: str = a
+    GROQ_API_KEY: str = ""
     
     # Modèles disponibles gratuitement sur Groq:
     # - llama-3.1-70b-versatile (recommandé - très intelligent)
@@ -24,13 +24,49 @@ class Settings(BaseSettings):
     # - mixtral-8x7b-32768 (bon équilibre)
     # - gemma2-9b-it (léger et efficace)
     GROQ_MODEL: str = "llama-3.1-8b-instant"
+    GROQ_BASE_URL: str = ""                  # Vide = API officielle (autre valeur: proxy, banc d'essai)
     
     # Paramètres du modèle
     MODEL_TEMPERATURE: float = 0.8
     MODEL_MAX_TOKENS: int = 500
     
+    # ========================================
+    # FOURNISSEURS LLM (routage + bascule)
+    # ========================================
+    LLM_PROVIDERS: str = "groq,local"        # Ordre de préférence
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    LLM_POOL_SIZE: int = 10                  # Connexions max par fournisseur
+    LLM_LATENCY_SLO_SECONDS: float = 5.0     # Au-delà, on préfère le suivant
+    LLM_FAILURE_THRESHOLD: int = 3           # Échecs consécutifs avant mise de côté
+    LLM_COOLDOWN_SECONDS: int = 30
+    # Admission côté client (quota du fournisseur, réparti entre WEB_WORKERS; 0 = désactivé)
+    LLM_ADMISSION_PROVIDER: str = "groq"
+    LLM_RPM_LIMIT: int = 30                  # Requêtes/min (offre gratuite Groq)
+    LLM_TPM_LIMIT: int = 6000                # Tokens/min (prompt + réponse)
+    LLM_ADMISSION_MAX_WAIT_SECONDS: float = 20.0  # Au-delà: 429 + Retry-After
+    LLM_ADMISSION_MAX_QUEUE: int = 200
+    LLM_ADMISSION_DEFAULT_TOKENS: int = 1500  # Estimation initiale par appel
+    
+    # Modèle local compatible OpenAI (llama.cpp server, Ollama /v1); vide = désactivé
+    LOCAL_LLM_BASE_URL: str = ""              # ex. http://localhost:11434/v1
+    LOCAL_LLM_MODEL: str = "llama3.2"
+    LOCAL_LLM_API_KEY: str = ""
+    
     # Whisper (STT) - optionnel
     WHISPER_MODEL: str = "base"
+    STT_BEAM_SIZE: int = 5
+    STT_BATCH_ENABLED: bool = True            # Regroupe les clips simultanés en un décodage
+    STT_BATCH_MAX_SIZE: int = 8               # Clips max par passe encodeur/décodeur
+    STT_BATCH_MAX_WAIT_MS: int = 50           # Attente max du plus ancien clip avant décodage
+    # Profil audio par session (langue apprise + profil de décodage, voir README)
+    STT_PROFILE_ENABLED: bool = True
+    STT_PROFILE_MIN_CLIPS: int = 2            # Détections concordantes avant d'imposer la langue
+    STT_PROFILE_MIN_LANGUAGE_PROB: float = 0.8
+    STT_PROFILE_MIN_LOGPROB: float = -0.8     # Confiance en dessous: profil précis, langue redétectée
+    STT_FAST_BEAM_SIZE: int = 2               # Profil rapide: langue imposée et clips courts
+    STT_FAST_MAX_SECONDS: float = 12.0        # Durée typique max des clips pour le profil rapide
+    STT_PROFILE_CACHE_SIZE: int = 10000       # Profils gardés en mémoire par processus (LRU)
+    STT_PROFILE_CACHE_TTL_SECONDS: int = 300  # Relecture en base (autres workers)
     
     # TTS - optionnel
     TTS_MODEL: str = "tts_models/es/css10/vits"
@@ -39,19 +75,130 @@ class Settings(BaseSettings):
     # Server
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WEB_WORKERS: int = 1                     # >1: définir MODEL_SERVER_URL et une DATABASE_URL PostgreSQL (voir README)
+    
+    # Serveur de modèles (Whisper, TTS, embeddings, ChromaDB) partagé par les workers
+    MODEL_SERVER_URL: str = ""               # Vide = modèles chargés dans le processus web
+    MODEL_SERVER_HOST: str = "127.0.0.1"
+    MODEL_SERVER_PORT: int = 8001
+    MODEL_SERVER_TIMEOUT_SECONDS: float = 120.0
+    MODEL_SERVER_POOL_SIZE: int = 20
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:8000"
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024        # Réponses plus petites envoyées telles quelles
     
     # Database
-    DATABASE_URL: str = "sqlite+aiosqlite:///./walle.db"
+    DATABASE_URL: str = "sqlite+aiosqlite:///./walle.db"  # ou postgresql+asyncpg://user:mdp@hôte/base
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000       # Attente du verrou d'écriture entre workers
+    DB_POOL_SIZE: int = 10                   # Connexions gardées ouvertes par processus
+    DB_MAX_OVERFLOW: int = 10                # Connexions temporaires en plus en cas de pic
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0    # Attente max d'une connexion libre
+    DB_POOL_RECYCLE_SECONDS: int = 1800      # Reconnexion périodique (pare-feu, pgbouncer)
+    
+    # HTTP sortant (pool partagé, timeouts bornés, cache des GET)
+    HTTP_POOL_SIZE: int = 20
+    HTTP_TIMEOUT_SECONDS: float = 10.0          # Plafond pour tout appel sortant
+    HTTP_CACHE_TTL_SECONDS: int = 600
+    HTTP_CACHE_MAX_ENTRIES: int = 256
+    
+    # Agent de recherche (LangChain + modèle local), optionnel sur /chat
+    RESEARCH_AGENT_ENABLED: bool = False
+    RESEARCH_MAX_STEPS: int = 3
+    RESEARCH_TIMEOUT_SECONDS: float = 20.0
+    RESEARCH_TOOL_TIMEOUT_SECONDS: float = 5.0
+    
+    # Recherche web (surchargeables pour un proxy ou les benchmarks)
+    SEARCH_DDG_API_URL: str = "https://api.duckduckgo.com/"
+    SEARCH_DDG_HTML_URL: str = "https://html.duckduckgo.com/html/"
+    SEARCH_BING_URL: str = "https://www.bing.com/search"
+    SEARCH_PROVIDERS: str = "ddg_json,ddg_html,bing"  # Ordre de préférence
+    # Disjoncteurs par fournisseur (fenêtre glissante succès/latence)
+    SEARCH_BREAKER_WINDOW_SECONDS: float = 120.0
+    SEARCH_BREAKER_MIN_CALLS: int = 3        # Appels dans la fenêtre avant de juger
+    SEARCH_BREAKER_FAILURE_RATE: float = 0.5
+    SEARCH_BREAKER_SLOW_CALL_SECONDS: float = 4.0
+    SEARCH_BREAKER_SLOW_CALL_RATE: float = 0.5
+    SEARCH_BREAKER_COOLDOWN_SECONDS: float = 60.0
+    # Extraction des pages candidates (téléchargement borné + contenu principal)
+    PAGE_MAX_BYTES: int = 512 * 1024         # Arrêt du téléchargement au-delà (préfixe conservé)
+    PAGE_FETCH_TIMEOUT_SECONDS: float = 6.0
+    PAGE_MAX_CHARS: int = 2000               # Texte extrait par page
+    EXTRACTION_WORKERS: int = 4              # Pages téléchargées/analysées en parallèle
     
     # RAG
     CHROMADB_PATH: str = "./chromadb_data"
     MAX_SEARCH_RESULTS: int = 3
     EMBEDDING_MODEL: str = "sentence-transformers/multi-qa-MiniLM-L6-cos-v1"
+    EMBEDDING_BACKEND: str = "torch"         # torch | onnx | onnx-int8 (onnxruntime)
+    EMBEDDING_ONNX_DIR: str = "./models/onnx"  # Export ONNX mis en cache ici
+    EMBEDDING_MIN_AGREEMENT: float = 0.99    # Cosinus min vs PyTorch, sinon retour à torch
+    EMBEDDING_WORKERS: int = 0               # Processus d'encodage dédiés (0 = dans le processus)
+    EMBEDDING_BATCH_SIZE: int = 64           # Textes par lot envoyé à un worker
+    EMBEDDING_SHM_MB: int = 4                # Mémoire partagée par worker (vecteurs de sortie)
+    EMBEDDING_WORKER_START_TIMEOUT_SECONDS: float = 120.0
+    # Snapshot mmap de l'index (démarrage à chaud sans attendre ChromaDB)
+    VECTOR_SNAPSHOT_ENABLED: bool = True
+    VECTOR_SNAPSHOT_DIR: str = "./chromadb_data/snapshots"
+    VECTOR_SNAPSHOT_MIN_INTERVAL_SECONDS: float = 60.0  # Reconstruction au plus toutes les N s
+    VECTOR_SNAPSHOT_REBUILD_HOURS: float = 6.0          # Index modifié: reconstruit toutes les N h (et après éviction, à l'arrêt)
+    # Éviction des documents web indexés (les documents épinglés sont conservés)
+    RAG_MAX_DOCUMENTS: int = 20000           # Plafond de la collection (LRU au-delà)
+    RAG_DOCUMENT_TTL_DAYS: float = 30        # Non retrouvé depuis N jours -> supprimé (0 = jamais)
+    RAG_UNUSED_GRACE_HOURS: float = 72       # Jamais retrouvé après N heures -> supprimé (0 = jamais)
+    RAG_HIT_UPDATE_SECONDS: int = 3600       # Résolution de last_hit (limite les écritures)
+    RAG_EVICTION_INTERVAL_MINUTES: int = 60
+    RAG_INDEX_TOKEN: str = ""                # Jeton de POST /rag/index (contenu curé); vide = route désactivée
+    # Décision par requête: recherche web, contexte local ou rien
+    RAG_GATE_POLICY: str = "auto"            # always (toujours chercher) | auto | never
+    RAG_GATE_MIN_WORDS: int = 3              # Plus court (sans question) -> pas de recherche
+    RAG_GATE_LOCAL_SIMILARITY: float = 0.6   # Cosinus dès lequel le contexte local suffit
+    RAG_GATE_MIN_SIMILARITY: float = 0.25    # En dessous (sans question) -> hors sujet
+    RAG_GATE_SLO_P95_MS: float = 8000        # p95 des réponses au-delà: plus de recherche web (0 = jamais)
+    RAG_GATE_SLO_WINDOW: int = 200           # Réponses récentes prises en compte
     
     # Memory
     MAX_MEMORY_MESSAGES: int = 20
     SESSION_TIMEOUT_HOURS: int = 24
+    CLEANUP_INTERVAL_MINUTES: int = 30  # Période du nettoyage en arrière-plan
+    CLEANUP_BATCH_SIZE: int = 500       # Sessions supprimées par lot
+    CLEANUP_BATCH_PAUSE_MS: int = 50    # Pause entre lots (laisse passer les écritures)
+    VACUUM_PAGES: int = 1000            # Pages libérées par VACUUM incrémental
+    SUMMARY_TRIGGER_MESSAGES: int = 12  # Au-delà, les anciens tours sont résumés
+    SUMMARY_KEEP_RECENT: int = 6        # Tours récents gardés tels quels
+    SUMMARY_MAX_TOKENS: int = 200       # Longueur max du résumé
+    
+    # Contexte du prompt (budget en tokens)
+    CONTEXT_TOKEN_BUDGET: int = 1200       # Tokens max pour historique + RAG
+    CONTEXT_RECENT_TURNS: int = 4          # Tours récents prioritaires
+    CONTEXT_MAX_ITEM_TOKENS: int = 300     # Un seul message ne peut pas tout occuper
+    TOKENIZER_ENCODING: str = "cl100k_base"
+    
+    # Cache sémantique des réponses (tours sans contexte uniquement)
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92     # Similarité cosinus minimale
+    SEMANTIC_CACHE_TTL_SECONDS: int = 3600
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000     # Par partition (langue, RAG)
+    
+    # Lots (/chat/batch: corrections de toute une classe)
+    BATCH_MAX_ITEMS: int = 50                  # Éléments max par lot
+    BATCH_CONCURRENCY: int = 4                 # Éléments traités en même temps par lot
+    BATCH_ADMISSION_PATIENCE_SECONDS: float = 180.0  # Un élément attend son tour de quota jusqu'à N s
+    
+    # Pipeline par requête (délai par étape)
+    MEMORY_STAGE_TIMEOUT_SECONDS: float = 5.0
+    RAG_DEADLINE_SECONDS: float = 6.0        # Au-delà, le tuteur répond sans RAG
+    
+    # Coalescence des requêtes identiques concurrentes (single-flight)
+    SINGLEFLIGHT_RAG_TIMEOUT_SECONDS: float = 30.0
+    SINGLEFLIGHT_LLM_TIMEOUT_SECONDS: float = 60.0
+    
+    # Profilage des requêtes lentes (/chat, /voice)
+    PROFILER_ENABLED: bool = False
+    PROFILER_THRESHOLD_SECONDS: float = 10.0   # Au-delà, le profil est enregistré
+    PROFILER_INTERVAL_MS: int = 10             # Période d'échantillonnage
+    PROFILER_WINDOW_SECONDS: int = 120         # Historique max gardé en mémoire
+    PROFILER_DIR: str = "./profiles"
+    PROFILER_MAX_PROFILES: int = 50            # Anneau sur disque
     
     # ChromaDB Telemetry (désactivée)
     ANONYMIZED_TELEMETRY: bool = False
@@ -4,22 +4,40 @@ Complete language learning assistant with Groq API
 VERSION GROQ (GRATUIT et RAPIDE)
 """
 import logging
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse, ORJSONResponse, Response
 from contextlib import asynccontextmanager
+import asyncio
+import json
+import time
 import os
+import secrets
+import uuid
 
 from backend.config import settings
 from backend.models.schemas import (
-    ChatRequest, ChatResponse, AudioResponse, HealthResponse
+    ChatRequest, ChatResponse, AudioResponse, HealthResponse,
+    ChatBatchRequest, ChatBatchItem, ChatBatchResult, RagIndexRequest
 )
 from backend.services.stt_service import stt_service
 from backend.services.tts_service import tts_service
 from backend.services.memory_service import memory_service
 from backend.services.rag_service import rag_service
-from backend.agents.language_tutor import run_teaching_crew
+from backend.services.rag_gate import rag_gate
+from backend.services.cache_service import semantic_cache
+from backend.services.singleflight import rag_flight, llm_flight, make_key
+from backend.services.llm_service import llm_router, LLMRateLimitError
+from backend.services.admission import llm_admission, AdmissionRejected
+from backend.services.pipeline import Pipeline, Stage, PipelineContext
+from backend.services.metrics import metrics, CACHE_ENTRIES
+from backend.services.profiler import request_profiler
+from backend.agents.researcher import run_research_agent
+from backend.agents.language_tutor import (
+    run_teaching_crew, summarize_conversation, is_error_answer
+)
 
 # Configuration du logging
 logging.basicConfig(
@@ -43,6 +61,12 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"⚠️ Vérification des versions échouée: {e}")
     
+    # Mode multi-workers: état du serveur de modèles lu une fois avant les is_loaded
+    # (ensuite rafraîchi en arrière-plan, sans bloquer la boucle)
+    if settings.MODEL_SERVER_URL:
+        from backend.services.model_client import refresh_health
+        await refresh_health()
+    
     # Charger les modèles optionnels
     try:
         stt_service.load_model()
@@ -63,9 +87,27 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Erreur ChromaDB: {e}")
     
-    # Nettoyage
+    # Base des conversations (SQLite ou PostgreSQL): migrations du schéma.
+    # SQLite n'a qu'un écrivain: chaque worker écrirait les sessions directement
+    if settings.WEB_WORKERS > 1 and memory_service.store.dialect == "sqlite":
+        raise RuntimeError(
+            "WEB_WORKERS > 1 exige PostgreSQL pour la mémoire des conversations "
+            "(DATABASE_URL=postgresql+asyncpg://...): SQLite n'accepte qu'un seul écrivain"
+        )
+    await memory_service.start()
+    logger.info(f"✅ Mémoire des conversations: {memory_service.store.dialect}")
+    
+    # Nettoyage (sessions expirées, documents RAG évincés: tâches périodiques en arrière-plan).
+    # En mode multi-workers, c'est le serveur de modèles qui s'en charge.
+    janitor_tasks = []
+    if settings.MODEL_SERVER_URL:
+        logger.info(f"🧩 Modèles et ChromaDB servis par {settings.MODEL_SERVER_URL}")
+    else:
+        janitor_tasks.append(asyncio.create_task(memory_service.run_janitor()))
+        janitor_tasks.append(asyncio.create_task(rag_service.run_index_janitor()))
+        if settings.WEB_WORKERS > 1:
+            logger.warning("⚠️ WEB_WORKERS > 1 sans MODEL_SERVER_URL: chaque worker charge ses modèles et ouvre ChromaDB")
     try:
-        memory_service.cleanup_old_sessions()
         tts_service.cleanup_old_files()
     except Exception as e:
         logger.warning(f"⚠️ Avertissement nettoyage: {e}")
@@ -77,11 +119,19 @@ async def lifespan(app: FastAPI):
     else:
         logger.info(f"✅ Groq API configurée (modèle: {settings.GROQ_MODEL})")
     
+    providers = [name for name, st in llm_router.status().items() if st["configured"]]
+    logger.info(f"🤖 Fournisseurs LLM: {', '.join(providers) or 'aucun'}")
+    
     logger.info("✅ WALL-E AI prêt!")
     
     yield
     
     logger.info("👋 Arrêt de WALL-E AI...")
+    for task in janitor_tasks:
+        task.cancel()
+    if not settings.MODEL_SERVER_URL:
+        await asyncio.to_thread(rag_service.save_snapshot)
+    await memory_service.close()
 
 
 # Initialiser FastAPI
@@ -101,16 +151,234 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+
+class SelectiveCompression:
+    """Brotli (brotli-asgi installé) ou gzip au-delà de COMPRESSION_MIN_BYTES, sauf chemins exclus"""
+    
+    def __init__(self, app, minimum_size: int, skip_prefixes: tuple):
+        self.app = app
+        self.skip_prefixes = skip_prefixes
+        try:
+            from brotli_asgi import BrotliMiddleware
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        except ImportError:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=6)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope["path"].startswith(self.skip_prefixes):
+            await self.compressed(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+# Compression: pas pour l'audio (déjà dense) ni le NDJSON de /chat/batch
+# (le compresseur garderait les lignes en tampon au lieu de les envoyer)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        SelectiveCompression,
+        minimum_size=settings.COMPRESSION_MIN_BYTES,
+        skip_prefixes=("/audio", "/chat/batch")
+    )
+
+PROFILED_PATHS = {"/chat", "/voice"}
+
+
+@app.middleware("http")
+async def profile_slow_requests(request: Request, call_next):
+    """Profil échantillonné des requêtes lentes (PROFILER_ENABLED)"""
+    if not request_profiler.enabled or request.url.path not in PROFILED_PATHS:
+        return await call_next(request)
+    with request_profiler.track(request.url.path.strip("/")):
+        return await call_next(request)
+
+
 # Servir fichiers audio statiques
-os.makedirs("audio_output", exist_ok=True)
-app.mount("/audio", StaticFiles(directory="audio_output"), name="audio")
+AUDIO_DIR = "audio_output"
+os.makedirs(AUDIO_DIR, exist_ok=True)
+app.mount("/audio", StaticFiles(directory=AUDIO_DIR), name="audio")
+
+
+def _write_audio(filename: str, wav: bytes):
+    with open(os.path.join(AUDIO_DIR, filename), "wb") as f:
+        f.write(wav)
+
+
+def _cache_lookup(query: str, lang: str, use_rag: bool, summary: str, history: list):
+    """Cache sémantique: seulement pour les tours sans contexte (début de conversation)"""
+    if not semantic_cache.enabled or summary or len(history) > 1:
+        return None, None
+    try:
+        vector = semantic_cache.embed(query)
+        return semantic_cache.get(vector, lang, use_rag), vector
+    except Exception as e:
+        logger.warning(f"⚠️ Cache sémantique indisponible: {e}")
+        return None, None
+
+
+def _cache_store(vector, lang: str, use_rag: bool, answer: str):
+    if vector is None or is_error_answer(answer):
+        return
+    try:
+        semantic_cache.put(vector, lang, use_rag, answer)
+    except Exception as e:
+        logger.warning(f"⚠️ Échec écriture cache sémantique: {e}")
+
+
+async def _rag_search(query: str, lang: str) -> str:
+    """Recherche RAG, partagée entre requêtes identiques concurrentes"""
+    try:
+        context = await rag_flight.do(
+            make_key(query, lang),
+            rag_service.rag_search, query, lang,
+            timeout=settings.SINGLEFLIGHT_RAG_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        logger.warning("⏱️ Recherche RAG trop lente, réponse sans contexte")
+        return ""
+    except Exception as e:
+        logger.error(f"❌ Recherche RAG échouée: {e}")
+        return ""
+    
+    # Agent de recherche (optionnel) si le RAG n'a rien trouvé
+    if not context and settings.RESEARCH_AGENT_ENABLED:
+        try:
+            context = await asyncio.wait_for(
+                asyncio.to_thread(run_research_agent, query),
+                timeout=settings.RESEARCH_TIMEOUT_SECONDS + 1
+            )
+        except asyncio.TimeoutError:
+            logger.warning("⏱️ Research agent trop lent, réponse sans contexte")
+            context = ""
+    return context
+
+
+async def _run_tutor(
+    query: str, lang: str, history: list, rag_context: str, summary: str, session_id: str, kind: str
+) -> str:
+    """Appel LLM, partagé entre requêtes au contexte identique"""
+    key = make_key(
+        query, lang, summary, rag_context,
+        *(f"{m['role']}: {m['content']}" for m in history),
+        casefold=False
+    )
+    # Seule l'exécution partagée passe par la file du quota: les requêtes
+    # identiques qui s'y joignent ne consomment ni requête ni tokens
+    admission_budget = 0.0
+    if llm_admission.enabled:
+        admission_budget = settings.LLM_ADMISSION_MAX_WAIT_SECONDS
+        if kind == "batch":
+            admission_budget += settings.BATCH_ADMISSION_PATIENCE_SECONDS
+    try:
+        return await llm_flight.do(
+            key,
+            run_teaching_crew, query, lang, history, rag_context, summary,
+            timeout=settings.SINGLEFLIGHT_LLM_TIMEOUT_SECONDS + admission_budget,
+            prepare=lambda: _admit_llm(session_id, kind)
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail="Le modèle met trop de temps à répondre. Réessaye."
+        )
+    except LLMRateLimitError as e:
+        # Quota du fournisseur atteint malgré l'admission, aucun secours disponible
+        raise HTTPException(
+            status_code=429,
+            detail="Limite de requêtes atteinte. Réessaye dans quelques secondes.",
+            headers={"Retry-After": e.retry_after_header}
+        )
+
+
+async def _admit_llm(session_id: str, kind: str):
+    """File d'attente du quota Groq (voix avant texte); 429 si l'attente serait trop longue"""
+    if not llm_admission.enabled or not llm_router.has(settings.LLM_ADMISSION_PROVIDER):
+        return
+    # Les lots ne sont pas interactifs: ils repassent en file au lieu d'échouer
+    patience = settings.BATCH_ADMISSION_PATIENCE_SECONDS if kind == "batch" else 0
+    deadline = time.monotonic() + patience
+    while True:
+        try:
+            await llm_admission.admit(session_id, kind)
+            return
+        except AdmissionRejected as e:
+            if time.monotonic() + e.retry_after < deadline:
+                await asyncio.sleep(e.retry_after)
+                continue
+            raise HTTPException(
+                status_code=429,
+                detail="Trop de demandes en même temps. Réessaye dans quelques secondes.",
+                headers={"Retry-After": e.retry_after_header}
+            )
+
+
+# ========================================
+# Pipeline par requête: mémoire ∥ RAG → cache → LLM
+# ========================================
+async def _stage_memory(ctx: PipelineContext):
+    """Sauvegarde le message utilisateur et lit le contexte (résumé + tours récents)"""
+    inputs = ctx.inputs
+    await memory_service.add_message(inputs["session_id"], "user", inputs["query"], inputs["lang"])
+    return await memory_service.get_prompt_context(
+        inputs["session_id"], limit=settings.MAX_MEMORY_MESSAGES
+    )
+
+
+async def _stage_rag(ctx: PipelineContext) -> str:
+    if not ctx.inputs["use_rag"]:
+        return ""
+    shared = ctx.inputs.get("shared_rag")
+    if shared is not None:
+        # Recherche commune à plusieurs éléments d'un lot: le délai d'un élément ne l'annule pas
+        return await asyncio.shield(shared)
+    # Salutations, hors-sujet, contexte déjà indexé ou surcharge: pas de recherche web
+    return await rag_gate.retrieve(ctx.inputs["query"], ctx.inputs["lang"], _rag_search)
+
+
+async def _stage_cache(ctx: PipelineContext):
+    summary, history = ctx.results["memory"]
+    inputs = ctx.inputs
+    answer, vector = await asyncio.to_thread(
+        _cache_lookup, inputs["query"], inputs["lang"], inputs["use_rag"], summary, history
+    )
+    if answer is not None:
+        ctx.skip("rag")  # réponse en cache: inutile d'attendre la recherche
+    return answer, vector
+
+
+async def _stage_llm(ctx: PipelineContext) -> str:
+    answer, vector = ctx.results["cache"]
+    if answer is not None:
+        return answer
+    summary, history = ctx.results["memory"]
+    inputs = ctx.inputs
+    answer = await _run_tutor(
+        inputs["query"], inputs["lang"], history, ctx.results["rag"], summary,
+        inputs["session_id"], inputs["kind"]
+    )
+    _cache_store(vector, inputs["lang"], inputs["use_rag"], answer)
+    return answer
+
+
+tutor_pipeline = Pipeline("tutor", [
+    Stage("memory", _stage_memory, timeout=settings.MEMORY_STAGE_TIMEOUT_SECONDS),
+    Stage("rag", _stage_rag, timeout=settings.RAG_DEADLINE_SECONDS, optional=True, default=""),
+    Stage("cache", _stage_cache, deps=("memory",), optional=True, default=(None, None)),
+    Stage("llm", _stage_llm, deps=("memory", "rag", "cache")),
+])
 
 
 @app.get("/", response_class=FileResponse)
-async def root():
-    """Servir le frontend"""
+async def root(request: Request):
+    """Servir le frontend (ETag: 304 tant que le fichier n'a pas changé)"""
     if os.path.exists("frontend/index.html"):
-        return FileResponse("frontend/index.html")
+        stat = os.stat("frontend/index.html")
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        return FileResponse("frontend/index.html", headers=headers)
     else:
         return {
             "message": "WALL-E AI API en cours d'exécution",
@@ -123,30 +391,42 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Vérification de santé"""
-    # Test connexion Groq
-    groq_ok = bool(settings.GROQ_API_KEY)
+    # Au moins un fournisseur LLM configuré et sain
+    providers = llm_router.status()
+    llm_ok = any(p["configured"] and p["healthy"] for p in providers.values())
     
     return HealthResponse(
-        status="healthy" if groq_ok else "degraded",
-        ollama_connected=groq_ok,  # Réutilise le champ pour Groq
+        status="healthy" if llm_ok else "degraded",
+        ollama_connected=llm_ok,  # Réutilise le champ pour le LLM
         whisper_loaded=stt_service.is_loaded,
-        tts_loaded=tts_service.is_loaded
+        tts_loaded=tts_service.is_loaded,
+        llm_providers=providers,
+        coalescing={"rag": rag_flight.stats(), "llm": llm_flight.stats()},
+        search_providers=rag_service.search_status(),
+        rag_gate=rag_gate.stats()
     )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Métriques au format texte Prometheus"""
+    CACHE_ENTRIES.set(semantic_cache.stats()["size"], cache="semantic")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
     """
     Endpoint de chat textuel
     
     Traite le message de l'utilisateur et retourne une réponse IA
     """
     try:
-        # Vérifier la clé API
-        if not settings.GROQ_API_KEY:
+        # Vérifier qu'un fournisseur LLM est configuré
+        if not llm_router.available:
             raise HTTPException(
                 status_code=503,
-                detail="Clé API Groq non configurée. Configure GROQ_API_KEY dans .env"
+                detail="Aucun LLM configuré. Configure GROQ_API_KEY ou LOCAL_LLM_BASE_URL dans .env"
             )
         
         # Générer session ID si absent
@@ -154,40 +434,55 @@ async def chat(request: ChatRequest):
         
         logger.info(f"💬 Requête chat: {request.query[:50]}...")
         
-        # Sauvegarder message utilisateur
-        memory_service.add_message(session_id, "user", request.query, request.lang)
-        
-        # Obtenir contexte de conversation
-        memory_context = memory_service.get_context_string(session_id, max_messages=10)
-        
-        # Recherche RAG si activée
-        rag_context = ""
-        if request.use_rag:
-            try:
-                rag_context = rag_service.rag_search(request.query, request.lang)
-            except Exception as e:
-                logger.error(f"❌ Recherche RAG échouée: {e}")
-                rag_context = ""
-        
-        # Exécuter le teaching crew avec Groq
-        response_text = run_teaching_crew(
+        # Mémoire et RAG en parallèle, puis cache sémantique et LLM
+        started = time.perf_counter()
+        ctx = await tutor_pipeline.run(
+            session_id=session_id,
             query=request.query,
-            language=request.lang,
-            memory_context=memory_context,
-            research_context=rag_context
+            lang=request.lang,
+            use_rag=request.use_rag,
+            kind="text"
         )
+        rag_gate.observe(time.perf_counter() - started)
+        response_text = ctx.results["llm"]
+        rag_context = ctx.results["rag"]
+        cached = ctx.results["cache"][0] is not None
+        request_profiler.annotate(ctx.timings, session_id=session_id, lang=request.lang,
+                                  use_rag=request.use_rag, stage_status=ctx.status)
         
         # Sauvegarder réponse assistant
-        memory_service.add_message(session_id, "assistant", response_text, request.lang)
+        await memory_service.add_message(session_id, "assistant", response_text, request.lang)
+        
+        # Résumer les anciens tours après l'envoi de la réponse
+        background_tasks.add_task(
+            memory_service.summarize_if_needed, session_id, summarize_conversation
+        )
+        
+        if request.lean:
+            # Mode compact: seulement les messages postérieurs au curseur du client,
+            # encodé directement par orjson (sans passer par le modèle de réponse)
+            memory, cursor, truncated = await memory_service.get_history_since(session_id, request.cursor, limit=10)
+            body = {
+                "answer": response_text,
+                "session_id": session_id,
+                "memory": memory,
+                "cursor": cursor,
+                "rag_used": request.use_rag and bool(rag_context),
+                "cached": cached
+            }
+            if truncated:
+                body["truncated"] = True
+            return ORJSONResponse(body)
         
         # Obtenir historique
-        history = memory_service.get_conversation_history(session_id, limit=10)
+        history = await memory_service.get_conversation_history(session_id, limit=10)
         
         return ChatResponse(
             answer=response_text,
             session_id=session_id,
             memory=history,
-            rag_used=request.use_rag and bool(rag_context)
+            rag_used=request.use_rag and bool(rag_context),
+            cached=cached
         )
     
     except HTTPException:
@@ -201,8 +496,105 @@ async def chat(request: ChatRequest):
         )
 
 
+async def _batch_item(index: int, item: ChatBatchItem, shared_rag, background_tasks: BackgroundTasks) -> ChatBatchResult:
+    session_id = item.session_id or memory_service.generate_session_id()
+    try:
+        ctx = await tutor_pipeline.run(
+            session_id=session_id,
+            query=item.query,
+            lang=item.lang,
+            use_rag=item.use_rag,
+            kind="batch",
+            shared_rag=shared_rag
+        )
+        answer = ctx.results["llm"]
+        await memory_service.add_message(session_id, "assistant", answer, item.lang)
+        background_tasks.add_task(
+            memory_service.summarize_if_needed, session_id, summarize_conversation
+        )
+        return ChatBatchResult(
+            index=index,
+            session_id=session_id,
+            answer=answer,
+            rag_used=item.use_rag and bool(ctx.results["rag"]),
+            cached=ctx.results["cache"][0] is not None
+        )
+    except HTTPException as e:
+        retry_after = (e.headers or {}).get("Retry-After")
+        return ChatBatchResult(
+            index=index, status=e.status_code, session_id=session_id, error=str(e.detail),
+            retry_after=int(retry_after) if retry_after else None
+        )
+    except Exception as e:
+        logger.error(f"❌ Erreur élément {index} du lot: {e}")
+        return ChatBatchResult(index=index, status=500, session_id=session_id, error=str(e))
+
+
+@app.post("/chat/batch")
+async def chat_batch(request: ChatBatchRequest, background_tasks: BackgroundTasks):
+    """
+    Endpoint de chat par lot (ex: corriger les réponses de toute une classe)
+    
+    Une recherche RAG par sujet pour tout le lot, appels LLM en parallèle bornée
+    (BATCH_CONCURRENCY), résultats en NDJSON dans l'ordre où ils se terminent.
+    Une erreur sur un élément n'interrompt pas le lot.
+    """
+    if not llm_router.available:
+        raise HTTPException(
+            status_code=503,
+            detail="Aucun LLM configuré. Configure GROQ_API_KEY ou LOCAL_LLM_BASE_URL dans .env"
+        )
+    if len(request.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop grand: {settings.BATCH_MAX_ITEMS} éléments maximum"
+        )
+    
+    logger.info(f"📚 Lot de {len(request.items)} éléments (sujet: {request.topic or '-'})")
+    semaphore = asyncio.Semaphore(max(1, settings.BATCH_CONCURRENCY))
+    searches = {}
+    
+    def shared_search(item: ChatBatchItem):
+        # Même sujet et même langue: une seule recherche pour tout le lot
+        if not item.use_rag:
+            return None
+        topic = item.topic or request.topic or item.query
+        key = make_key(topic, item.lang)
+        if key not in searches:
+            searches[key] = asyncio.ensure_future(_rag_search(topic, item.lang))
+        return searches[key]
+    
+    async def run(index: int, item: ChatBatchItem) -> ChatBatchResult:
+        async with semaphore:
+            return await _batch_item(index, item, shared_search(item), background_tasks)
+    
+    async def stream():
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(request.items)]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                failed += result.status != 200
+                yield result.model_dump_json(exclude_none=True) + "\n"
+            yield json.dumps({"summary": {
+                "items": len(tasks),
+                "ok": len(tasks) - failed,
+                "failed": failed,
+                "rag_searches": len(searches),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000)
+            }}) + "\n"
+        finally:
+            # Client parti: inutile de continuer à consommer le quota LLM
+            for task in tasks + list(searches.values()):
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @app.post("/voice", response_model=AudioResponse)
 async def voice_chat(
+    background_tasks: BackgroundTasks,
     audio: UploadFile = File(...),
     lang: str = "es",
     session_id: str = None,
@@ -228,43 +620,63 @@ async def voice_chat(
         # Lire le fichier audio
         audio_bytes = await audio.read()
         
+        # Profil audio de la session: langue parlée apprise (pas de détection) et faisceau adapté.
+        # Sans langue apprise, `lang` sert de première hypothèse; si une transcription peu sûre
+        # la dément, Whisper détecte la langue jusqu'à ce que le profil en fixe une autre
+        profile = await memory_service.get_audio_profile(session_id) if settings.STT_PROFILE_ENABLED else {}
+        stt_language = profile.get("language") or (None if profile.get("detect") else lang)
+        
         # Transcrire l'audio
-        transcription = await stt_service.transcribe(audio_bytes, language=lang)
+        stt_start = time.perf_counter()
+        stt = await stt_service.transcribe_with_info(
+            audio_bytes, language=stt_language, beam_size=profile.get("beam_size")
+        )
+        transcription = stt["text"]
+        request_profiler.annotate({"stt": (time.perf_counter() - stt_start) * 1000},
+                                  session_id=session_id, lang=lang, audio_bytes=len(audio_bytes),
+                                  stt_language=stt["language"], stt_pinned=stt_language is not None)
         
         if not transcription:
             raise HTTPException(
                 status_code=400,
                 detail="Aucune parole détectée dans l'audio"
             )
+        if settings.STT_PROFILE_ENABLED:
+            background_tasks.add_task(
+                memory_service.update_audio_profile, session_id, stt, stt_language is not None
+            )
         
         logger.info(f"📝 Transcrit: {transcription}")
         
         # Traiter comme chat textuel
-        memory_service.add_message(session_id, "user", transcription, lang)
-        memory_context = memory_service.get_context_string(session_id, max_messages=10)
-        
-        rag_context = ""
-        if use_rag:
-            try:
-                rag_context = rag_service.rag_search(transcription, lang)
-            except Exception as e:
-                logger.error(f"❌ Recherche RAG échouée: {e}")
-        
-        response_text = run_teaching_crew(
+        started = time.perf_counter()
+        ctx = await tutor_pipeline.run(
+            session_id=session_id,
             query=transcription,
-            language=lang,
-            memory_context=memory_context,
-            research_context=rag_context
+            lang=lang,
+            use_rag=use_rag,
+            kind="voice"
         )
+        rag_gate.observe(time.perf_counter() - started)
+        response_text = ctx.results["llm"]
+        request_profiler.annotate(ctx.timings, use_rag=use_rag, stage_status=ctx.status)
         
-        memory_service.add_message(session_id, "assistant", response_text, lang)
+        await memory_service.add_message(session_id, "assistant", response_text, lang)
+        background_tasks.add_task(
+            memory_service.summarize_if_needed, session_id, summarize_conversation
+        )
         
         # Générer réponse audio (si TTS disponible)
         audio_url = None
         if tts_service.is_loaded:
             try:
-                audio_path = await tts_service.synthesize(response_text, lang, session_id)
-                audio_url = f"/audio/{audio_path.split('/')[-1]}" if audio_path else None
+                tts_start = time.perf_counter()
+                wav = await asyncio.to_thread(tts_service.synthesize, response_text)
+                request_profiler.annotate({"tts": (time.perf_counter() - tts_start) * 1000})
+                if wav:
+                    filename = f"{session_id}_{uuid.uuid4().hex[:8]}.wav"
+                    await asyncio.to_thread(_write_audio, filename, wav)
+                    audio_url = f"/audio/{filename}"
             except Exception as e:
                 logger.warning(f"⚠️ TTS échoué: {e}")
         
@@ -290,13 +702,35 @@ async def voice_chat(
 async def clear_session(session_id: str):
     """Effacer l'historique de conversation d'une session"""
     try:
-        # TODO: Implémenter méthode delete dans memory_service
+        if not await memory_service.delete_session(session_id):
+            raise HTTPException(status_code=404, detail="Session introuvable")
         return {"message": "Session effacée", "session_id": session_id}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Erreur effacement session: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/rag/index")
+async def rag_index(request: RagIndexRequest, http_request: Request):
+    """Indexer du contenu curé (épinglé par défaut: jamais évincé)"""
+    token = settings.RAG_INDEX_TOKEN
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(http_request.headers.get("X-Index-Token", ""), token):
+        raise HTTPException(status_code=401, detail="Jeton d'indexation invalide")
+    try:
+        await asyncio.to_thread(
+            rag_service.index_documents, request.documents, request.language, request.pinned
+        )
+        logger.info(f"📚 {len(request.documents)} documents indexés (pinned={request.pinned})")
+        return {"indexed": len(request.documents), "pinned": request.pinned}
+    except Exception as e:
+        logger.error(f"❌ Erreur indexation: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # Protection pour Windows multiprocessing
 if __name__ == "__main__":
     import uvicorn
@@ -306,5 +740,6 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=False,
+        workers=settings.WEB_WORKERS,
         log_level="info"
     )
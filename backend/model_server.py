@@ -0,0 +1,181 @@
+"""
+WALL-E AI - Model server (sidecar for multi-worker deployments)
+
+Un seul processus charge Whisper, TTS et le modèle d'embeddings, et il est le
+seul écrivain de ChromaDB. Les workers web (WEB_WORKERS > 1, MODEL_SERVER_URL
+défini) l'appellent en HTTP. Il exécute aussi le nettoyage périodique des
+sessions SQLite, pour qu'une seule tâche de maintenance tourne.
+
+    python -m backend.model_server
+"""
+import os
+
+# Ce processus sert les modèles lui-même: jamais de proxy vers lui-même,
+# même si le .env partagé définit MODEL_SERVER_URL
+os.environ["MODEL_SERVER_URL"] = ""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel
+
+from backend.config import settings
+from backend.services.stt_service import stt_service
+from backend.services.tts_service import tts_service
+from backend.services.rag_service import rag_service
+from backend.services.memory_service import memory_service
+from backend.services.metrics import metrics
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+    normalize: bool = False
+
+
+class IndexRequest(BaseModel):
+    documents: List[Dict[str, Any]]
+    language: str = "es"
+    pinned: bool = False
+
+
+class ContextRequest(BaseModel):
+    query: str
+    n_results: int = 3
+
+
+class SearchRequest(BaseModel):
+    query: str
+    language: str = "es"
+
+
+class WebSearchRequest(BaseModel):
+    query: str
+    num_results: int = 3
+
+
+class SynthesizeRequest(BaseModel):
+    text: str
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("🚀 Démarrage du serveur de modèles...")
+    try:
+        stt_service.load_model()
+    except Exception as e:
+        logger.warning(f"⚠️ STT non disponible: {e}")
+    try:
+        tts_service.load_model()
+    except Exception as e:
+        logger.warning(f"⚠️ TTS non disponible: {e}")
+    rag_service.test_connection()
+
+    # Maintenance de la base des conversations et de ChromaDB: une seule tâche de chaque pour tous les workers
+    await memory_service.start()
+    janitor_task = asyncio.create_task(memory_service.run_janitor())
+    index_janitor_task = asyncio.create_task(rag_service.run_index_janitor())
+    logger.info("✅ Serveur de modèles prêt!")
+    yield
+    janitor_task.cancel()
+    index_janitor_task.cancel()
+    await asyncio.to_thread(rag_service.save_snapshot)
+    await memory_service.close()
+
+
+app = FastAPI(title="WALL-E AI model server", lifespan=lifespan)
+
+
+@app.get("/health")
+def health():
+    return {
+        "whisper_loaded": stt_service.is_loaded,
+        "tts_loaded": tts_service.is_loaded,
+        "chroma_ok": rag_service.ready,
+        "search_providers": rag_service.search_status(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# Les routes "def" tournent dans le pool de threads de FastAPI
+
+
+@app.post("/embed")
+def embed(request: EmbedRequest):
+    vectors = rag_service.embedding_model.encode(request.texts, normalize_embeddings=request.normalize)
+    return {"embeddings": vectors.tolist()}
+
+
+@app.post("/rag/index")
+def rag_index(request: IndexRequest):
+    rag_service.index_documents(request.documents, request.language, pinned=request.pinned)
+    return {"indexed": len(request.documents)}
+
+
+@app.post("/rag/context")
+def rag_context(request: ContextRequest):
+    return {"context": rag_service.search_context(request.query, n_results=request.n_results)}
+
+
+@app.post("/rag/probe")
+def rag_probe(request: ContextRequest):
+    similarity, context = rag_service.probe(request.query, n_results=request.n_results)
+    return {"similarity": similarity, "context": context}
+
+
+@app.post("/rag/search")
+def rag_search(request: SearchRequest):
+    return {"context": rag_service.rag_search(request.query, request.language)}
+
+
+@app.post("/rag/web")
+def rag_web(request: WebSearchRequest):
+    return {"results": rag_service.web_search(request.query, num_results=request.num_results)}
+
+
+@app.post("/stt/transcribe")
+async def transcribe(request: Request, language: Optional[str] = None, beam_size: Optional[int] = None):
+    if not stt_service.is_loaded:
+        raise HTTPException(status_code=503, detail="Whisper non chargé")
+    audio = await request.body()
+    try:
+        # Micro-batching partagé entre tous les workers web
+        return await stt_service.transcribe_with_info(audio, language=language, beam_size=beam_size)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/tts/synthesize")
+def synthesize(request: SynthesizeRequest):
+    if not tts_service.is_loaded:
+        raise HTTPException(status_code=503, detail="TTS non chargé")
+    try:
+        audio = tts_service.synthesize(request.text)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(content=audio, media_type="audio/wav")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Un seul processus par construction (modèles et ChromaDB non partagés)
+    uvicorn.run(
+        app,
+        host=settings.MODEL_SERVER_HOST,
+        port=settings.MODEL_SERVER_PORT,
+        workers=1,
+        log_level="info"
+    )
@@ -2,7 +2,7 @@
 Pydantic models for request/response validation
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 
@@ -11,6 +11,29 @@ class ChatRequest(BaseModel):
     lang: str = Field(default="es", description="Language code (es, en, fr)")
     session_id: Optional[str] = Field(None, description="Session identifier")
     use_rag: bool = Field(default=True, description="Enable RAG search")
+    lean: bool = Field(default=False, description="Compact response: only messages newer than `cursor`")
+    cursor: Optional[int] = Field(None, description="Id of the last message the client already has")
+
+
+class ChatBatchItem(ChatRequest):
+    topic: Optional[str] = Field(None, description="RAG query shared by the items on the same topic")
+
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatBatchItem] = Field(..., min_length=1, description="Turns to answer (e.g. student answers)")
+    topic: Optional[str] = Field(None, description="Default topic for items without their own")
+
+
+class ChatBatchResult(BaseModel):
+    """One NDJSON line of /chat/batch, emitted as soon as the item finishes"""
+    index: int
+    status: int = 200
+    session_id: Optional[str] = None
+    answer: Optional[str] = None
+    rag_used: bool = False
+    cached: bool = False
+    error: Optional[str] = None
+    retry_after: Optional[int] = None
 
 
 class AudioRequest(BaseModel):
@@ -19,6 +42,12 @@ class AudioRequest(BaseModel):
     use_rag: bool = True
 
 
+class RagIndexRequest(BaseModel):
+    documents: List[Dict[str, Any]] = Field(..., min_length=1, description="Documents with content, url and title")
+    language: str = Field(default="es", description="Language code (es, en, fr)")
+    pinned: bool = Field(default=True, description="Curated content, never evicted")
+
+
 class ChatResponse(BaseModel):
     answer: str
     session_id: str
@@ -26,6 +55,7 @@ class ChatResponse(BaseModel):
     explanation: Optional[str] = None
     memory: List[Dict[str, str]] = []
     rag_used: bool = False
+    cached: bool = False
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
@@ -41,6 +71,10 @@ class HealthResponse(BaseModel):
     ollama_connected: bool
     whisper_loaded: bool
     tts_loaded: bool
+    llm_providers: Dict[str, Dict[str, Any]] = {}
+    coalescing: Dict[str, Dict[str, int]] = {}
+    search_providers: Dict[str, Dict[str, Any]] = {}
+    rag_gate: Dict[str, Any] = {}
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
@@ -0,0 +1,301 @@
+"""
+Client-side admission control for the rate-limited LLM provider (Groq)
+
+- Deux seaux à jetons: requêtes/min (RPM) et tokens/min (TPM) du fournisseur,
+  divisés entre les workers web
+- File d'attente par priorité (voix avant texte), équitable entre sessions
+  (tourniquet: une session bavarde n'affame pas les autres)
+- Si l'attente estimée dépasse le délai max: refus immédiat (429 + Retry-After)
+  plutôt qu'un appel voué à l'erreur de quota
+- Les tokens réellement consommés corrigent l'estimation après l'appel
+  (ContextVar: le ticket suit la requête jusqu'au thread du routeur LLM)
+"""
+import math
+import time
+import asyncio
+import threading
+import logging
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+from backend.config import settings
+from backend.services.metrics import (
+    ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT_SECONDS, ADMISSION_REJECTIONS
+)
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"voice": 0, "text": 1, "batch": 2}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(f"LLM admission rejected ({reason}), retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Continuous refill at per_minute/60 per second, capacity = one minute of budget"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it already is)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            deficit = amount - self.level
+        return max(0.0, deficit / self.rate)
+
+    def consume(self, amount: float):
+        # Peut devenir négatif (dette): l'estimation était trop basse
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level -= amount
+
+
+@dataclass
+class Ticket:
+    estimate: float
+    settled: bool = False
+
+
+@dataclass
+class _Waiter:
+    session_id: str
+    kind: str
+    estimate: float
+    deadline: float
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+_current_ticket: ContextVar[Optional[Ticket]] = ContextVar("llm_admission_ticket", default=None)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_wait: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        workers: Optional[int] = None,
+    ):
+        workers = max(1, workers or settings.WEB_WORKERS)
+        rpm = settings.LLM_RPM_LIMIT if rpm is None else rpm
+        tpm = settings.LLM_TPM_LIMIT if tpm is None else tpm
+        # Chaque worker a sa part du quota (pas d'état partagé entre processus)
+        self.requests = TokenBucket(rpm / workers) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm / workers) if tpm > 0 else None
+        self.max_wait = max_wait or settings.LLM_ADMISSION_MAX_WAIT_SECONDS
+        self.max_queue = max_queue or settings.LLM_ADMISSION_MAX_QUEUE
+        self.tokens_per_call = float(settings.LLM_ADMISSION_DEFAULT_TOKENS)  # EWMA observée
+
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {p: OrderedDict() for p in PRIORITIES.values()}
+        self._depth: Dict[str, int] = {kind: 0 for kind in PRIORITIES}
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    # --------------------------
+    # Estimation de l'attente
+    # --------------------------
+    def _wait_for(self, requests: float, tokens: float) -> float:
+        wait = max(0.0, self._paused_until - time.monotonic())
+        if self.requests:
+            wait = max(wait, self.requests.time_for(requests))
+        if self.tokens:
+            if requests <= 1:
+                # Un appel plus gros que le seau attendrait indéfiniment: plafonné
+                tokens = min(tokens, self.tokens.capacity)
+            wait = max(wait, self.tokens.time_for(tokens))
+        return wait
+
+    def _ahead(self, priority: int, session_id: str) -> Tuple[int, float]:
+        """Waiters that will be served before a new one of this session and priority"""
+        count, tokens = 0, 0.0
+        for p, sessions in self._queues.items():
+            if p > priority:
+                continue
+            if p < priority:
+                for queue in sessions.values():
+                    count += len(queue)
+                    tokens += sum(w.estimate for w in queue)
+                continue
+            # Même priorité, tourniquet: au plus (file de la session + 1) appels
+            # de chaque autre session passent avant le nouveau venu
+            turns = len(sessions.get(session_id, ())) + 1
+            for queue in sessions.values():
+                served = list(queue)[:turns]
+                count += len(served)
+                tokens += sum(w.estimate for w in served)
+        return count, tokens
+
+    # --------------------------
+    # File d'attente équitable
+    # --------------------------
+    def _peek(self) -> Optional[_Waiter]:
+        for priority in sorted(self._queues):
+            sessions = self._queues[priority]
+            if sessions:
+                return next(iter(sessions.values()))[0]
+        return None
+
+    def _pop(self, waiter: _Waiter):
+        sessions = self._queues[PRIORITIES[waiter.kind]]
+        queue = sessions[waiter.session_id]
+        queue.popleft()
+        if queue:
+            sessions.move_to_end(waiter.session_id)  # tourniquet entre sessions
+        else:
+            del sessions[waiter.session_id]
+        self._depth[waiter.kind] -= 1
+        ADMISSION_QUEUE_DEPTH.set(self._depth[waiter.kind], kind=waiter.kind)
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._dispatcher = None
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            waiter = self._peek()
+            if waiter is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if waiter.future.done():  # client parti
+                self._pop(waiter)
+                continue
+            wait = self._wait_for(1, waiter.estimate)
+            if time.monotonic() + wait > waiter.deadline:
+                self._pop(waiter)
+                ADMISSION_REJECTIONS.inc(kind=waiter.kind, reason="deadline")
+                waiter.future.set_exception(AdmissionRejected(wait, "deadline"))
+                continue
+            if wait > 0:
+                # Réévaluation périodique: un remboursement (settle) ou une
+                # requête prioritaire peut changer le prochain servi
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(wait, 0.5))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._pop(waiter)
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(waiter.estimate)
+            waiter.future.set_result(None)
+
+    # --------------------------
+    # API
+    # --------------------------
+    async def admit(self, session_id: str, kind: str = "text") -> Optional[Ticket]:
+        """Wait for a slot; raises AdmissionRejected if it would exceed the queue deadline"""
+        if not self.enabled:
+            return None
+        kind = kind if kind in PRIORITIES else "text"
+        priority = PRIORITIES[kind]
+        estimate = self.tokens_per_call
+        self._ensure_dispatcher()
+
+        ahead, ahead_tokens = self._ahead(priority, session_id)
+        wait = self._wait_for(ahead + 1, ahead_tokens + estimate)
+        if sum(self._depth.values()) >= self.max_queue or wait > self.max_wait:
+            reason = "queue_full" if wait <= self.max_wait else "deadline"
+            ADMISSION_REJECTIONS.inc(kind=kind, reason=reason)
+            logger.warning(f"🚦 LLM saturé ({reason}): attente estimée {wait:.1f}s, {ahead} en file")
+            raise AdmissionRejected(wait, reason)
+
+        waiter = _Waiter(
+            session_id=session_id, kind=kind, estimate=estimate,
+            deadline=time.monotonic() + self.max_wait,
+            future=self._loop.create_future(),
+        )
+        self._queues[priority].setdefault(session_id, deque()).append(waiter)
+        self._depth[kind] += 1
+        ADMISSION_QUEUE_DEPTH.set(self._depth[kind], kind=kind)
+        self._wakeup.set()
+
+        try:
+            await waiter.future
+        finally:
+            ADMISSION_WAIT_SECONDS.observe(time.monotonic() - waiter.enqueued, kind=kind)
+        ticket = Ticket(estimate)
+        _current_ticket.set(ticket)
+        return ticket
+
+    def settle(self, provider: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        """Charge real usage after an LLM call (any thread)"""
+        if not self.enabled:
+            return
+        counted = provider == settings.LLM_ADMISSION_PROVIDER
+        actual = (prompt_tokens or 0) + (completion_tokens or 0)
+        ticket = _current_ticket.get()
+        with self._lock:
+            if counted and actual:
+                self.tokens_per_call = 0.8 * self.tokens_per_call + 0.2 * actual
+            if ticket is not None and not ticket.settled:
+                ticket.settled = True
+                if counted:
+                    delta = (actual or ticket.estimate) - ticket.estimate
+                else:
+                    # Servi par un autre fournisseur (bascule): quota rendu
+                    delta = -ticket.estimate
+                    if self.requests:
+                        self.requests.consume(-1)
+                if self.tokens:
+                    self.tokens.consume(delta)
+            elif counted:
+                # Appel hors file (résumés en arrière-plan): compté après coup
+                if self.requests:
+                    self.requests.consume(1)
+                if self.tokens:
+                    self.tokens.consume(actual or self.tokens_per_call)
+
+    def penalize(self, retry_after: Optional[float]):
+        """Provider answered 429 anyway: pause admissions (any thread)"""
+        if not self.enabled:
+            return
+        pause = retry_after or settings.LLM_COOLDOWN_SECONDS
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        logger.warning(f"🚦 Quota {settings.LLM_ADMISSION_PROVIDER} atteint malgré l'admission, pause {pause:.0f}s")
+
+    def stats(self) -> Dict:
+        return {
+            "queued": dict(self._depth),
+            "tokens_per_call": round(self.tokens_per_call),
+            "paused_s": round(max(0.0, self._paused_until - time.monotonic()), 1),
+        }
+
+
+# Singleton
+llm_admission = AdmissionController()
@@ -0,0 +1,109 @@
+"""
+Semantic response cache for stateless tutor turns
+
+Index vectoriel plat (produit scalaire sur embeddings normalisés) par
+partition (langue, RAG). Entrées bornées, avec TTL et éviction LRU.
+"""
+import time
+import threading
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from backend.config import settings
+from backend.services.rag_service import rag_service
+from backend.services.metrics import CACHE_REQUESTS, EMBEDDING_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class _Partition:
+    """Flat vector index with fixed capacity"""
+
+    def __init__(self, dim: int, capacity: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires = np.zeros(capacity, dtype=np.float64)   # 0 = slot libre
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.answers: List[Optional[str]] = [None] * capacity
+
+    def search(self, vector: np.ndarray, now: float) -> Tuple[int, float]:
+        live = self.expires > now
+        if not live.any():
+            return -1, 0.0
+        scores = self.vectors @ vector
+        scores[~live] = -1.0
+        idx = int(np.argmax(scores))
+        return idx, float(scores[idx])
+
+    def free_slot(self, now: float) -> int:
+        """Free or expired slot first, otherwise the least recently used"""
+        expired = np.flatnonzero(self.expires <= now)
+        if expired.size:
+            return int(expired[0])
+        return int(np.argmin(self.last_used))
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = None, ttl: int = None, max_entries: int = None):
+        self.threshold = threshold or settings.SEMANTIC_CACHE_THRESHOLD
+        self.ttl = ttl or settings.SEMANTIC_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self._partitions: Dict[Tuple[str, bool], _Partition] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SEMANTIC_CACHE_ENABLED
+
+    def embed(self, query: str) -> np.ndarray:
+        """Normalized query embedding (same model as the RAG index)"""
+        with EMBEDDING_SECONDS.time(op="cache"):
+            vector = rag_service.embedding_model.encode(query.strip(), normalize_embeddings=True)
+        return np.asarray(vector, dtype=np.float32)
+
+    def get(self, vector: np.ndarray, language: str, use_rag: bool) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            partition = self._partitions.get((language, use_rag))
+            if partition is None:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache="semantic", result="miss")
+                return None
+            idx, score = partition.search(vector, now)
+            if idx < 0 or score < self.threshold:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache="semantic", result="miss")
+                return None
+            partition.last_used[idx] = now
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache="semantic", result="hit")
+            logger.info(f"⚡ Cache sémantique: hit (similarité {score:.3f})")
+            return partition.answers[idx]
+
+    def put(self, vector: np.ndarray, language: str, use_rag: bool, answer: str):
+        now = time.time()
+        with self._lock:
+            partition = self._partitions.get((language, use_rag))
+            if partition is None:
+                partition = _Partition(vector.shape[0], self.max_entries)
+                self._partitions[(language, use_rag)] = partition
+
+            # Quasi-doublon déjà présent: on rafraîchit l'entrée
+            idx, score = partition.search(vector, now)
+            if idx < 0 or score < self.threshold:
+                idx = partition.free_slot(now)
+            partition.vectors[idx] = vector
+            partition.answers[idx] = answer
+            partition.expires[idx] = now + self.ttl
+            partition.last_used[idx] = now
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            now = time.time()
+            size = sum(int((p.expires > now).sum()) for p in self._partitions.values())
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+# Singleton
+semantic_cache = SemanticCache()
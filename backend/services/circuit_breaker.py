@@ -0,0 +1,184 @@
+"""
+Circuit breakers with rolling success/latency windows
+
+Un disjoncteur par fournisseur (DuckDuckGo JSON, DuckDuckGo HTML, Bing):
+- fenêtre glissante (en secondes) des derniers appels: succès/échec + latence
+- ouvert si, avec assez d'appels, le taux d'échec OU d'appels lents dépasse le seuil
+- ouvert = fournisseur ignoré pendant le cooldown, puis un seul appel d'essai
+  (semi-ouvert): succès -> fermé, échec -> rouvert
+- ordre d'essai: fermés d'abord, puis dégradés, puis l'ordre configuré
+"""
+import time
+import threading
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from backend.config import settings
+from backend.services.metrics import BREAKER_STATE, BREAKER_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_RANK = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_seconds: Optional[float] = None,
+        min_calls: Optional[int] = None,
+        failure_rate: Optional[float] = None,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: Optional[float] = None,
+        cooldown_seconds: Optional[float] = None,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds or settings.SEARCH_BREAKER_WINDOW_SECONDS
+        self.min_calls = min_calls or settings.SEARCH_BREAKER_MIN_CALLS
+        self.failure_rate_threshold = failure_rate or settings.SEARCH_BREAKER_FAILURE_RATE
+        self.slow_call_seconds = slow_call_seconds or settings.SEARCH_BREAKER_SLOW_CALL_SECONDS
+        self.slow_call_rate_threshold = slow_call_rate or settings.SEARCH_BREAKER_SLOW_CALL_RATE
+        self.cooldown_seconds = cooldown_seconds or settings.SEARCH_BREAKER_COOLDOWN_SECONDS
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self._probe_in_flight = False
+        self._calls: Deque[Tuple[float, bool, float]] = deque()  # (ts, ok, latency)
+        self._lock = threading.Lock()
+        BREAKER_STATE.set(0, breaker=name)
+
+    # --------------------------
+    # Fenêtre glissante
+    # --------------------------
+    def _prune(self, now: float):
+        horizon = now - self.window_seconds
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+
+    def _rates(self) -> Tuple[int, float, float]:
+        total = len(self._calls)
+        if not total:
+            return 0, 0.0, 0.0
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        slow = sum(1 for _, ok, latency in self._calls if ok and latency >= self.slow_call_seconds)
+        return total, failures / total, slow / total
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"🔌 Disjoncteur {self.name}: {self.state} -> {state}")
+        BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
+        BREAKER_STATE.set(STATE_RANK[state], breaker=self.name)
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.time()
+            self.opened_count += 1
+        elif state == CLOSED:
+            # Repartir d'une fenêtre vide: les échecs d'avant la panne ne comptent plus
+            self._calls.clear()
+
+    # --------------------------
+    # API
+    # --------------------------
+    def allow(self) -> bool:
+        """Whether a call may go through now (claims the single probe when half-open)"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.cooldown_seconds:
+                    return False
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self, latency: float):
+        now = time.time()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if latency < self.slow_call_seconds:
+                    self._transition(CLOSED)
+                else:
+                    self._transition(OPEN)
+                return
+            self._calls.append((now, True, latency))
+            self._evaluate(now)
+
+    def record_failure(self, latency: float = 0.0):
+        now = time.time()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                self._transition(OPEN)
+                return
+            self._calls.append((now, False, latency))
+            self._evaluate(now)
+
+    def _evaluate(self, now: float):
+        self._prune(now)
+        total, failure_rate, slow_rate = self._rates()
+        if self.state != CLOSED or total < self.min_calls:
+            return
+        if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+            logger.warning(f"⚠️ {self.name}: {failure_rate:.0%} d'échecs, {slow_rate:.0%} d'appels lents "
+                           f"sur {total} appels, mis de côté {self.cooldown_seconds:.0f}s")
+            self._transition(OPEN)
+
+    def is_degraded(self) -> bool:
+        """Closed but past half of either threshold (tried after healthier providers)"""
+        with self._lock:
+            self._prune(time.time())
+            _, failure_rate, slow_rate = self._rates()
+        return (failure_rate >= self.failure_rate_threshold / 2
+                or slow_rate >= self.slow_call_rate_threshold / 2)
+
+    def status(self) -> Dict:
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            total, failure_rate, slow_rate = self._rates()
+            latencies = sorted(latency for _, ok, latency in self._calls if ok)
+            retry_in = max(0.0, self.cooldown_seconds - (now - self.opened_at)) if self.state == OPEN else 0.0
+            return {
+                "state": self.state,
+                "calls": total,
+                "failure_rate": round(failure_rate, 3),
+                "slow_rate": round(slow_rate, 3),
+                "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000) if latencies else None,
+                "retry_in_s": round(retry_in, 1),
+                "opened_count": self.opened_count,
+            }
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name)
+            return self._breakers[name]
+
+    def ordered(self, names: Iterable[str]) -> List[str]:
+        """Healthiest first; configured order breaks ties"""
+        def rank(item):
+            index, name = item
+            breaker = self.get(name)
+            return (STATE_RANK[breaker.state], breaker.is_degraded(), index)
+
+        return [name for _, name in sorted(enumerate(names), key=rank)]
+
+    def status(self) -> Dict[str, Dict]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.status() for b in breakers}
+
+
+# Singleton (fournisseurs de recherche web)
+search_breakers = BreakerRegistry()
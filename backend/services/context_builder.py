@@ -0,0 +1,176 @@
+"""
+Token-budgeted context assembly for LLM prompts
+
+Remplit un budget de tokens par priorité:
+ 1) tours récents de la conversation
+ 2) résumé des anciens tours (si la session en a un)
+ 3) extraits RAG
+ 4) historique plus ancien
+"""
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Dict, Optional
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except Exception as e:
+    logger.warning(f"⚠️ tiktoken non disponible, comptage approximatif des tokens: {e}")
+    TIKTOKEN_AVAILABLE = False
+
+RAG_HEADER = "INFO ADDITIONNELLE:"
+SUMMARY_HEADER = "RÉSUMÉ DE LA CONVERSATION:"
+
+
+@dataclass
+class BuiltContext:
+    text: str = ""
+    tokens: int = 0
+    sections: Dict[str, int] = field(default_factory=dict)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Tokenizer BPE (le vocabulaire de Llama 3 dérive de cl100k_base)"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"⚠️ Encodage {settings.TOKENIZER_ENCODING} indisponible: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the tokenizer (≈ 4 chars/token if unavailable)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        max_chars = max_tokens * 4
+        return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]).rstrip() + "…"
+
+
+class ContextBuilder:
+    def __init__(
+        self,
+        budget: Optional[int] = None,
+        recent_turns: Optional[int] = None,
+        max_item_tokens: Optional[int] = None
+    ):
+        self.budget = budget or settings.CONTEXT_TOKEN_BUDGET
+        self.recent_turns = recent_turns or settings.CONTEXT_RECENT_TURNS
+        self.max_item_tokens = max_item_tokens or settings.CONTEXT_MAX_ITEM_TOKENS
+        self.remaining = self.budget
+
+    def _take(self, text: str) -> Optional[str]:
+        """Reserve budget for one item, truncating it if needed. None when full"""
+        # -1: place du saut de ligne
+        limit = min(self.max_item_tokens, self.remaining - 1)
+        if limit <= 0 or not text:
+            return None
+        text = truncate_to_tokens(text, limit)
+        cost = count_tokens(text) + 1
+        if cost > self.remaining:
+            return None
+        self.remaining -= cost
+        return text
+
+    def build(
+        self,
+        history: Optional[List[Dict]] = None,
+        research_context: str = "",
+        query: str = "",
+        summary: str = ""
+    ) -> BuiltContext:
+        turns = [m for m in (history or []) if m.get("content")]
+        # Le message courant est déjà envoyé comme question: ne pas le dupliquer
+        if turns and query and turns[-1].get("role") == "user" and turns[-1]["content"] == query:
+            turns = turns[:-1]
+
+        split = max(0, len(turns) - self.recent_turns)
+        recent, older = turns[split:], turns[:split]
+        chunks = [c.strip() for c in research_context.split("\n\n") if c.strip()] if research_context else []
+
+        # 1) Tours récents (du plus récent au plus ancien)
+        kept_recent = []
+        for msg in reversed(recent):
+            line = self._take(f"{msg['role']}: {msg['content']}")
+            if line is None:
+                break
+            kept_recent.insert(0, line)
+
+        # 2) Résumé des anciens tours
+        kept_summary = None
+        if summary:
+            kept_summary = self._take(f"{SUMMARY_HEADER}\n{summary}")
+
+        # 3) Extraits RAG
+        kept_chunks = []
+        header_cost = count_tokens(RAG_HEADER) + 2
+        if chunks and self.remaining > header_cost:
+            self.remaining -= header_cost
+            for chunk in chunks:
+                text = self._take(chunk)
+                if text is None:
+                    break
+                kept_chunks.append(text)
+            if not kept_chunks:
+                self.remaining += header_cost
+
+        # 4) Historique plus ancien (du plus récent au plus ancien)
+        kept_older = []
+        for msg in reversed(older):
+            line = self._take(f"{msg['role']}: {msg['content']}")
+            if line is None:
+                break
+            kept_older.insert(0, line)
+
+        parts = []
+        if kept_summary:
+            parts.append(kept_summary)
+        if kept_older or kept_recent:
+            parts.append("\n".join(kept_older + kept_recent))
+        if kept_chunks:
+            parts.append(RAG_HEADER + "\n" + "\n\n".join(kept_chunks))
+        text = "\n\n".join(parts)
+
+        return BuiltContext(
+            text=text,
+            tokens=count_tokens(text),
+            sections={
+                "recent": len(kept_recent),
+                "summary": 1 if kept_summary else 0,
+                "rag": len(kept_chunks),
+                "older": len(kept_older),
+            }
+        )
+
+
+def build_context(
+    history: Optional[List[Dict]] = None,
+    research_context: str = "",
+    query: str = "",
+    summary: str = "",
+    budget: Optional[int] = None
+) -> BuiltContext:
+    """Assemble the prompt context within the configured token budget"""
+    return ContextBuilder(budget=budget).build(history, research_context, query, summary)
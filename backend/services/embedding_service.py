@@ -0,0 +1,449 @@
+"""
+Embedding encoders for RAGService
+
+- LocalEncoder: SentenceTransformer dans le processus (comportement historique)
+- OnnxEncoder: même modèle exporté en ONNX (option: quantification int8
+  dynamique), exécuté par onnxruntime sans importer torch. L'export est fait
+  une fois (EMBEDDING_ONNX_DIR) et vérifié contre PyTorch (similarité cosinus)
+- ProcessPoolEncoder: EMBEDDING_WORKERS processus dédiés; les textes passent par
+  un socket local, les vecteurs float32 reviennent par mémoire partagée (un
+  segment par worker, sans sérialisation). Ce n'est pas du zéro copie: le
+  résultat est copié une fois hors du segment (memcpy), qui sert dès l'appel
+  suivant; une vue retenue (ex. vecteur gardé par le cache sémantique)
+  bloquerait le worker. Les gros lots sont découpés et encodés en parallèle sur
+  tous les workers. En cas d'échec (worker arrêté avant de se connecter,
+  démarrage trop long, worker mort), bascule définitive sur l'encodage en processus.
+
+Tous exposent encode(sentences, normalize_embeddings=False) comme
+SentenceTransformer: un vecteur pour une chaîne, une matrice pour une liste.
+"""
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import secrets
+import threading
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from multiprocessing.connection import Listener
+from typing import Dict, List, Optional, Union
+import numpy as np
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Phrases de contrôle pour l'accord ONNX / PyTorch
+AGREEMENT_SENTENCES = [
+    "How do I conjugate the verb to be in the past tense?",
+    "¿Cuál es la diferencia entre ser y estar?",
+    "Quelle est la différence entre le passé composé et l'imparfait ?",
+    "Give me three examples of phrasal verbs with 'get'.",
+    "Explícame el subjuntivo con ejemplos sencillos.",
+    "Comment dit-on 'good morning' en français ?",
+    "What does 'break the ice' mean?",
+    "Corrige esta frase: yo soy cansado hoy.",
+]
+
+
+def cosine_agreement(a: np.ndarray, b: np.ndarray) -> Dict[str, float]:
+    """Row-wise cosine similarity between two embedding matrices"""
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    cos = (a * b).sum(axis=1)
+    return {"min": float(cos.min()), "mean": float(cos.mean())}
+
+
+class LocalEncoder:
+    """In-process SentenceTransformer, loaded on first use"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self) -> "LocalEncoder":
+        self.model
+        return self
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def encode(self, sentences: Union[str, List[str]], normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        return self.model.encode(sentences, normalize_embeddings=normalize_embeddings, **kwargs)
+
+
+class OnnxEncoder:
+    """SentenceTransformer exported to ONNX, run with onnxruntime (no torch at runtime)"""
+
+    def __init__(self, model_name: str, quantized: bool = False, threads: Optional[int] = None):
+        self.model_name = model_name
+        self.quantized = quantized
+        self.threads = threads
+        self.directory = os.path.join(settings.EMBEDDING_ONNX_DIR, re.sub(r"[^\w.-]+", "_", model_name))
+        self._session = None
+        self._tokenizer = None
+        self._meta: Dict = {}
+        self._lock = threading.Lock()
+
+    @property
+    def _model_path(self) -> str:
+        return os.path.join(self.directory, "model.int8.onnx" if self.quantized else "model.onnx")
+
+    def load(self) -> "OnnxEncoder":
+        with self._lock:
+            if self._session is not None:
+                return self
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+
+            if not os.path.exists(self._model_path):
+                export_onnx(self.model_name, self.directory, quantize=self.quantized)
+            with open(os.path.join(self.directory, "meta.json"), encoding="utf-8") as f:
+                self._meta = json.load(f)
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            self._session = ort.InferenceSession(self._model_path, options, providers=["CPUExecutionProvider"])
+            self._input_names = {i.name for i in self._session.get_inputs()}
+            self._tokenizer = AutoTokenizer.from_pretrained(self.directory)
+            agreement = self._meta.get("agreement", {}).get("int8" if self.quantized else "fp32")
+            logger.info(f"✅ Embeddings ONNX{' int8' if self.quantized else ''} chargés "
+                        f"(accord PyTorch: {agreement})")
+        return self
+
+    @property
+    def dimension(self) -> int:
+        self.load()
+        return int(self._meta["dim"])
+
+    def encode(self, sentences: Union[str, List[str]], normalize_embeddings: bool = False,
+               batch_size: int = 32, **_) -> np.ndarray:
+        self.load()
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        parts = []
+        for start in range(0, len(texts), batch_size):
+            batch = self._tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=self._meta["max_seq_length"], return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in batch.items() if k in self._input_names}
+            hidden = self._session.run(None, feeds)[0]
+            parts.append(self._pool(hidden, batch["attention_mask"]))
+        vectors = np.concatenate(parts) if parts else np.zeros((0, self._meta["dim"]), dtype=np.float32)
+        if self._meta["normalize"] or normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors[0] if single else vectors
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        pooling = self._meta["pooling"]
+        if pooling == "cls":
+            return hidden[:, 0].astype(np.float32)
+        mask = mask[..., None].astype(np.float32)
+        if pooling == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1).astype(np.float32)
+        return ((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)).astype(np.float32)
+
+
+def export_onnx(model_name: str, directory: str, quantize: bool = True) -> Dict:
+    """
+    Export the transformer of a SentenceTransformer to ONNX (+ int8 dynamic
+    quantization) with its tokenizer and pooling config, then record cosine
+    agreement with the PyTorch model. Needs torch only here, once.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    os.makedirs(directory, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0].auto_model.eval()
+    pooling = next((m for m in st if isinstance(m, Pooling)), None)
+    meta = {
+        "model": model_name,
+        "dim": st.get_sentence_embedding_dimension(),
+        "max_seq_length": st.max_seq_length,
+        "pooling": pooling.get_pooling_mode_str() if pooling is not None else "mean",
+        "normalize": any(isinstance(m, Normalize) for m in st),
+        "agreement": {},
+    }
+
+    fp32_path = os.path.join(directory, "model.onnx")
+    dummy = st.tokenizer(["hello world"], return_tensors="pt", padding=True)
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+    axes = {n: {0: "batch", 1: "sequence"} for n in input_names + ["last_hidden_state"]}
+    logger.info(f"📦 Export ONNX de {model_name} -> {directory}")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, tuple(dummy[n] for n in input_names), fp32_path,
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=axes, opset_version=14, do_constant_folding=True,
+        )
+    st.tokenizer.save_pretrained(directory)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(directory, "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    # Contrôle: mêmes phrases, PyTorch contre ONNX
+    reference = st.encode(AGREEMENT_SENTENCES, convert_to_numpy=True)
+    for label, quantized in (("fp32", False), ("int8", True)):
+        if quantized and not quantize:
+            continue
+        candidate = OnnxEncoder(model_name, quantized=quantized)
+        candidate.directory = directory
+        meta["agreement"][label] = cosine_agreement(reference, candidate.encode(AGREEMENT_SENTENCES))
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    logger.info(f"✅ Export ONNX terminé, accord cosinus: {meta['agreement']}")
+    return meta
+
+
+def build_local_encoder(model_name: str, backend: Optional[str] = None, threads: Optional[int] = None):
+    """In-process encoder for the configured backend, falling back to torch"""
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend not in BACKENDS:
+        logger.warning(f"⚠️ EMBEDDING_BACKEND inconnu: {backend}, utilisation de torch")
+        backend = "torch"
+    if backend == "torch":
+        return LocalEncoder(model_name)
+    try:
+        encoder = OnnxEncoder(model_name, quantized=backend == "onnx-int8", threads=threads).load()
+    except Exception as e:
+        logger.error(f"❌ Backend {backend} indisponible ({e}), utilisation de torch")
+        return LocalEncoder(model_name)
+    agreement = encoder._meta.get("agreement", {}).get("int8" if encoder.quantized else "fp32")
+    if agreement and agreement["min"] < settings.EMBEDDING_MIN_AGREEMENT:
+        logger.error(f"❌ Backend {backend}: accord cosinus {agreement['min']:.4f} < "
+                     f"{settings.EMBEDDING_MIN_AGREEMENT}, utilisation de torch")
+        return LocalEncoder(model_name)
+    return encoder
+
+
+class _Worker:
+    def __init__(self, index: int, shm: shared_memory.SharedMemory, process: subprocess.Popen):
+        self.index = index
+        self.shm = shm
+        self.process = process
+        self.conn = None
+        self.dim = 0
+        self.rows = 0
+
+
+class ProcessPoolEncoder:
+    def __init__(self, model_name: str, workers: int):
+        self.model_name = model_name
+        self._fallback = None  # encodeur en processus, construit seulement si le pool tombe
+        self._fallback_lock = threading.Lock()
+        self._workers: List[_Worker] = []
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._broken = False
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed-dispatch")
+        self.batch_size = settings.EMBEDDING_BATCH_SIZE
+        try:
+            self._start(workers)
+        except Exception as e:
+            logger.error(f"❌ Pool d'embeddings non démarré, encodage en processus: {e}")
+            self._fail()
+        atexit.register(self.close)
+
+    @property
+    def fallback(self):
+        # build_local_encoder charge (ou exporte) le modèle ONNX: pas dans le processus web sans besoin
+        if self._fallback is None:
+            with self._fallback_lock:
+                if self._fallback is None:
+                    self._fallback = build_local_encoder(self.model_name)
+        return self._fallback
+
+    @property
+    def dimension(self) -> int:
+        for worker in self._workers:
+            if worker.dim:
+                return worker.dim
+        if not self._broken:
+            # Aucun worker encore connecté: attendre le premier
+            try:
+                worker = self._idle.get(timeout=settings.EMBEDDING_WORKER_START_TIMEOUT_SECONDS)
+            except queue.Empty:
+                return self.fallback.dimension
+            self._idle.put(worker)  # rendu tel quel (None: pool fermé, réveille les autres)
+            if worker is not None:
+                return worker.dim
+        return self.fallback.dimension
+
+    # --------------------------
+    # Cycle de vie
+    # --------------------------
+    def _start(self, workers: int):
+        authkey = secrets.token_bytes(16)
+        self._listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        host, port = self._listener.address
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        env = {**os.environ, "EMBEDDING_WORKER_AUTHKEY": authkey.hex()}
+        slot_bytes = settings.EMBEDDING_SHM_MB * 1024 * 1024
+
+        for index in range(workers):
+            shm = shared_memory.SharedMemory(create=True, size=slot_bytes)
+            process = subprocess.Popen(
+                [sys.executable, "-m", "backend.services.embedding_worker",
+                 "--address", f"{host}:{port}", "--shm", shm.name,
+                 "--model", self.model_name, "--threads", str(threads),
+                 "--backend", settings.EMBEDDING_BACKEND],
+                env=env,
+            )
+            self._workers.append(_Worker(index, shm, process))
+
+        # Les workers se connectent quand leur modèle est chargé (en arrière-plan)
+        threading.Thread(target=self._accept, name="embed-accept", daemon=True).start()
+        threading.Thread(target=self._watch_startup, name="embed-watch", daemon=True).start()
+        logger.info(f"🧮 Pool d'embeddings: {workers} processus x {threads} threads")
+
+    def _accept(self):
+        by_pid = {w.process.pid: w for w in self._workers}
+        try:
+            for _ in self._workers:
+                conn = self._listener.accept()
+                _, pid, dim, rows = conn.recv()
+                worker = by_pid[pid]
+                worker.conn, worker.dim, worker.rows = conn, dim, rows
+                self.batch_size = min(self.batch_size, rows)
+                self._idle.put(worker)
+                logger.info(f"✅ Worker d'embeddings {worker.index} prêt (pid {pid})")
+        except Exception as e:
+            if not self._closed:
+                logger.error(f"❌ Connexion d'un worker d'embeddings échouée: {e}")
+                self._fail()
+
+    def _watch_startup(self):
+        """Fail fast if a worker exits before connecting (accept() would wait for it forever)"""
+        deadline = time.monotonic() + settings.EMBEDDING_WORKER_START_TIMEOUT_SECONDS
+        while not self._closed:
+            pending = [w for w in self._workers if w.conn is None]
+            if not pending:
+                return
+            dead = next((w for w in pending if w.process.poll() is not None), None)
+            if dead is not None:
+                logger.error(f"❌ Worker d'embeddings {dead.index} arrêté avant de se connecter "
+                             f"(code {dead.process.returncode}), encodage en processus")
+                self._fail()
+                return
+            if time.monotonic() > deadline:
+                if len(pending) < len(self._workers):
+                    # Certains workers servent déjà: le pool continue sans les retardataires
+                    logger.warning(f"⚠️ {len(pending)} worker(s) d'embeddings toujours pas prêts")
+                    return
+                logger.error(f"❌ Workers d'embeddings non prêts après "
+                             f"{settings.EMBEDDING_WORKER_START_TIMEOUT_SECONDS:.0f}s, encodage en processus")
+                self._fail()
+                return
+            time.sleep(0.1)
+
+    def _fail(self):
+        self._broken = True
+        self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self._workers:
+            try:
+                if worker.conn is not None:
+                    worker.conn.send(("stop",))
+                    worker.conn.close()
+            except Exception:
+                pass
+            if worker.process.poll() is None:
+                worker.process.terminate()
+            worker.shm.close()
+            try:
+                worker.shm.unlink()
+            except FileNotFoundError:
+                pass
+        try:
+            self._listener.close()
+        except Exception:
+            pass
+        # Réveille les appels en attente d'un worker
+        self._idle.put(None)
+
+    # --------------------------
+    # Encodage
+    # --------------------------
+    def _encode_chunk(self, texts: List[str], normalize: bool) -> np.ndarray:
+        try:
+            worker = self._idle.get(timeout=settings.EMBEDDING_WORKER_START_TIMEOUT_SECONDS)
+        except queue.Empty:
+            raise RuntimeError("aucun worker d'embeddings disponible")
+        if worker is None:
+            self._idle.put(None)
+            raise RuntimeError("pool d'embeddings fermé")
+        try:
+            worker.conn.send(("encode", texts, normalize))
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            raise RuntimeError(f"worker {worker.index} perdu: {e}")
+        if status != "ok":
+            self._idle.put(worker)
+            raise ValueError(payload)
+        view = np.ndarray((worker.rows, worker.dim), dtype=np.float32, buffer=worker.shm.buf)
+        # Une copie hors du segment (pas de zéro copie): il est réécrit dès que le worker est rendu
+        vectors = view[:payload].copy()
+        self._idle.put(worker)
+        return vectors
+
+    def encode(self, sentences: Union[str, List[str]], normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        if self._broken:
+            return self.fallback.encode(sentences, normalize_embeddings=normalize_embeddings, **kwargs)
+        chunks = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        try:
+            if len(chunks) == 1:
+                parts = [self._encode_chunk(chunks[0], normalize_embeddings)]
+            else:
+                parts = list(self._executor.map(lambda c: self._encode_chunk(c, normalize_embeddings), chunks))
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Pool d'embeddings indisponible ({e}), bascule en processus")
+            self._fail()
+            return self.fallback.encode(sentences, normalize_embeddings=normalize_embeddings, **kwargs)
+
+        vectors = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return vectors[0] if single else vectors
+
+
+def create_encoder(model_name: Optional[str] = None):
+    """Encoder selected by settings (EMBEDDING_WORKERS=0: in-process)"""
+    model_name = model_name or settings.EMBEDDING_MODEL
+    if settings.EMBEDDING_WORKERS > 0:
+        return ProcessPoolEncoder(model_name, settings.EMBEDDING_WORKERS)
+    return build_local_encoder(model_name).load()
@@ -0,0 +1,79 @@
+"""
+Embedding worker process (started by embedding_service.ProcessPoolEncoder)
+
+Charge le modèle une fois, se connecte au processus parent par socket local,
+reçoit des lots de textes et écrit les vecteurs float32 directement dans le
+segment de mémoire partagée qui lui est attribué (aucune sérialisation).
+
+    python -m backend.services.embedding_worker --address 127.0.0.1:PORT --shm NAME --model MODEL
+"""
+import os
+import sys
+import argparse
+
+
+def _attach_shared_memory(name: str):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # Le parent possède le segment: ce processus ne doit pas le supprimer en sortant
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--address", required=True)
+    parser.add_argument("--shm", required=True)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--backend", default="torch")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+    from multiprocessing.connection import Client
+    from backend.services.embedding_service import build_local_encoder, LocalEncoder
+
+    encoder = build_local_encoder(args.model, args.backend, threads=args.threads).load()
+    if isinstance(encoder, LocalEncoder):
+        import torch
+        torch.set_num_threads(max(1, args.threads))
+    dim = encoder.dimension
+    shm = _attach_shared_memory(args.shm)
+    rows = shm.size // (dim * 4)
+    out = np.ndarray((rows, dim), dtype=np.float32, buffer=shm.buf)
+
+    host, port = args.address.rsplit(":", 1)
+    authkey = bytes.fromhex(os.environ["EMBEDDING_WORKER_AUTHKEY"])
+    conn = Client((host, int(port)), authkey=authkey)
+    conn.send(("ready", os.getpid(), dim, rows))
+
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message[0] == "stop":
+                break
+            _, texts, normalize = message
+            try:
+                if len(texts) > rows:
+                    raise ValueError(f"batch of {len(texts)} exceeds slot capacity {rows}")
+                vectors = encoder.encode(texts, batch_size=len(texts), normalize_embeddings=normalize)
+                out[:len(texts)] = vectors
+                conn.send(("ok", len(texts)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        del out
+        shm.close()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+Extraction of the main text of candidate web pages
+- Téléchargement en streaming, plafonné en octets et en temps (arrêt anticipé)
+- Parseur lxml (libxml2, en C) au lieu de html.parser
+- Suppression du boilerplate (nav, menus, pieds de page, cookies...) puis
+  sélection du bloc de contenu principal par densité de texte
+- Pool de threads: les pages candidates sont téléchargées en parallèle au
+  lieu d'une à une (libxml2 relâche le GIL pendant l'analyse elle-même)
+"""
+import re
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from lxml import etree
+from lxml import html as lxml_html
+from backend.config import settings
+from backend.services.http_service import http_service
+from backend.services.metrics import PAGE_FETCH_SECONDS, PAGE_EXTRACT_SECONDS, PAGE_FETCHES
+
+logger = logging.getLogger(__name__)
+
+CHUNK_BYTES = 16 * 1024
+BOILERPLATE_TAGS = (
+    "script", "style", "noscript", "template", "nav", "header", "footer", "aside",
+    "form", "iframe", "svg", "button", "select", "input", "textarea",
+)
+# Comparé à chaque mot d'une classe ou d'un id ("site-nav", "comment_list"), jamais
+# en sous-chaîne: "canvas", "unavailable" ou "navy" ne sont pas du boilerplate
+BOILERPLATE_HINT = re.compile(
+    r"(nav|navbar|navigation|menu|footer|sidebar|cookie|consent|banner|breadcrumb|comment|"
+    r"share|sharing|social|related|promo|advert|advertisement|sponsor|sponsored|subscribe|"
+    r"newsletter|popup|modal|signup|login|masthead)s?",
+    re.IGNORECASE,
+)
+HINT_SPLIT = re.compile(r"[\s_-]+")
+PROTECTED_TAGS = {"html", "body", "article", "main"}
+# Un conteneur qui porte l'essentiel des paragraphes n'est jamais supprimé
+# sur la foi de sa classe ("page has-sidebar", "content with-comments"...)
+PROTECTED_TEXT_SHARE = 0.5
+TEXT_BLOCKS = ("p", "pre", "blockquote", "li", "h2", "h3", "td")
+CHARSET_SNIFF = re.compile(rb"<meta[^>]+charset", re.IGNORECASE)
+
+_local = threading.local()
+
+
+class NotHTMLError(ValueError):
+    """Candidate URL does not serve an HTML document"""
+
+
+def _parser(encoding: Optional[str]) -> lxml_html.HTMLParser:
+    # Un parseur par thread et par encodage (les parseurs lxml ne sont pas partagés entre threads)
+    parsers = getattr(_local, "parsers", None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    if encoding not in parsers:
+        parsers[encoding] = lxml_html.HTMLParser(
+            encoding=encoding, remove_comments=True, remove_pis=True, no_network=True
+        )
+    return parsers[encoding]
+
+
+# ========================================
+# Téléchargement borné
+# ========================================
+def fetch_html(
+    url: str,
+    max_bytes: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[bytes, Optional[str], bool]:
+    """Stream at most max_bytes of an HTML page; returns (body, encoding, truncated)"""
+    max_bytes = max_bytes or settings.PAGE_MAX_BYTES
+    timeout = timeout or settings.PAGE_FETCH_TIMEOUT_SECONDS
+    deadline = time.monotonic() + timeout
+    chunks: List[bytes] = []
+    size, truncated = 0, False
+
+    with http_service.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        content_type = r.headers.get("Content-Type", "").lower()
+        if content_type and "html" not in content_type and "xml" not in content_type:
+            raise NotHTMLError(f"unsupported content type {content_type!r}")
+        encoding = r.encoding if "charset=" in content_type else None
+        for chunk in r.iter_content(CHUNK_BYTES):
+            chunks.append(chunk)
+            size += len(chunk)
+            # Le préfixe suffit: le contenu principal est presque toujours en tête de page
+            if size >= max_bytes or time.monotonic() > deadline:
+                truncated = True
+                break
+
+    body = b"".join(chunks)[:max_bytes]
+    if encoding is None and not CHARSET_SNIFF.search(body[:4096]):
+        # Sans en-tête ni <meta charset>, libxml2 supposerait latin-1
+        encoding = "utf-8"
+    return body, encoding, truncated
+
+
+# ========================================
+# Contenu principal
+# ========================================
+def _text(el) -> str:
+    return " ".join(el.text_content().split())
+
+
+def _link_density(el, text_len: int) -> float:
+    if not text_len:
+        return 1.0
+    link_len = sum(len(" ".join(a.text_content().split())) for a in el.iter("a"))
+    return min(1.0, link_len / text_len)
+
+
+def _paragraph_chars(el) -> int:
+    return sum(len(_text(p)) for p in el.iter("p", "pre", "blockquote"))
+
+
+def _boilerplate_hint(el) -> bool:
+    hints = f"{el.get('class', '')} {el.get('id', '')}"
+    return any(BOILERPLATE_HINT.fullmatch(word) for word in HINT_SPLIT.split(hints) if word)
+
+
+def _strip_boilerplate(root):
+    etree.strip_elements(root, *BOILERPLATE_TAGS, with_tail=False)
+    total = None
+    doomed = []
+    for el in root.xpath("//*[@class or @id or @role]"):
+        if el.tag in PROTECTED_TAGS:
+            continue
+        role = el.get("role", "")
+        if role in ("navigation", "banner", "contentinfo", "complementary") or _boilerplate_hint(el):
+            if total is None:
+                total = _paragraph_chars(root)
+            if total and _paragraph_chars(el) > PROTECTED_TEXT_SHARE * total:
+                continue
+            doomed.append(el)
+    for el in doomed:
+        # Un ancêtre déjà retiré emporte ses descendants
+        if el.getparent() is not None:
+            el.drop_tree()
+
+
+def _main_node(root):
+    """Explicit content landmarks first, then the densest paragraph container"""
+    for path in ("//article", "//main", "//*[@role='main']"):
+        nodes = root.xpath(path)
+        if nodes:
+            best = max(nodes, key=lambda n: len(n.text_content()))
+            if len(_text(best)) >= 200:
+                return best
+
+    scores: Dict = {}
+    for p in root.iter("p", "pre", "blockquote"):
+        text = _text(p)
+        if len(text) < 25:
+            continue
+        score = 1 + min(len(text) // 100, 3) + text.count(",")
+        parent = p.getparent()
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + score
+        grandparent = parent.getparent()
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0) + score / 2
+    if not scores:
+        return root.find("body") if root.find("body") is not None else root
+
+    def weighted(node) -> float:
+        return scores[node] * (1 - _link_density(node, len(_text(node))))
+
+    return max(scores, key=weighted)
+
+
+def _nested_block(block, stop) -> bool:
+    if block is stop:
+        return False
+    for ancestor in block.iterancestors():
+        if ancestor is stop:
+            return ancestor.tag in TEXT_BLOCKS
+        if ancestor.tag in TEXT_BLOCKS:
+            return True
+    return False
+
+
+def extract_main_text(body: bytes, encoding: Optional[str] = None, max_chars: Optional[int] = None) -> str:
+    """Main readable text of an HTML document, boilerplate removed, cut to max_chars"""
+    max_chars = max_chars or settings.PAGE_MAX_CHARS
+    if not body or not body.strip():
+        return ""
+    try:
+        root = lxml_html.document_fromstring(body, parser=_parser(encoding))
+    except (etree.ParserError, ValueError) as e:
+        logger.debug(f"Unparseable page: {e}")
+        return ""
+
+    _strip_boilerplate(root)
+    node = _main_node(root)
+
+    parts: List[str] = []
+    total = 0
+    for block in node.iter(*TEXT_BLOCKS):
+        # Les blocs imbriqués (li > p) ne sont comptés qu'une fois
+        if _nested_block(block, node):
+            continue
+        text = _text(block)
+        if len(text) < 20 or _link_density(block, len(text)) > 0.5:
+            continue
+        parts.append(text)
+        total += len(text) + 1
+        if total >= max_chars:
+            break
+    if not parts:
+        parts = [_text(node)]
+    return " ".join(parts)[:max_chars]
+
+
+# ========================================
+# Pool
+# ========================================
+class PageExtractor:
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = max(1, workers or settings.EXTRACTION_WORKERS)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="page-extract")
+
+    def extract(self, url: str) -> str:
+        """Download (bounded) and extract one page; never raises"""
+        try:
+            with PAGE_FETCH_SECONDS.time():
+                body, encoding, truncated = fetch_html(url)
+                with PAGE_EXTRACT_SECONDS.time():
+                    text = extract_main_text(body, encoding)
+            PAGE_FETCHES.inc(outcome="truncated" if truncated else "complete")
+            return text
+        except NotHTMLError as e:
+            PAGE_FETCHES.inc(outcome="skipped")
+            logger.debug(f"Skipping {url}: {e}")
+        except Exception as e:
+            PAGE_FETCHES.inc(outcome="error")
+            logger.debug(f"Failed to fetch or parse page {url}: {e}")
+        return ""
+
+    def extract_many(self, candidates: List[Tuple[str, str]], limit: int, min_chars: int = 100) -> List[Dict[str, str]]:
+        """Extract candidates (url, title) in parallel; first `limit` usable pages, in rank order"""
+        if not candidates or limit <= 0:
+            return []
+        futures = [(url, title, self._pool.submit(self.extract, url)) for url, title in candidates]
+        deadline = time.monotonic() + settings.PAGE_FETCH_TIMEOUT_SECONDS * 2
+        results: List[Dict[str, str]] = []
+        for url, title, future in futures:
+            if len(results) >= limit:
+                future.cancel()
+                continue
+            try:
+                text = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception:
+                logger.debug(f"Page extraction timed out: {url}")
+                continue
+            if len(text) > min_chars:
+                results.append({"url": url, "title": title[:200], "content": text})
+        return results
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Singleton
+page_extractor = PageExtractor()
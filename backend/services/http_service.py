@@ -0,0 +1,111 @@
+"""
+Shared HTTP layer for outbound calls
+- Une session requests (pool de connexions) pour tout le processus
+- Timeout toujours borné
+- Petit cache TTL pour les GET idempotents (JSON / texte)
+"""
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from backend.config import settings
+from backend.services.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPService:
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.HTTP_POOL_SIZE,
+            pool_maxsize=settings.HTTP_POOL_SIZE,
+            max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "WALLE-RAG/1.0"
+        self._cache: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _timeout(timeout: Optional[float]) -> float:
+        # Jamais d'appel sans timeout, jamais au-delà du plafond global
+        return min(timeout or settings.HTTP_TIMEOUT_SECONDS, settings.HTTP_TIMEOUT_SECONDS)
+
+    @staticmethod
+    def _key(kind: str, url: str, params: Optional[Dict]) -> Tuple:
+        return (kind, url, tuple(sorted((params or {}).items())))
+
+    def _cache_get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._cache[key]
+                CACHE_REQUESTS.inc(cache="http", result="miss")
+                return None
+            self._cache.move_to_end(key)
+            CACHE_REQUESTS.inc(cache="http", result="hit")
+            return entry[1]
+
+    def _cache_put(self, key: Tuple, value: Any, ttl: float):
+        with self._lock:
+            self._cache[key] = (time.time() + ttl, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > settings.HTTP_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> requests.Response:
+        """Plain GET through the shared pool (no caching)"""
+        return self.session.get(url, params=params, headers=headers, timeout=self._timeout(timeout), **kwargs)
+
+    def get_json(
+        self,
+        url: str,
+        params: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+        ttl: Optional[float] = None
+    ) -> Any:
+        key = self._key("json", url, params)
+        cached = self._cache_get(key)
+        if cached is not None:
+            logger.debug(f"HTTP cache hit: {url}")
+            return cached
+        r = self.get(url, params=params, timeout=timeout)
+        r.raise_for_status()
+        data = r.json()
+        self._cache_put(key, data, ttl or settings.HTTP_CACHE_TTL_SECONDS)
+        return data
+
+    def get_text(
+        self,
+        url: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict] = None,
+        timeout: Optional[float] = None,
+        ttl: Optional[float] = None
+    ) -> str:
+        key = self._key("text", url, params)
+        cached = self._cache_get(key)
+        if cached is not None:
+            logger.debug(f"HTTP cache hit: {url}")
+            return cached
+        r = self.get(url, params=params, headers=headers, timeout=timeout)
+        r.raise_for_status()
+        self._cache_put(key, r.text, ttl or settings.HTTP_CACHE_TTL_SECONDS)
+        return r.text
+
+
+# Singleton
+http_service = HTTPService()
@@ -0,0 +1,360 @@
+"""
+LLM providers (Groq, local OpenAI-compatible server) with health/latency routing
+
+- Un client (et donc un pool de connexions) par fournisseur, partagé entre requêtes
+- Routage: fournisseurs sains d'abord, puis ceux sous le SLO de latence, puis l'ordre configuré
+- Bascule sur le suivant en cas de limite de débit ou d'erreur
+"""
+import json
+import math
+import time
+import threading
+import logging
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+import httpx
+from backend.config import settings
+from backend.services.metrics import LLM_TTFT_SECONDS, LLM_SECONDS, ERRORS
+from backend.services.admission import llm_admission
+
+logger = logging.getLogger(__name__)
+
+try:
+    import groq
+    GROQ_AVAILABLE = True
+except Exception as e:
+    logger.warning(f"⚠️ SDK Groq non disponible: {e}")
+    GROQ_AVAILABLE = False
+
+
+class LLMError(Exception):
+    """Generic provider failure"""
+
+
+class LLMAuthError(LLMError):
+    """Invalid or missing credentials"""
+
+
+class LLMUnavailableError(LLMError):
+    """Provider unreachable (connection refused, DNS, connect timeout)"""
+
+
+class LLMRateLimitError(LLMError):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after or settings.LLM_COOLDOWN_SECONDS)))
+
+
+@dataclass
+class LLMResult:
+    text: str
+    provider: str
+    model: str
+    latency: float
+    ttft: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class LLMProvider:
+    name = "base"
+
+    def __init__(self):
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        raise NotImplementedError
+
+    def is_configured(self) -> bool:
+        raise NotImplementedError
+
+    def is_healthy(self) -> bool:
+        return time.time() >= self.down_until
+
+    def complete(self, messages: List[Dict], max_tokens: int, temperature: float) -> LLMResult:
+        raise NotImplementedError
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.latency_ewma = latency if self.latency_ewma is None else 0.7 * self.latency_ewma + 0.3 * latency
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= settings.LLM_FAILURE_THRESHOLD:
+                self.down_until = time.time() + settings.LLM_COOLDOWN_SECONDS
+                logger.warning(f"⚠️ LLM {self.name}: {self.consecutive_failures} échecs, mis de côté {settings.LLM_COOLDOWN_SECONDS}s")
+
+    def mark_rate_limited(self, retry_after: Optional[float]):
+        with self._lock:
+            self.down_until = time.time() + (retry_after or settings.LLM_COOLDOWN_SECONDS)
+
+    def status(self) -> Dict:
+        return {
+            "configured": self.is_configured(),
+            "healthy": self.is_healthy(),
+            "model": self.model,
+            "latency_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+        }
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+
+    def __init__(self):
+        super().__init__()
+        self._client = None
+
+    @property
+    def model(self) -> str:
+        return settings.GROQ_MODEL
+
+    def is_configured(self) -> bool:
+        return GROQ_AVAILABLE and bool(settings.GROQ_API_KEY)
+
+    @property
+    def client(self):
+        # Client unique: son pool httpx est réutilisé par tous les appels
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = groq.Groq(
+                        api_key=settings.GROQ_API_KEY,
+                        base_url=settings.GROQ_BASE_URL or None,
+                        timeout=settings.LLM_TIMEOUT_SECONDS,
+                        max_retries=0  # la bascule est gérée par le routeur
+                    )
+        return self._client
+
+    def complete(self, messages: List[Dict], max_tokens: int, temperature: float) -> LLMResult:
+        start = time.perf_counter()
+        ttft = None
+        usage = None
+        parts: List[str] = []
+        try:
+            # Streaming pour mesurer le temps jusqu'au premier token
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=0.9,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    parts.append(chunk.choices[0].delta.content)
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                    usage = x_groq.usage
+        except groq.RateLimitError as e:
+            raise LLMRateLimitError(str(e), _parse_retry_after(e.response.headers.get("retry-after"))) from e
+        except groq.AuthenticationError as e:
+            raise LLMAuthError(str(e)) from e
+        except groq.APIConnectionError as e:
+            raise LLMUnavailableError(str(e)) from e
+        except groq.APIError as e:
+            raise LLMError(str(e)) from e
+
+        return LLMResult(
+            text="".join(parts).strip(),
+            provider=self.name,
+            model=self.model,
+            latency=time.perf_counter() - start,
+            ttft=ttft,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Local server exposing /v1/chat/completions (llama.cpp server, Ollama, vLLM...)"""
+    name = "local"
+
+    def __init__(self):
+        super().__init__()
+        self._client: Optional[httpx.Client] = None
+
+    @property
+    def model(self) -> str:
+        return settings.LOCAL_LLM_MODEL
+
+    def is_configured(self) -> bool:
+        return bool(settings.LOCAL_LLM_BASE_URL)
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    headers = {}
+                    if settings.LOCAL_LLM_API_KEY:
+                        headers["Authorization"] = f"Bearer {settings.LOCAL_LLM_API_KEY}"
+                    self._client = httpx.Client(
+                        base_url=settings.LOCAL_LLM_BASE_URL.rstrip("/"),
+                        headers=headers,
+                        timeout=settings.LLM_TIMEOUT_SECONDS,
+                        limits=httpx.Limits(
+                            max_connections=settings.LLM_POOL_SIZE,
+                            max_keepalive_connections=settings.LLM_POOL_SIZE
+                        )
+                    )
+        return self._client
+
+    def complete(self, messages: List[Dict], max_tokens: int, temperature: float) -> LLMResult:
+        start = time.perf_counter()
+        ttft = None
+        usage: Dict = {}
+        parts: List[str] = []
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        try:
+            with self.client.stream("POST", "/chat/completions", json=payload) as r:
+                if r.status_code >= 400:
+                    body = r.read().decode("utf-8", "replace")[:200]
+                    if r.status_code == 429:
+                        raise LLMRateLimitError(body, _parse_retry_after(r.headers.get("retry-after")))
+                    if r.status_code in (401, 403):
+                        raise LLMAuthError(body)
+                    raise LLMError(f"HTTP {r.status_code}: {body}")
+
+                # Server-Sent Events: "data: {...}" jusqu'à "data: [DONE]"
+                for line in r.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    usage = event.get("usage") or usage
+                    choices = event.get("choices") or []
+                    content = choices[0].get("delta", {}).get("content") if choices else None
+                    if content:
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                        parts.append(content)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            raise LLMUnavailableError(f"{type(e).__name__}: {e}") from e
+        except httpx.HTTPError as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        except ValueError as e:
+            raise LLMError(f"Réponse de flux invalide: {e}") from e
+
+        return LLMResult(
+            text="".join(parts).strip(),
+            provider=self.name,
+            model=self.model,
+            latency=time.perf_counter() - start,
+            ttft=ttft,
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+        )
+
+
+PROVIDER_CLASSES = {
+    "groq": GroqProvider,
+    "local": OpenAICompatibleProvider,
+}
+
+
+class LLMRouter:
+    def __init__(self, names: Optional[List[str]] = None):
+        names = names or [n.strip() for n in settings.LLM_PROVIDERS.split(",") if n.strip()]
+        self.providers: List[LLMProvider] = []
+        for name in names:
+            if name not in PROVIDER_CLASSES:
+                logger.warning(f"⚠️ Fournisseur LLM inconnu ignoré: {name}")
+                continue
+            self.providers.append(PROVIDER_CLASSES[name]())
+
+    @property
+    def available(self) -> bool:
+        return any(p.is_configured() for p in self.providers)
+
+    def has(self, name: str) -> bool:
+        return any(p.name == name and p.is_configured() for p in self.providers)
+
+    def _ordered(self) -> List[LLMProvider]:
+        configured = [p for p in self.providers if p.is_configured()]
+
+        def rank(item):
+            index, provider = item
+            too_slow = (
+                provider.latency_ewma is not None
+                and provider.latency_ewma > settings.LLM_LATENCY_SLO_SECONDS
+            )
+            return (not provider.is_healthy(), too_slow, index)
+
+        return [p for _, p in sorted(enumerate(configured), key=rank)]
+
+    def complete(
+        self,
+        messages: List[Dict],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None
+    ) -> LLMResult:
+        """Try providers in routing order; raise the last error if all fail"""
+        max_tokens = max_tokens or settings.MODEL_MAX_TOKENS
+        temperature = settings.MODEL_TEMPERATURE if temperature is None else temperature
+
+        last_error: Optional[LLMError] = None
+        for provider in self._ordered():
+            try:
+                logger.info(f"🤖 Appel LLM {provider.name} ({provider.model})...")
+                result = provider.complete(messages, max_tokens, temperature)
+                provider.record_success(result.latency)
+                llm_admission.settle(provider.name, result.prompt_tokens, result.completion_tokens)
+                LLM_TTFT_SECONDS.observe(result.ttft, provider=provider.name)
+                LLM_SECONDS.observe(result.latency, provider=provider.name)
+                return result
+            except LLMRateLimitError as e:
+                logger.warning(f"⏱️ LLM {provider.name}: limite de débit, bascule")
+                ERRORS.inc(component=f"llm.{provider.name}", kind="rate_limit")
+                provider.mark_rate_limited(e.retry_after)
+                if provider.name == settings.LLM_ADMISSION_PROVIDER:
+                    llm_admission.penalize(e.retry_after)
+                # Plusieurs fournisseurs limités: le client réessaie dès que le premier se libère
+                if not isinstance(last_error, LLMRateLimitError) or \
+                        (e.retry_after or math.inf) < (last_error.retry_after or math.inf):
+                    last_error = e
+            except LLMError as e:
+                logger.warning(f"⚠️ LLM {provider.name} échoué: {e}")
+                ERRORS.inc(component=f"llm.{provider.name}", kind="error")
+                provider.record_failure()
+                # Un fournisseur de secours injoignable ne masque pas la limite de débit
+                # (l'API répond alors 429 avec le Retry-After du fournisseur limité)
+                if not (isinstance(e, LLMUnavailableError) and isinstance(last_error, LLMRateLimitError)):
+                    last_error = e
+
+        raise last_error or LLMError("Aucun fournisseur LLM configuré")
+
+    def status(self) -> Dict[str, Dict]:
+        return {p.name: p.status() for p in self.providers}
+
+
+# Singleton
+llm_router = LLMRouter()
@@ -1,107 +1,101 @@
 """
-Persistent conversation memory with SQLite
+Persistent conversation memory (SQLite or PostgreSQL, async SQLAlchemy)
 """
+import json
 import uuid
 import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from typing import Any, List, Dict, Optional, Tuple, Callable
+from sqlalchemy import select, delete, update
 from backend.config import settings
+from backend.services.metrics import DB_SECONDS
+from backend.services.memory_store import ConversationMessage, Session, MemoryStore, create_store
 import logging
 
 logger = logging.getLogger(__name__)
 
-Base = declarative_base()
 
+class MemoryService:
+    def __init__(self, store: Optional[MemoryStore] = None):
+        # Backend choisi d'après DATABASE_URL (sqlite / postgresql, driver async)
+        self.store = store or create_store()
+        self._ready = False
+        self._ready_lock: Optional[asyncio.Lock] = None
+        self._summarizing = set()
+        # Profils audio par session: (profil, chargé à), LRU borné
+        self._audio_profiles: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        logger.info(f"✅ Memory service initialized ({self.store.dialect})")
 
-class ConversationMessage(Base):
-    __tablename__ = "messages"
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    session_id = Column(String(100), index=True)
-    role = Column(String(20))  # user, assistant
-    content = Column(Text)
-    language = Column(String(10))
-    timestamp = Column(DateTime, default=datetime.utcnow)
-
+    async def start(self):
+        """Apply schema migrations once per process (also done lazily on first use)"""
+        if self._ready:
+            return
+        if self._ready_lock is None:
+            self._ready_lock = asyncio.Lock()
+        async with self._ready_lock:
+            if self._ready:
+                return
+            await self.store.prepare()
+            await self.store.migrate()
+            self._ready = True
 
-class Session(Base):
-    __tablename__ = "sessions"
-    
-    session_id = Column(String(100), primary_key=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    last_activity = Column(DateTime, default=datetime.utcnow)
-    message_count = Column(Integer, default=0)
+    async def close(self):
+        await self.store.close()
 
+    @asynccontextmanager
+    async def _db(self):
+        await self.start()
+        async with self.store.session() as db:
+            yield db
 
-class MemoryService:
-    def __init__(self):
-        # FIX: Manejo correcto de la URL de base de datos
-        db_url = settings.DATABASE_URL
-        if db_url.startswith("sqlite+aiosqlite"):
-            # Convertir a sqlite sync para SQLAlchemy normal
-            db_url = db_url.replace("sqlite+aiosqlite", "sqlite")
-        
-        self.engine = create_engine(
-            db_url,
-            echo=False,
-            connect_args={"check_same_thread": False}  # FIX: Necesario para SQLite en Windows
-        )
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(bind=self.engine)
-        logger.info("✅ Memory service initialized")
-    
     def generate_session_id(self) -> str:
         """Generate unique session ID"""
         return f"{int(time.time())}_{uuid.uuid4().hex[:8]}"
-    
-    def add_message(self, session_id: str, role: str, content: str, language: str = "es"):
+
+    async def add_message(self, session_id: str, role: str, content: str, language: str = "es"):
         """Add message to conversation history"""
-        db = self.SessionLocal()
+        started = time.perf_counter()
         try:
-            # Add message
-            message = ConversationMessage(
-                session_id=session_id,
-                role=role,
-                content=content,
-                language=language
-            )
-            db.add(message)
-            
-            # Update or create session
-            session = db.query(Session).filter(Session.session_id == session_id).first()
-            if session:
-                session.last_activity = datetime.utcnow()
-                session.message_count += 1
-            else:
-                session = Session(
+            async with self._db() as db:
+                now = datetime.utcnow()
+                db.add(ConversationMessage(
                     session_id=session_id,
-                    message_count=1
+                    role=role,
+                    content=content,
+                    language=language,
+                    timestamp=now
+                ))
+                # Création ou mise à jour de la session en une instruction (pas de course entre nœuds)
+                upsert = self.store.insert(Session.__table__).values(
+                    session_id=session_id, created_at=now, last_activity=now, message_count=1
                 )
-                db.add(session)
-            
-            db.commit()
+                await db.execute(upsert.on_conflict_do_update(
+                    index_elements=[Session.session_id],
+                    set_={"last_activity": now, "message_count": Session.message_count + 1}
+                ))
+                await db.commit()
             logger.debug(f"💾 Saved message: {session_id} - {role}")
         except Exception as e:
-            db.rollback()
             logger.error(f"❌ Failed to save message: {e}")
         finally:
-            db.close()
-    
-    def get_conversation_history(self, session_id: str, limit: int = None) -> List[Dict]:
+            DB_SECONDS.observe(time.perf_counter() - started, op="write")
+
+    async def get_conversation_history(self, session_id: str, limit: int = None) -> List[Dict]:
         """Get conversation history for session"""
-        db = self.SessionLocal()
+        started = time.perf_counter()
         try:
-            query = db.query(ConversationMessage).filter(
-                ConversationMessage.session_id == session_id
-            ).order_by(ConversationMessage.timestamp.desc())
-            
-            if limit:
-                query = query.limit(limit)
-            
-            messages = query.all()
+            async with self._db() as db:
+                query = select(ConversationMessage).where(
+                    ConversationMessage.session_id == session_id
+                ).order_by(ConversationMessage.timestamp.desc())
+
+                if limit:
+                    query = query.limit(limit)
+
+                messages = (await db.execute(query)).scalars().all()
             return [
                 {
                     "role": msg.role,
@@ -111,38 +105,277 @@ class MemoryService:
                 for msg in reversed(messages)
             ]
         finally:
-            db.close()
-    
-    def get_context_string(self, session_id: str, max_messages: int = 10) -> str:
+            DB_SECONDS.observe(time.perf_counter() - started, op="read")
+
+    async def get_history_since(
+        self, session_id: str, cursor: Optional[int] = None, limit: int = 10
+    ) -> Tuple[List[Dict], Optional[int], bool]:
+        """Messages newer than the client cursor (message id), oldest first: (messages, cursor, truncated)"""
+        started = time.perf_counter()
+        try:
+            query = select(
+                ConversationMessage.id, ConversationMessage.role, ConversationMessage.content
+            ).where(ConversationMessage.session_id == session_id)
+            if cursor is not None:
+                query = query.where(ConversationMessage.id > cursor)
+            # Un de plus que la limite: savoir si le client a manqué des messages
+            query = query.order_by(ConversationMessage.id.desc()).limit(limit + 1)
+            async with self._db() as db:
+                rows = (await db.execute(query)).all()
+            truncated = len(rows) > limit
+            messages = [
+                {"id": row.id, "role": row.role, "content": row.content}
+                for row in reversed(rows[:limit])
+            ]
+            return messages, (messages[-1]["id"] if messages else cursor), truncated
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, op="read")
+
+    async def get_prompt_context(self, session_id: str, limit: int = None) -> Tuple[str, List[Dict]]:
+        """Get the stored summary plus the recent messages it does not cover yet"""
+        started = time.perf_counter()
+        try:
+            async with self._db() as db:
+                session = await db.get(Session, session_id)
+                summary = (session.summary or "") if session else ""
+                until = (session.summarized_until or 0) if session else 0
+
+                query = select(ConversationMessage).where(
+                    ConversationMessage.session_id == session_id,
+                    ConversationMessage.id > until
+                ).order_by(ConversationMessage.id.desc())
+
+                if limit:
+                    query = query.limit(limit)
+
+                messages = (await db.execute(query)).scalars().all()
+            return summary, [
+                {"role": msg.role, "content": msg.content}
+                for msg in reversed(messages)
+            ]
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, op="read")
+
+    async def summarize_if_needed(
+        self,
+        session_id: str,
+        summarizer: Callable[[str, List[Dict]], Optional[str]]
+    ) -> bool:
+        """
+        Fold older turns into the session summary once past the threshold.
+        Meant to run in the background, after the response has been sent.
+        """
+        if session_id in self._summarizing:
+            return False
+        self._summarizing.add(session_id)
+
+        try:
+            async with self._db() as db:
+                session = await db.get(Session, session_id)
+                if not session:
+                    return False
+                previous = session.summary or ""
+                until = session.summarized_until or 0
+                pending = (await db.execute(
+                    select(ConversationMessage).where(
+                        ConversationMessage.session_id == session_id,
+                        ConversationMessage.id > until
+                    ).order_by(ConversationMessage.id)
+                )).scalars().all()
+            # Connexion rendue au pool avant l'appel LLM
+
+            if len(pending) <= settings.SUMMARY_TRIGGER_MESSAGES:
+                return False
+
+            to_fold = pending[:len(pending) - settings.SUMMARY_KEEP_RECENT]
+            messages = [{"role": m.role, "content": m.content} for m in to_fold]
+            last_id = to_fold[-1].id
+
+            summary = await asyncio.to_thread(summarizer, previous, messages)
+            if not summary:
+                return False
+
+            async with self._db() as db:
+                # Condition sur summarized_until: un autre nœud a pu résumer entre-temps
+                await db.execute(
+                    update(Session)
+                    .where(Session.session_id == session_id, Session.summarized_until == until)
+                    .values(summary=summary, summarized_until=last_id)
+                )
+                await db.commit()
+
+            logger.info(f"📝 Session {session_id}: {len(messages)} messages résumés")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Summarization failed: {e}")
+            return False
+        finally:
+            self._summarizing.discard(session_id)
+
+    async def get_context_string(self, session_id: str, max_messages: int = 10) -> str:
         """Get formatted conversation context"""
-        history = self.get_conversation_history(session_id, limit=max_messages)
+        history = await self.get_conversation_history(session_id, limit=max_messages)
         if not history:
             return ""
         return "\n".join([f"{msg['role']}: {msg['content']}" for msg in history])
-    
-    def cleanup_old_sessions(self):
-        """Remove sessions older than configured timeout"""
-        db = self.SessionLocal()
+
+    # --------------------------
+    # Profil audio (/voice)
+    # --------------------------
+    def _cache_audio_profile(self, session_id: str, profile: Dict[str, Any]):
+        self._audio_profiles[session_id] = (profile, time.monotonic())
+        self._audio_profiles.move_to_end(session_id)
+        while len(self._audio_profiles) > max(1, settings.STT_PROFILE_CACHE_SIZE):
+            self._audio_profiles.popitem(last=False)
+
+    async def get_audio_profile(self, session_id: str) -> Dict[str, Any]:
+        """Spoken language and Whisper decoding profile learned for the session ({} if none yet)"""
+        cached = self._audio_profiles.get(session_id)
+        if cached and time.monotonic() - cached[1] < settings.STT_PROFILE_CACHE_TTL_SECONDS:
+            self._audio_profiles.move_to_end(session_id)
+            return cached[0]
+        started = time.perf_counter()
         try:
-            cutoff = datetime.utcnow() - timedelta(hours=settings.SESSION_TIMEOUT_HOURS)
-            old_sessions = db.query(Session).filter(Session.last_activity < cutoff).all()
-            
-            for session in old_sessions:
-                # Delete messages
-                db.query(ConversationMessage).filter(
-                    ConversationMessage.session_id == session.session_id
-                ).delete()
-                # Delete session
-                db.delete(session)
-            
-            db.commit()
-            logger.info(f"🗑️ Cleaned up {len(old_sessions)} old sessions")
+            async with self._db() as db:
+                raw = (await db.execute(
+                    select(Session.audio_profile).where(Session.session_id == session_id)
+                )).scalar()
+            profile = json.loads(raw) if raw else {}
         except Exception as e:
-            db.rollback()
-            logger.error(f"❌ Cleanup failed: {e}")
+            logger.warning(f"⚠️ Audio profile unavailable: {e}")
+            return {}
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, op="read")
+        self._cache_audio_profile(session_id, profile)
+        return profile
+
+    @staticmethod
+    def _fold_audio_profile(profile: Dict[str, Any], info: Dict[str, Any], pinned: bool) -> Dict[str, Any]:
+        """
+        Update the profile with one transcription (info from stt_service.transcribe_with_info).
+        Une langue imposée (profil, ou `lang` de la requête au départ) est retenue si la
+        transcription est sûre; peu sûre, Whisper détecte jusqu'à STT_PROFILE_MIN_CLIPS
+        détections concordantes et sûres.
+        """
+        clips = profile.get("clips", 0) + 1
+        duration = info.get("duration") or 0.0
+        clip_seconds = duration if clips == 1 else 0.7 * profile.get("clip_seconds", duration) + 0.3 * duration
+        avg_logprob = info.get("avg_logprob")
+        confident = avg_logprob is None or avg_logprob >= settings.STT_PROFILE_MIN_LOGPROB
+
+        language, detect = profile.get("language"), profile.get("detect", False)
+        candidate, streak = profile.get("candidate"), profile.get("streak", 0)
+        if pinned:
+            if confident:
+                language = info.get("language") or language
+            else:
+                # Langue imposée démentie (l'apprenant parle une autre langue): détection
+                language, candidate, streak, detect = None, None, 0, True
+        elif info.get("language") and (info.get("language_probability") or 0) >= settings.STT_PROFILE_MIN_LANGUAGE_PROB:
+            streak = streak + 1 if info["language"] == candidate else 1
+            candidate = info["language"]
+            if streak >= settings.STT_PROFILE_MIN_CLIPS:
+                language, detect = candidate, False
+        else:
+            streak = 0
+
+        fast = language and confident and clip_seconds <= settings.STT_FAST_MAX_SECONDS
+        return {
+            "language": language,
+            "detect": detect,
+            "candidate": candidate,
+            "streak": streak,
+            "clips": clips,
+            "clip_seconds": round(clip_seconds, 2),
+            "beam_size": settings.STT_FAST_BEAM_SIZE if fast else settings.STT_BEAM_SIZE,
+        }
+
+    async def update_audio_profile(self, session_id: str, info: Dict[str, Any], pinned: bool) -> Dict[str, Any]:
+        """Fold one transcription into the session profile (cache + database)"""
+        previous = await self.get_audio_profile(session_id)
+        profile = self._fold_audio_profile(previous, info, pinned)
+        self._cache_audio_profile(session_id, profile)
+        if profile.get("language") != previous.get("language"):
+            logger.info(f"🎤 Session {session_id}: langue Whisper {profile['language'] or 'détectée'}, "
+                        f"beam {profile['beam_size']}")
+        started = time.perf_counter()
+        try:
+            async with self._db() as db:
+                await db.execute(
+                    update(Session)
+                    .where(Session.session_id == session_id)
+                    .values(audio_profile=json.dumps(profile))
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"❌ Failed to save audio profile: {e}")
         finally:
-            db.close()
+            DB_SECONDS.observe(time.perf_counter() - started, op="write")
+        return profile
+
+    async def delete_session(self, session_id: str) -> bool:
+        """Delete a session and all its messages. Returns False if it did not exist"""
+        self._audio_profiles.pop(session_id, None)
+        try:
+            async with self._db() as db:
+                await db.execute(
+                    delete(ConversationMessage).where(ConversationMessage.session_id == session_id)
+                )
+                result = await db.execute(delete(Session).where(Session.session_id == session_id))
+                await db.commit()
+            deleted = result.rowcount > 0
+            if deleted:
+                logger.info(f"🗑️ Deleted session {session_id}")
+            return deleted
+        except Exception as e:
+            logger.error(f"❌ Failed to delete session: {e}")
+            raise
+
+    async def _delete_expired_batch(self, cutoff: datetime, batch_size: int) -> int:
+        """Delete one bounded batch of expired sessions with set-based SQL"""
+        async with self._db() as db:
+            # Même sous-requête déterministe pour les deux DELETE (même transaction)
+            expired = (
+                select(Session.session_id)
+                .where(Session.last_activity < cutoff)
+                .order_by(Session.session_id)
+                .limit(batch_size)
+            )
+            await db.execute(
+                delete(ConversationMessage).where(ConversationMessage.session_id.in_(expired))
+            )
+            result = await db.execute(delete(Session).where(Session.session_id.in_(expired)))
+            await db.commit()
+            return result.rowcount
+
+    async def cleanup_old_sessions(self) -> int:
+        """Remove sessions older than configured timeout, in bounded batches"""
+        cutoff = datetime.utcnow() - timedelta(hours=settings.SESSION_TIMEOUT_HOURS)
+        batch_size = max(1, settings.CLEANUP_BATCH_SIZE)
+        pause = settings.CLEANUP_BATCH_PAUSE_MS / 1000
+        total = 0
+        try:
+            while True:
+                deleted = await self._delete_expired_batch(cutoff, batch_size)
+                total += deleted
+                if deleted < batch_size:
+                    break
+                # Chaque lot est sa propre transaction: on relâche le verrou d'écriture
+                await asyncio.sleep(pause)
+            if total:
+                await self.store.maintenance()
+            logger.info(f"🗑️ Cleaned up {total} old sessions")
+        except Exception as e:
+            logger.error(f"❌ Cleanup failed: {e}")
+        return total
+
+    async def run_janitor(self):
+        """Periodic background cleanup, started from the app lifespan"""
+        interval = max(1, settings.CLEANUP_INTERVAL_MINUTES) * 60
+        while True:
+            await self.cleanup_old_sessions()
+            await asyncio.sleep(interval)
 
 
 # Singleton instance
-memory_service = MemoryService()
\ No newline at end of file
+memory_service = MemoryService()
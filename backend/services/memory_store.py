@@ -0,0 +1,251 @@
+"""
+Storage backends for conversation memory (SQLAlchemy async)
+
+- SQLiteStore: aiosqlite, WAL + busy_timeout, VACUUM incrémental (un seul nœud,
+  un seul worker web: refusé au démarrage si WEB_WORKERS > 1)
+- PostgresStore: asyncpg, pool de connexions configurable (plusieurs nœuds API
+  partagent la même base, écritures concurrentes)
+- Migrations versionnées (table schema_migrations), appliquées au démarrage
+  par le premier processus qui ouvre la base
+Le SQL métier reste dans MemoryService: les backends ne fournissent que le
+moteur, l'INSERT ... ON CONFLICT du dialecte et la maintenance.
+"""
+import abc
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import (
+    Column, String, Integer, DateTime, Text, Index, event, inspect, text
+)
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+Base = declarative_base()
+
+
+class ConversationMessage(Base):
+    __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_session_id_id", "session_id", "id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(100), index=True)
+    role = Column(String(20))  # user, assistant
+    content = Column(Text)
+    language = Column(String(10))
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+
+class Session(Base):
+    __tablename__ = "sessions"
+
+    session_id = Column(String(100), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_activity = Column(DateTime, default=datetime.utcnow, index=True)
+    message_count = Column(Integer, default=0)
+    summary = Column(Text, nullable=True)            # Résumé glissant des anciens tours
+    summarized_until = Column(Integer, default=0)    # Dernier message.id inclus dans le résumé
+    audio_profile = Column(Text, nullable=True)      # JSON: langue parlée, durée des clips, profil Whisper
+
+
+# ========================================
+# Migrations (sync, exécutées via run_sync dans une transaction)
+# ========================================
+def _baseline(conn):
+    # Idempotent: les bases créées avant le suivi des versions sont conservées
+    Base.metadata.create_all(conn)
+
+
+def _add_session_columns(conn, columns: Tuple[Tuple[str, str], ...]):
+    """Columns introduced after the first release (create_all won't add them)"""
+    existing = {col["name"] for col in inspect(conn).get_columns("sessions")}
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE sessions ADD COLUMN {name} {ddl}"))
+            logger.info(f"🔧 Added column sessions.{name}")
+
+
+def _session_summary_columns(conn):
+    _add_session_columns(conn, (("summary", "TEXT"), ("summarized_until", "INTEGER DEFAULT 0")))
+
+
+def _history_and_janitor_indexes(conn):
+    for table in (Session.__table__, ConversationMessage.__table__):
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _session_audio_profile_column(conn):
+    _add_session_columns(conn, (("audio_profile", "TEXT"),))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "baseline", _baseline),
+    (2, "session summary columns", _session_summary_columns),
+    (3, "history and janitor indexes", _history_and_janitor_indexes),
+    (4, "session audio profile", _session_audio_profile_column),
+]
+
+
+def async_url(url: str) -> str:
+    """Map sync/legacy URLs to their async driver"""
+    for prefix, driver in (
+        ("sqlite://", "sqlite+aiosqlite://"),
+        ("sqlite+pysqlite://", "sqlite+aiosqlite://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+    ):
+        if url.startswith(prefix):
+            return driver + url[len(prefix):]
+    return url
+
+
+# ========================================
+# Backends
+# ========================================
+class MemoryStore(abc.ABC):
+    """Async engine + session factory for one database URL"""
+
+    dialect = ""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine: AsyncEngine = create_async_engine(url, echo=False, **self._engine_options())
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    def _engine_options(self) -> Dict:
+        return {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+            "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        }
+
+    def session(self) -> AsyncSession:
+        return self.sessions()
+
+    @abc.abstractmethod
+    def insert(self, table):
+        """Dialect INSERT supporting on_conflict_do_update"""
+
+    async def _lock_migrations(self, conn):
+        """Serialize concurrent migrations from several processes"""
+
+    async def prepare(self):
+        """Backend setup that must run outside a transaction"""
+
+    async def migrate(self):
+        for attempt in range(3):
+            try:
+                await self._migrate()
+                return
+            except DBAPIError as e:
+                # Un autre processus migre en même temps (SQLite): réessayer après lui
+                if attempt == 2:
+                    raise
+                logger.warning(f"⚠️ Migration concurrente, nouvel essai: {e}")
+                await asyncio.sleep(0.5 * (attempt + 1))
+
+    async def _migrate(self):
+        async with self.engine.begin() as conn:
+            await self._lock_migrations(conn)
+            await conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, name VARCHAR(200), applied_at TIMESTAMP)"
+            ))
+            applied = set((await conn.execute(text("SELECT version FROM schema_migrations"))).scalars())
+            for version, name, migration in MIGRATIONS:
+                if version in applied:
+                    continue
+                await conn.run_sync(migration)
+                await conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.utcnow()}
+                )
+                logger.info(f"🔧 Migration {version} appliquée: {name}")
+
+    async def maintenance(self):
+        """Give space back after bulk deletes"""
+
+    async def close(self):
+        await self.engine.dispose()
+
+
+class SQLiteStore(MemoryStore):
+    dialect = "sqlite"
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        event.listen(self.engine.sync_engine, "connect", self._configure_sqlite)
+
+    def _engine_options(self) -> Dict:
+        if ":memory:" in self.url:
+            return {"poolclass": StaticPool}  # une seule connexion partagée
+        # Selon la version, aiosqlite a NullPool par défaut (une connexion ouverte par requête)
+        return {**super()._engine_options(), "poolclass": AsyncAdaptedQueuePool}
+
+    def insert(self, table):
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table)
+
+    @staticmethod
+    def _configure_sqlite(dbapi_conn, _record):
+        """
+        WAL: lectures sans bloquer l'écrivain; busy_timeout: les écritures
+        concurrentes des autres workers attendent le verrou au lieu d'échouer
+        """
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    async def prepare(self):
+        """Switch SQLite to incremental auto-vacuum (one full VACUUM the first time)"""
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+            if mode != 2:  # 2 = INCREMENTAL
+                await conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+                await conn.execute(text("VACUUM"))
+                logger.info("🧹 SQLite auto_vacuum set to INCREMENTAL")
+
+    async def maintenance(self, pages: int = None):
+        """Give free pages back to the filesystem without a blocking full VACUUM"""
+        pages = pages or settings.VACUUM_PAGES
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"PRAGMA incremental_vacuum({int(pages)})"))
+
+
+class PostgresStore(MemoryStore):
+    dialect = "postgresql"
+    MIGRATION_LOCK_ID = 4_774_511  # Verrou consultatif partagé par tous les nœuds
+
+    def _engine_options(self) -> Dict:
+        # pre_ping: connexions coupées par le serveur ou un pgbouncer détectées avant usage
+        return {**super()._engine_options(), "pool_pre_ping": True}
+
+    def insert(self, table):
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table)
+
+    async def _lock_migrations(self, conn):
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": self.MIGRATION_LOCK_ID})
+
+
+STORES = {"sqlite": SQLiteStore, "postgresql": PostgresStore}
+
+
+def create_store(url: str = None) -> MemoryStore:
+    url = async_url(url or settings.DATABASE_URL)
+    dialect = url.split(":", 1)[0].split("+", 1)[0]
+    if dialect not in STORES:
+        raise ValueError(f"DATABASE_URL non supportée ({dialect}): {', '.join(STORES)} uniquement")
+    return STORES[dialect](url)
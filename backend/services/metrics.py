@@ -0,0 +1,242 @@
+"""
+Lightweight in-process metrics exposed in Prometheus text format (/metrics)
+
+Enregistrement à faible coût: un verrou, une recherche dichotomique dans les
+buckets et quelques additions par observation. Aucune dépendance externe.
+"""
+import math
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    # Représentation exacte (aller-retour): {:g} tronque à 6 chiffres les gros compteurs
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # par labels: [compte par bucket..., +Inf], somme
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: Optional[float], **labels):
+        if value is None:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                cumulative += counts[-1]
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                base = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{base} {_format_value(total[0])}")
+                lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Singleton
+metrics = Registry()
+
+# ========================================
+# Instruments (déclarés ici pour avoir un seul catalogue)
+# ========================================
+WEB_SEARCH_SECONDS = metrics.histogram(
+    "walle_web_search_seconds", "Web search latency per provider", ["provider"])
+PAGE_FETCH_SECONDS = metrics.histogram(
+    "walle_page_fetch_seconds", "Candidate page download + parse latency")
+PAGE_EXTRACT_SECONDS = metrics.histogram(
+    "walle_page_extract_seconds", "Main-content extraction latency (parse + boilerplate removal)")
+PAGE_FETCHES = metrics.counter(
+    "walle_page_fetches_total", "Candidate page downloads by outcome", ["outcome"])
+EMBEDDING_SECONDS = metrics.histogram(
+    "walle_embedding_encode_seconds", "Sentence embedding encode latency", ["op"])
+VECTOR_QUERY_SECONDS = metrics.histogram(
+    "walle_chromadb_query_seconds", "ChromaDB similarity query latency")
+DB_SECONDS = metrics.histogram(
+    "walle_db_seconds", "Conversation memory database latency", ["op"])
+LLM_TTFT_SECONDS = metrics.histogram(
+    "walle_llm_ttft_seconds", "LLM time to first token", ["provider"])
+LLM_SECONDS = metrics.histogram(
+    "walle_llm_seconds", "LLM call total latency", ["provider"], buckets=DEFAULT_BUCKETS + (60.0,))
+WHISPER_SECONDS = metrics.histogram(
+    "walle_whisper_decode_seconds", "Whisper transcription latency", buckets=DEFAULT_BUCKETS + (60.0,))
+WHISPER_BATCH_SIZE = metrics.histogram(
+    "walle_whisper_batch_size", "Clips decoded together per Whisper batch", buckets=(1, 2, 4, 8, 16, 32))
+WHISPER_DECODES = metrics.counter(
+    "walle_whisper_decodes_total", "Whisper decodes by language source and beam size", ["language", "beam"])
+WHISPER_BATCH_WAIT_SECONDS = metrics.histogram(
+    "walle_whisper_batch_wait_seconds", "Time a clip waits for its Whisper batch to start")
+TTS_SECONDS = metrics.histogram(
+    "walle_tts_synth_seconds", "TTS synthesis latency", buckets=DEFAULT_BUCKETS + (60.0,))
+STAGE_SECONDS = metrics.histogram(
+    "walle_pipeline_stage_seconds", "Per-request pipeline stage latency", ["pipeline", "stage"],
+    buckets=DEFAULT_BUCKETS + (60.0,))
+CACHE_REQUESTS = metrics.counter(
+    "walle_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+CACHE_ENTRIES = metrics.gauge(
+    "walle_cache_entries", "Live entries per cache", ["cache"])
+ERRORS = metrics.counter(
+    "walle_errors_total", "Errors and timeouts by component", ["component", "kind"])
+BREAKER_STATE = metrics.gauge(
+    "walle_circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["breaker"])
+BREAKER_TRANSITIONS = metrics.counter(
+    "walle_circuit_breaker_transitions_total", "Circuit breaker state changes", ["breaker", "state"])
+ADMISSION_QUEUE_DEPTH = metrics.gauge(
+    "walle_llm_admission_queue_depth", "LLM calls waiting for a rate-limit slot", ["kind"])
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    "walle_llm_admission_wait_seconds", "Time spent queued before an LLM call", ["kind"])
+ADMISSION_REJECTIONS = metrics.counter(
+    "walle_llm_admission_rejections_total", "LLM calls rejected with 429", ["kind", "reason"])
+RAG_DOCUMENTS = metrics.gauge(
+    "walle_rag_collection_documents", "Documents in the RAG collection (web = evictable)", ["kind"])
+RAG_EVICTIONS = metrics.counter(
+    "walle_rag_evictions_total", "RAG documents deleted by the index janitor", ["reason"])
+RAG_GATE_DECISIONS = metrics.counter(
+    "walle_rag_gate_decisions_total", "Per-request retrieval decisions", ["mode", "reason"])
+RAG_GATE_SAVED_SECONDS = metrics.counter(
+    "walle_rag_gate_saved_seconds_total", "Estimated web-search latency avoided by the RAG gate")
+RAG_GATE_SHEDDING = metrics.gauge(
+    "walle_rag_gate_shedding", "1 while web retrieval is suspended because p95 is over the SLO")
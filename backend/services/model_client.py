@@ -0,0 +1,217 @@
+"""
+Clients for the shared model server (multi-worker mode)
+
+Quand MODEL_SERVER_URL est défini, les workers web n'importent ni torch, ni
+Whisper, ni TTS, et n'ouvrent pas ChromaDB: rag_service, stt_service et
+tts_service deviennent ces proxys, avec la même interface que les services
+locaux. Voir backend/model_server.py.
+"""
+import time
+import asyncio
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+import httpx
+import numpy as np
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.MODEL_SERVER_POOL_SIZE,
+        max_keepalive_connections=settings.MODEL_SERVER_POOL_SIZE,
+    )
+
+
+def client() -> httpx.Client:
+    """Shared sync client (called from worker threads)"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(
+                    base_url=settings.MODEL_SERVER_URL.rstrip("/"),
+                    timeout=settings.MODEL_SERVER_TIMEOUT_SECONDS,
+                    limits=_limits(),
+                )
+    return _client
+
+
+def async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            base_url=settings.MODEL_SERVER_URL.rstrip("/"),
+            timeout=settings.MODEL_SERVER_TIMEOUT_SECONDS,
+            limits=_limits(),
+        )
+    return _async_client
+
+
+def _post(path: str, payload: Dict) -> Any:
+    r = client().post(path, json=payload)
+    r.raise_for_status()
+    return r.json()
+
+
+class _HealthCache:
+    """
+    Model server /health, refreshed in the background at most every few seconds.
+    get() never does I/O: it is reached from async handlers (is_loaded, /health)
+    and returns the last known value while a refresh runs.
+    """
+
+    TTL = 10.0
+    TIMEOUT = 2.0
+
+    def __init__(self):
+        self._value: Dict[str, Any] = {}
+        self._checked = 0.0
+        self._refreshing = False
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[str, Any]:
+        if time.time() - self._checked > self.TTL:
+            self._schedule()
+        return self._value
+
+    def _schedule(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Appel depuis un thread sans boucle: rafraîchi par un thread dédié
+            threading.Thread(target=self._refresh_sync, name="model-health", daemon=True).start()
+            return
+        self._task = loop.create_task(self._refresh_async())
+
+    async def refresh(self):
+        """Await a fresh value (startup, before the first is_loaded)"""
+        with self._lock:
+            self._refreshing = True
+        await self._refresh_async()
+
+    async def _refresh_async(self):
+        try:
+            r = await async_client().get("/health", timeout=self.TIMEOUT)
+            r.raise_for_status()
+            self._store(r.json())
+        except Exception as e:
+            self._store({}, e)
+
+    def _refresh_sync(self):
+        try:
+            r = client().get("/health", timeout=self.TIMEOUT)
+            r.raise_for_status()
+            self._store(r.json())
+        except Exception as e:
+            self._store({}, e)
+
+    def _store(self, value: Dict[str, Any], error: Optional[Exception] = None):
+        if error is not None:
+            logger.warning(f"⚠️ Serveur de modèles injoignable: {error}")
+        self._value = value
+        self._checked = time.time()
+        self._refreshing = False
+
+
+_health = _HealthCache()
+
+
+async def refresh_health():
+    await _health.refresh()
+
+
+class RemoteEncoder:
+    """SentenceTransformer-like encode() backed by the model server"""
+
+    def encode(self, sentences: Union[str, List[str]], normalize_embeddings: bool = False, **_) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        data = _post("/embed", {"texts": texts, "normalize": normalize_embeddings})
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+class RemoteRAGService:
+    def __init__(self):
+        self.embedding_model = RemoteEncoder()
+        logger.info(f"✅ RAG via serveur de modèles: {settings.MODEL_SERVER_URL}")
+
+    def web_search(self, query: str, num_results: int = 3) -> List[Dict[str, Any]]:
+        return _post("/rag/web", {"query": query, "num_results": num_results})["results"]
+
+    def index_documents(self, documents: List[Dict[str, Any]], language: str = "es", pinned: bool = False):
+        _post("/rag/index", {"documents": documents, "language": language, "pinned": pinned})
+
+    def search_context(self, query: str, n_results: int = 3) -> str:
+        return _post("/rag/context", {"query": query, "n_results": n_results})["context"]
+
+    def probe(self, query: str, n_results: int = 3) -> Tuple[float, str]:
+        data = _post("/rag/probe", {"query": query, "n_results": n_results})
+        return data["similarity"], data["context"]
+
+    def rag_search(self, query: str, language: str = "es") -> str:
+        try:
+            return _post("/rag/search", {"query": query, "language": language})["context"]
+        except Exception as e:
+            logger.error(f"❌ RAG distant échoué: {e}")
+            return ""
+
+    def test_connection(self) -> bool:
+        return bool(_health.get().get("chroma_ok"))
+
+    def search_status(self) -> Dict[str, Dict]:
+        # Les disjoncteurs vivent dans le serveur de modèles (qui fait les recherches)
+        return _health.get().get("search_providers", {})
+
+
+class RemoteSTTService:
+    def load_model(self) -> None:
+        if self.is_loaded:
+            logger.info("✅ Whisper disponible sur le serveur de modèles")
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(_health.get().get("whisper_loaded"))
+
+    async def transcribe(self, audio_file: bytes, language: Optional[str] = None) -> str:
+        return (await self.transcribe_with_info(audio_file, language))["text"]
+
+    async def transcribe_with_info(
+        self, audio_file: bytes, language: Optional[str] = None, beam_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        params = {k: v for k, v in (("language", language), ("beam_size", beam_size)) if v}
+        r = await async_client().post(
+            "/stt/transcribe", content=audio_file, params=params,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        if r.status_code >= 400:
+            raise Exception(f"Error de transcripción: {r.json().get('detail', r.text)}")
+        return r.json()
+
+
+class RemoteTTSService:
+    def load_model(self):
+        if self.is_loaded:
+            logger.info("✅ TTS disponible sur le serveur de modèles")
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(_health.get().get("tts_loaded"))
+
+    def synthesize(self, text: str) -> bytes:
+        r = client().post("/tts/synthesize", json={"text": text})
+        if r.status_code >= 400:
+            raise Exception(f"Error generando voz: {r.text}")
+        return r.content
@@ -0,0 +1,123 @@
+"""
+Per-request pipeline expressed as a small dependency graph of async stages
+
+- Les étapes indépendantes tournent en parallèle
+- Chaque étape a un délai; une étape optionnelle qui le dépasse (ou échoue)
+  prend sa valeur par défaut au lieu de faire échouer la requête
+- Une étape peut en annuler une autre devenue inutile (ctx.skip)
+- Les durées par étape sont journalisées
+"""
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from backend.services.metrics import STAGE_SECONDS, ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[["PipelineContext"], Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    optional: bool = False
+    default: Any = None
+
+
+class PipelineContext:
+    def __init__(self, inputs: Dict[str, Any]):
+        self.inputs = inputs
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}   # millisecondes
+        self.status: Dict[str, str] = {}      # ok | timeout | error | skipped
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stages: Dict[str, Stage] = {}
+
+    def skip(self, name: str):
+        """Cancel a stage whose result is no longer needed (it yields its default)"""
+        task = self._tasks.get(name)
+        if task is None or task.done():
+            return
+        self.status[name] = "skipped"
+        task.cancel()
+
+
+class Pipeline:
+    def __init__(self, name: str, stages: List[Stage]):
+        seen = set()
+        for stage in stages:
+            missing = [d for d in stage.deps if d not in seen]
+            if missing:
+                raise ValueError(f"Étape {stage.name}: dépendances inconnues ou déclarées après: {missing}")
+            seen.add(stage.name)
+        self.name = name
+        self.stages = stages
+
+    async def run(self, **inputs) -> PipelineContext:
+        ctx = PipelineContext(inputs)
+        start = time.perf_counter()
+        for stage in self.stages:
+            ctx._stages[stage.name] = stage
+            ctx._tasks[stage.name] = asyncio.create_task(self._run_stage(stage, ctx))
+        try:
+            await asyncio.gather(*ctx._tasks.values())
+        except BaseException:
+            for task in ctx._tasks.values():
+                task.cancel()
+            raise
+        finally:
+            ctx.timings["total"] = (time.perf_counter() - start) * 1000
+            self._log(ctx)
+        return ctx
+
+    async def _run_stage(self, stage: Stage, ctx: PipelineContext) -> Any:
+        try:
+            if stage.deps:
+                await asyncio.gather(*(ctx._tasks[d] for d in stage.deps))
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(stage.fn(ctx), stage.timeout)
+                ctx.status[stage.name] = "ok"
+            except asyncio.TimeoutError:
+                if not stage.optional:
+                    ctx.status[stage.name] = "timeout"
+                    raise
+                logger.warning(f"⏱️ {self.name}.{stage.name}: délai de {stage.timeout}s dépassé, on continue sans")
+                ctx.status[stage.name] = "timeout"
+                result = stage.default
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not stage.optional:
+                    ctx.status[stage.name] = "error"
+                    raise
+                logger.error(f"❌ {self.name}.{stage.name} échoué (optionnel): {e}")
+                ctx.status[stage.name] = "error"
+                result = stage.default
+            ctx.timings[stage.name] = (time.perf_counter() - start) * 1000
+        except asyncio.CancelledError:
+            # Annulée volontairement par ctx.skip: valeur par défaut
+            if ctx.status.get(stage.name) != "skipped":
+                raise
+            result = stage.default
+            ctx.timings.setdefault(stage.name, 0.0)
+        ctx.results[stage.name] = result
+        return result
+
+    def _log(self, ctx: PipelineContext):
+        parts = []
+        for stage in self.stages:
+            if stage.name not in ctx.timings:
+                continue
+            status = ctx.status.get(stage.name, "ok")
+            if status in ("ok", "timeout", "error"):
+                STAGE_SECONDS.observe(ctx.timings[stage.name] / 1000, pipeline=self.name, stage=stage.name)
+            if status in ("timeout", "error"):
+                ERRORS.inc(component=f"{self.name}.{stage.name}", kind=status)
+            flag = "" if status == "ok" else f"[{status}]"
+            parts.append(f"{stage.name}={ctx.timings[stage.name]:.0f}ms{flag}")
+        STAGE_SECONDS.observe(ctx.timings["total"] / 1000, pipeline=self.name, stage="total")
+        logger.info(f"⏱️ Pipeline {self.name}: {' '.join(parts)} | total={ctx.timings['total']:.0f}ms")
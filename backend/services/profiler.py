@@ -0,0 +1,209 @@
+"""
+Sampling profiler for slow requests
+
+Quand PROFILER_ENABLED est actif, un thread échantillonne les piles de tous les
+threads (sys._current_frames) tant qu'au moins une requête suivie est en cours.
+Si une requête dépasse PROFILER_THRESHOLD_SECONDS, les échantillons de sa
+fenêtre sont écrits au format "folded" (flamegraph.pl, speedscope, inferno)
+avec un .json de métadonnées (session, durées par étape) par le thread
+d'échantillonnage, jamais par la boucle d'événements. Le dossier est un
+anneau borné: les profils les plus anciens sont supprimés.
+
+Désactivé: aucun thread, track() ne fait qu'un test booléen.
+"""
+import os
+import sys
+import json
+import time
+import threading
+import logging
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("profiler_trace", default=None)
+
+# Feuilles de pile d'un thread inactif (attente de travail / d'E/S): bruit
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename.replace("\\", "/")
+    short = "/".join(filename.rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+class RequestTrace:
+    """Handle returned by track(): attach tags and stage timings"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.start = time.time()
+        self.tags: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+
+    def tag(self, **tags):
+        self.tags.update({k: v for k, v in tags.items() if v is not None})
+
+    def add_timings(self, timings: Dict[str, float], prefix: str = ""):
+        for name, ms in timings.items():
+            self.timings[f"{prefix}{name}"] = round(ms, 1)
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._samples: Deque[Tuple[float, str]] = deque()
+        self._pending: Deque[Tuple[RequestTrace, float, List[str]]] = deque()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.captured = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.PROFILER_ENABLED
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+
+    # --------------------------
+    # Échantillonnage
+    # --------------------------
+    def _run(self):
+        interval = settings.PROFILER_INTERVAL_MS / 1000
+        me = threading.get_ident()
+        while True:
+            self._flush_pending()
+            if not self._active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            now = time.time()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                leaf = frame.f_code
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+                    continue
+                labels: List[str] = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks.append(";".join(reversed(labels)))
+            with self._lock:
+                self._samples.extend((now, s) for s in stacks)
+                horizon = now - settings.PROFILER_WINDOW_SECONDS
+                while self._samples and self._samples[0][0] < horizon:
+                    self._samples.popleft()
+            time.sleep(interval)
+
+    # --------------------------
+    # Suivi des requêtes
+    # --------------------------
+    @contextmanager
+    def track(self, kind: str):
+        """Profile the enclosed request; dumped only if it exceeds the threshold"""
+        if not self.enabled:
+            yield RequestTrace(kind)
+            return
+
+        trace = RequestTrace(kind)
+        token = _current_trace.set(trace)
+        with self._lock:
+            self._active += 1
+        self._ensure_thread()
+        self._wakeup.set()
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            end = time.time()
+            with self._lock:
+                self._active -= 1
+                samples = [s for ts, s in self._samples if trace.start <= ts <= end] \
+                    if end - trace.start >= settings.PROFILER_THRESHOLD_SECONDS else None
+                if not self._active:
+                    self._samples.clear()
+            if samples is not None:
+                # Écriture disque dans le thread d'échantillonnage: track() s'exécute
+                # sur la boucle d'événements (middleware HTTP)
+                self._pending.append((trace, end, samples))
+                self._wakeup.set()
+
+    def annotate(self, timings: Optional[Dict[str, float]] = None, prefix: str = "", **tags):
+        """Attach tags / stage timings to the request being tracked (no-op otherwise)"""
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        trace.tag(**tags)
+        if timings:
+            trace.add_timings(timings, prefix)
+
+    def _flush_pending(self):
+        while self._pending:
+            trace, end, samples = self._pending.popleft()
+            try:
+                self._dump(trace, end, samples)
+            except Exception as e:
+                logger.warning(f"⚠️ Profil non enregistré: {e}")
+
+    def _dump(self, trace: RequestTrace, end: float, samples: List[str]):
+        duration_ms = (end - trace.start) * 1000
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+        stamp = datetime.fromtimestamp(trace.start).strftime("%Y%m%d-%H%M%S-%f")
+        session = "".join(c for c in str(trace.tags.get("session_id", "")) if c.isalnum() or c in "-_")[:40]
+        base = os.path.join(settings.PROFILER_DIR, f"{stamp}_{trace.kind}_{session or 'nosession'}_{duration_ms:.0f}ms")
+
+        folded = Counter(samples)
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, count in folded.most_common():
+                f.write(f"{stack} {count}\n")
+        meta = {
+            "kind": trace.kind,
+            "started_at": datetime.fromtimestamp(trace.start).isoformat(),
+            "duration_ms": round(duration_ms, 1),
+            "threshold_s": settings.PROFILER_THRESHOLD_SECONDS,
+            "interval_ms": settings.PROFILER_INTERVAL_MS,
+            "samples": len(samples),
+            # Fenêtre partagée: les requêtes concurrentes apparaissent aussi
+            "concurrent_requests_sampled": True,
+            "timings_ms": trace.timings,
+            **trace.tags,
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False, default=str)
+
+        self.captured += 1
+        self._trim()
+        logger.warning(f"🐢 Requête {trace.kind} lente ({duration_ms:.0f}ms): profil {base}.folded")
+
+    def _trim(self):
+        """Keep only the newest PROFILER_MAX_PROFILES profiles"""
+        files = sorted(f for f in os.listdir(settings.PROFILER_DIR) if f.endswith(".folded"))
+        for name in files[:max(0, len(files) - settings.PROFILER_MAX_PROFILES)]:
+            stem = os.path.join(settings.PROFILER_DIR, name[:-len(".folded")])
+            for ext in (".folded", ".json"):
+                try:
+                    os.remove(stem + ext)
+                except FileNotFoundError:
+                    pass
+
+
+# Singleton
+request_profiler = SamplingProfiler()
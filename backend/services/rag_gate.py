@@ -0,0 +1,208 @@
+"""
+Adaptive RAG gating: decide per request whether retrieval is worth it
+
+- Heuristiques gratuites d'abord: salutations / remerciements / messages très
+  courts -> pas de recherche; questions et vocabulaire de grammaire -> recherche
+- Puis une sonde sur la collection locale (un embedding + une requête):
+  contexte déjà indexé assez proche -> utilisé tel quel, sans recherche web;
+  rien d'approchant et aucun marqueur de question -> pas de recherche
+- Politique RAG_GATE_POLICY: always (ancien comportement) | auto | never
+- Sous charge (p95 des réponses au-delà de RAG_GATE_SLO_P95_MS): plus de
+  recherche web, seul le contexte local reste (hystérésis à 80 % du SLO)
+Chaque décision est journalisée avec la latence épargnée (coût moyen observé
+d'une recherche web).
+"""
+import re
+import time
+import asyncio
+import logging
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from backend.config import settings
+from backend.services.metrics import ERRORS, RAG_GATE_DECISIONS, RAG_GATE_SAVED_SECONDS, RAG_GATE_SHEDDING
+from backend.services.rag_service import rag_service
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("always", "auto", "never")
+
+# Un message composé uniquement de ces mots n'a besoin d'aucun contexte
+SMALLTALK_WORDS = {
+    # es
+    "hola", "buenas", "buenos", "dias", "tardes", "noches", "como", "estas", "esta", "que", "tal",
+    "gracias", "muchas", "adios", "chao", "hasta", "luego", "pronto", "manana", "vale", "si", "no",
+    "perfecto", "genial", "entendido", "muy", "bien", "y", "tu", "usted", "todo", "de", "nada",
+    # en
+    "hi", "hello", "hey", "good", "morning", "afternoon", "evening", "how", "are", "you", "thanks",
+    "thank", "bye", "goodbye", "see", "later", "ok", "okay", "yes", "yeah", "great", "got", "it",
+    "cool", "fine", "and", "i", "am", "im", "well",
+    # fr
+    "bonjour", "bonsoir", "salut", "coucou", "ca", "va", "merci", "beaucoup", "au", "revoir",
+    "a", "bientot", "oui", "non", "daccord", "super", "et", "toi", "vous", "bonne", "journee",
+}
+
+# Marqueurs d'une demande d'explication (valent une recherche même si la collection est vide)
+LOOKUP_WORDS = {
+    # es
+    "diferencia", "explica", "explicame", "regla", "reglas", "gramatica", "conjugar", "conjugacion",
+    "subjuntivo", "preterito", "imperfecto", "ejemplo", "ejemplos", "significa", "significado",
+    "traduce", "traducir", "porque", "cuando", "cual",
+    # en
+    "what", "why", "when", "which", "difference", "explain", "rule", "rules", "grammar", "conjugate",
+    "conjugation", "tense", "example", "examples", "meaning", "mean", "translate",
+    # fr
+    "pourquoi", "quand", "quel", "quelle", "explique", "regle", "grammaire", "conjuguer",
+    "conjugaison", "subjonctif", "exemple", "exemples", "signifie", "traduire",
+}
+LOOKUP_PHRASES = ("que es", "como se dice", "como se usa", "por que", "how do", "how to",
+                  "qu est ce", "comment dit on", "comment on dit")
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def _normalize(text: str) -> str:
+    """Lowercase without accents or apostrophes ("¿Qué tal?" -> "¿que tal?")"""
+    decomposed = unicodedata.normalize("NFKD", text.lower().replace("'", "").replace("’", ""))
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+@dataclass
+class RagDecision:
+    mode: str                           # skip | local | web
+    reason: str
+    similarity: Optional[float] = None
+
+
+class RagGate:
+    def __init__(self, policy: Optional[str] = None):
+        policy = (policy or settings.RAG_GATE_POLICY).lower()
+        if policy not in POLICIES:
+            logger.warning(f"⚠️ RAG_GATE_POLICY inconnue ({policy}), 'auto' utilisée")
+            policy = "auto"
+        self.policy = policy
+        self.web_cost_ms: Optional[float] = None   # EWMA d'une recherche web complète
+        self.shedding = False
+        self._latencies: Deque[float] = deque(maxlen=max(20, settings.RAG_GATE_SLO_WINDOW))
+        self._p95_checked = 0.0
+        self._counts: Dict[str, int] = {"skip": 0, "local": 0, "web": 0}
+
+    # --------------------------
+    # Classification
+    # --------------------------
+    @staticmethod
+    def classify(query: str) -> Tuple[Optional[str], bool]:
+        """Cheap verdict from the text alone: (skip reason or None, looks like a lookup)"""
+        text = _normalize(query)
+        words: List[str] = _WORD.findall(text)
+        if not words:
+            return "empty", False
+        needs_lookup = "?" in text or any(w in LOOKUP_WORDS for w in words) or \
+            any(phrase in " ".join(words) for phrase in LOOKUP_PHRASES)
+        if all(w in SMALLTALK_WORDS for w in words):
+            return "smalltalk", False
+        if len(words) < settings.RAG_GATE_MIN_WORDS and not needs_lookup:
+            return "too_short", False
+        return None, needs_lookup
+
+    def decide(self, query: str, probe: Callable[[], Tuple[float, str]]) -> Tuple[RagDecision, str]:
+        """Decision + local context (probe only runs when the heuristics are not enough)"""
+        if self.policy == "never":
+            return RagDecision("skip", "policy"), ""
+        if self.policy == "always":
+            return RagDecision("web", "policy"), ""
+
+        skip_reason, needs_lookup = self.classify(query)
+        if skip_reason:
+            return RagDecision("skip", skip_reason), ""
+
+        try:
+            similarity, local = probe()
+        except Exception as e:
+            # Sonde indisponible (serveur de modèles, ChromaDB): décider sur le texte seul
+            ERRORS.inc(component="rag_gate", kind="probe")
+            logger.warning(f"⚠️ Sonde RAG échouée: {e}")
+            if needs_lookup and not self.shedding:
+                return RagDecision("web", "probe_error"), ""
+            return RagDecision("skip", "probe_error"), ""
+        if local and similarity >= settings.RAG_GATE_LOCAL_SIMILARITY:
+            return RagDecision("local", "local_hit", similarity), local
+        if self.shedding:
+            # Sous charge: le contexte local, même moyen, plutôt qu'une recherche web
+            if local and similarity >= settings.RAG_GATE_MIN_SIMILARITY:
+                return RagDecision("local", "shed", similarity), local
+            return RagDecision("skip", "shed", similarity), ""
+        if needs_lookup:
+            return RagDecision("web", "lookup", similarity), ""
+        if similarity < settings.RAG_GATE_MIN_SIMILARITY:
+            return RagDecision("skip", "off_topic", similarity), ""
+        return RagDecision("web", "uncertain", similarity), ""
+
+    # --------------------------
+    # API
+    # --------------------------
+    async def retrieve(self, query: str, lang: str, web_search: Callable[[str, str], Awaitable[str]]) -> str:
+        """Context for the tutor prompt: nothing, the local collection or a full web search"""
+        started = time.perf_counter()
+        decision, context = await asyncio.to_thread(
+            self.decide, query, lambda: rag_service.probe(query)
+        )
+        spent_ms = (time.perf_counter() - started) * 1000
+        self._counts[decision.mode] += 1
+        RAG_GATE_DECISIONS.inc(mode=decision.mode, reason=decision.reason)
+
+        if decision.mode == "web":
+            context = await web_search(query, lang)
+            web_ms = (time.perf_counter() - started) * 1000 - spent_ms
+            self.web_cost_ms = web_ms if self.web_cost_ms is None else 0.8 * self.web_cost_ms + 0.2 * web_ms
+            self._log(decision, None, spent_ms)
+            return context
+
+        saved_ms = max(0.0, self.web_cost_ms - spent_ms) if self.web_cost_ms is not None else None
+        if saved_ms:
+            RAG_GATE_SAVED_SECONDS.inc(saved_ms / 1000)
+        self._log(decision, saved_ms, spent_ms)
+        return context
+
+    def _log(self, decision: RagDecision, saved_ms: Optional[float], spent_ms: float):
+        similarity = f", sim={decision.similarity:.2f}" if decision.similarity is not None else ""
+        saved = f"~{saved_ms:.0f} ms épargnés" if saved_ms is not None else "coût web encore inconnu"
+        if decision.mode == "web":
+            saved = f"sonde {spent_ms:.0f} ms"
+        logger.info(f"🚦 RAG {decision.mode} ({decision.reason}{similarity}): {saved}")
+
+    # --------------------------
+    # SLO (délestage sous charge)
+    # --------------------------
+    def observe(self, seconds: float):
+        """Record an end-to-end response time (called by /chat and /voice)"""
+        slo = settings.RAG_GATE_SLO_P95_MS / 1000
+        if slo <= 0:
+            return
+        self._latencies.append(seconds)
+        now = time.monotonic()
+        if len(self._latencies) < 20 or now - self._p95_checked < 1.0:
+            return
+        self._p95_checked = now
+        ordered = sorted(self._latencies)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        if not self.shedding and p95 > slo:
+            self.shedding = True
+            logger.warning(f"🚦 p95 {p95 * 1000:.0f} ms > SLO {slo * 1000:.0f} ms: recherche web suspendue")
+        elif self.shedding and p95 < 0.8 * slo:
+            self.shedding = False
+            logger.info(f"🚦 p95 {p95 * 1000:.0f} ms: recherche web rétablie")
+        RAG_GATE_SHEDDING.set(int(self.shedding))
+
+    def stats(self) -> Dict:
+        return {
+            "policy": self.policy,
+            "shedding": self.shedding,
+            "decisions": dict(self._counts),
+            "web_cost_ms": round(self.web_cost_ms) if self.web_cost_ms is not None else None,
+        }
+
+
+# Singleton
+rag_gate = RagGate()
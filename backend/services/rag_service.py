@@ -9,39 +9,117 @@ Version améliorée:
 - Conservation de l'indexation et de la recherche ChromaDB
 """
 import uuid
-import requests
+import time
+import asyncio
+import threading
 import logging
 from bs4 import BeautifulSoup
-import chromadb
-from sentence_transformers import SentenceTransformer
 from backend.config import settings
+from backend.services.metrics import (
+    WEB_SEARCH_SECONDS, EMBEDDING_SECONDS, VECTOR_QUERY_SECONDS, ERRORS,
+    RAG_DOCUMENTS, RAG_EVICTIONS
+)
+from backend.services.circuit_breaker import search_breakers
+from backend.services.extraction import page_extractor
+from backend.services.http_service import http_service
+from backend.services.vector_snapshot import (
+    SnapshotManager, VectorSnapshot, read_index_version, bump_index_version
+)
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from urllib.parse import urlencode
 
 logger = logging.getLogger(__name__)
 
+# Fournisseur -> type de résultat ("results" prêts, ou "links" à télécharger)
+SEARCH_PROVIDERS = {"ddg_json": "results", "ddg_html": "links", "bing": "links"}
+EVICTION_BATCH = 500
+
 
 class RAGService:
     def __init__(self):
+        # Imports lourds (torch) seulement dans le processus qui sert les modèles
+        from backend.services.embedding_service import create_encoder
         try:
-            self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
-
-            # ✅ Compatibilité ChromaDB 0.4.24
+            self.embedding_model = create_encoder(settings.EMBEDDING_MODEL)
             os.makedirs(settings.CHROMADB_PATH, exist_ok=True)
-            self.client = chromadb.PersistentClient(path=settings.CHROMADB_PATH)
 
-            self.collection = self.client.get_or_create_collection(
-                name="language_learning",
-                metadata={"hnsw:space": "cosine"}
-            )
-            logger.info(f"✅ RAG service initialized (ChromaDB 0.4.24)")
+            self._chroma_ready = threading.Event()
+            self._chroma_error: Optional[Exception] = None
+            self._client = None
+            self._collection = None
+            self._snapshot: Optional[VectorSnapshot] = None
+            # Documents servis par le snapshot avant ChromaDB: last_hit écrit une fois chargé
+            self._snapshot_hits: Dict[str, int] = {}
+            self._snapshot_hits_lock = threading.Lock()
+            self.snapshots = SnapshotManager()
+            if settings.VECTOR_SNAPSHOT_ENABLED:
+                snapshot = self.snapshots.open_current()
+                if snapshot and snapshot.matches(read_index_version(), settings.EMBEDDING_MODEL):
+                    self._snapshot = snapshot
+                elif snapshot:
+                    logger.info("📸 Snapshot vectoriel obsolète ignoré (version ou modèle différent)")
+                    snapshot.close()
+
+            if self._snapshot:
+                # Les requêtes sont servies par le snapshot pendant que ChromaDB charge HNSW
+                logger.info(f"📸 Snapshot vectoriel v{self._snapshot.version} "
+                            f"({self._snapshot.manifest['count']} documents), ChromaDB en arrière-plan")
+                threading.Thread(target=self._open_chroma, name="chroma-open", daemon=True).start()
+            else:
+                self._open_chroma()
+                if self._chroma_error:
+                    raise self._chroma_error
             logger.info(f"📁 Database path: {settings.CHROMADB_PATH}")
         except Exception as e:
             logger.error(f"❌ Failed to initialize RAG service: {e}")
             logger.exception("Detalles completos:")
             raise
 
+    def _open_chroma(self):
+        try:
+            import chromadb
+            started = time.perf_counter()
+            # ✅ Compatibilité ChromaDB 0.4.24
+            self._client = chromadb.PersistentClient(path=settings.CHROMADB_PATH)
+            self._collection = self._client.get_or_create_collection(
+                name="language_learning",
+                metadata={"hnsw:space": "cosine"}
+            )
+            logger.info(f"✅ RAG service initialized (ChromaDB 0.4.24) "
+                        f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception as e:
+            self._chroma_error = e
+            logger.error(f"❌ ChromaDB failed to open: {e}")
+        finally:
+            self._chroma_ready.set()
+
+        if self._chroma_error is None:
+            self._flush_snapshot_hits()
+        if self._chroma_error is None and settings.VECTOR_SNAPSHOT_ENABLED and self._snapshot is None:
+            # Pas de snapshot valide: en préparer un pour le prochain démarrage
+            self.snapshots.schedule_rebuild(lambda: self._collection, settings.EMBEDDING_MODEL)
+
+    def _wait_for_chroma(self):
+        self._chroma_ready.wait()
+        if self._chroma_error:
+            raise self._chroma_error
+
+    @property
+    def client(self):
+        self._wait_for_chroma()
+        return self._client
+
+    @property
+    def collection(self):
+        self._wait_for_chroma()
+        return self._collection
+
+    @collection.setter
+    def collection(self, value):
+        self._wait_for_chroma()
+        self._collection = value
+
     # --------------------------
     # Helpers
     # --------------------------
@@ -52,16 +130,96 @@ class RAGService:
         cleaned = " ".join(text.split())
         return cleaned[:max_len]
 
+    @staticmethod
+    def _extract_candidates(candidates: List[Tuple[str, str]], needed: int) -> List[Dict[str, Any]]:
+        """Fetch the result links in parallel (bounded download, main content only)"""
+        # Quelques candidats de réserve si certaines pages sont vides ou en échec
+        return page_extractor.extract_many(candidates[:needed * 2], limit=needed)
+
+    @staticmethod
+    def _links(soup, selector: str) -> List[Tuple[str, str]]:
+        candidates = []
+        for link in soup.select(selector):
+            href = link.get("href")
+            if href and href.startswith("http"):
+                candidates.append((href, link.get_text().strip()))
+        return candidates
+
     # --------------------------
-    # Web search (DuckDuckGo JSON -> HTML fallback -> Bing fallback)
+    # Search providers (a raised exception counts against the provider's breaker)
+    # --------------------------
+    def _search_ddg_json(self, query: str, needed: int) -> List[Dict[str, Any]]:
+        """DuckDuckGo Instant Answer API: abstract + related topics, no page fetch"""
+        results: List[Dict[str, Any]] = []
+        ddg_url = settings.SEARCH_DDG_API_URL
+        params = {"q": query, "format": "json", "no_html": 1, "skip_disambig": 1}
+        logger.debug(f"Calling DuckDuckGo JSON API: {ddg_url} params={params}")
+        r = http_service.get(ddg_url, params=params, timeout=8)
+        logger.debug(f"DDG JSON status={r.status_code} text_head={r.text[:1000]!r}")
+        r.raise_for_status()
+        data = r.json()
+
+        if data.get("AbstractText"):
+            results.append({
+                "url": data.get("AbstractURL") or f"https://duckduckgo.com/?q={query}",
+                "title": data.get("Heading") or query,
+                "content": self._clean_text(data.get("AbstractText"), max_len=2000)
+            })
+
+        related = data.get("RelatedTopics", [])
+        for item in related:
+            if len(results) >= needed:
+                break
+            if isinstance(item, dict):
+                if item.get("Text") and item.get("FirstURL"):
+                    results.append({
+                        "url": item.get("FirstURL"),
+                        "title": item.get("Text")[:200],
+                        "content": self._clean_text(item.get("Text"), max_len=2000)
+                    })
+                elif item.get("Topics"):
+                    for sub in item.get("Topics", []):
+                        if len(results) >= needed:
+                            break
+                        if sub.get("Text") and sub.get("FirstURL"):
+                            results.append({
+                                "url": sub.get("FirstURL"),
+                                "title": sub.get("Text")[:200],
+                                "content": self._clean_text(sub.get("Text"), max_len=2000)
+                            })
+        return results
+
+    def _search_ddg_html(self, query: str, needed: int) -> List[Tuple[str, str]]:
+        """DuckDuckGo HTML results page: candidate (url, title) links"""
+        search_url = settings.SEARCH_DDG_HTML_URL
+        params = {"q": query}
+        logger.debug(f"Falling back to DuckDuckGo HTML scraping: {search_url} params={params}")
+        r = http_service.get(search_url, params=params, timeout=10, headers={"User-Agent": "Mozilla/5.0"})
+        logger.debug(f"HTML search status={r.status_code} text_head={r.text[:1000]!r}")
+        r.raise_for_status()
+        return self._links(BeautifulSoup(r.text, "lxml"), "a.result__a")
+
+    def _search_bing(self, query: str, needed: int) -> List[Tuple[str, str]]:
+        """Bing HTML results page — often usable for short/conversational queries"""
+        bing_url = settings.SEARCH_BING_URL
+        params = {"q": query}
+        logger.debug(f"Falling back to Bing scraping: {bing_url} params={params}")
+        r = http_service.get(bing_url, params=params, timeout=10, headers={"User-Agent": "Mozilla/5.0"})
+        logger.debug(f"Bing status={r.status_code} text_head={r.text[:1000]!r}")
+        r.raise_for_status()
+        return self._links(BeautifulSoup(r.text, "lxml"), "li.b_algo h2 a")
+
+    # --------------------------
+    # Web search (providers ordered by recent health, open breakers skipped)
     # --------------------------
     def web_search(self, query: str, num_results: int = 3) -> List[Dict[str, Any]]:
         """
-        Return list of dicts {url, title, content} using:
+        Return list of dicts {url, title, content} from, by default:
          1) DuckDuckGo Instant Answer JSON
-         2) DuckDuckGo HTML scraping fallback
-         3) Bing HTML scraping fallback (if previous returned none)
-        This layered approach increases chance of getting usable results for conversational queries.
+         2) DuckDuckGo HTML scraping
+         3) Bing HTML scraping
+        Providers are tried healthiest first until enough results are found; a
+        provider whose circuit breaker is open is skipped instead of waiting out its timeout.
         """
         results: List[Dict[str, Any]] = []
         logger.info(f"🔎 Searching web: {query!r} (max {num_results})")
@@ -71,131 +229,37 @@ class RAGService:
         except Exception:
             max_results = 3
 
-        # 1) DuckDuckGo Instant Answer API (JSON)
-        try:
-            ddg_url = "https://api.duckduckgo.com/"
-            params = {"q": query, "format": "json", "no_html": 1, "skip_disambig": 1}
-            logger.debug(f"Calling DuckDuckGo JSON API: {ddg_url} params={params}")
-            r = requests.get(ddg_url, params=params, timeout=8, headers={"User-Agent": "WALLE-RAG/1.0"})
-            logger.debug(f"DDG JSON status={r.status_code} text_head={r.text[:1000]!r}")
-            r.raise_for_status()
-            data = r.json()
-
-            if data.get("AbstractText"):
-                results.append({
-                    "url": data.get("AbstractURL") or f"https://duckduckgo.com/?q={query}",
-                    "title": data.get("Heading") or query,
-                    "content": self._clean_text(data.get("AbstractText"), max_len=2000)
-                })
-
-            related = data.get("RelatedTopics", [])
-            for item in related:
-                if len(results) >= max_results:
-                    break
-                if isinstance(item, dict):
-                    if item.get("Text") and item.get("FirstURL"):
-                        results.append({
-                            "url": item.get("FirstURL"),
-                            "title": item.get("Text")[:200],
-                            "content": self._clean_text(item.get("Text"), max_len=2000)
-                        })
-                    elif item.get("Topics"):
-                        for sub in item.get("Topics", []):
-                            if len(results) >= max_results:
-                                break
-                            if sub.get("Text") and sub.get("FirstURL"):
-                                results.append({
-                                    "url": sub.get("FirstURL"),
-                                    "title": sub.get("Text")[:200],
-                                    "content": self._clean_text(sub.get("Text"), max_len=2000)
-                                })
-            logger.info(f"✅ DuckDuckGo JSON returned {len(results)} preliminary results")
-        except Exception as e:
-            logger.debug(f"DuckDuckGo JSON API failed or returned no usable data: {e}", exc_info=True)
-
-        # 2) HTML fallback (DuckDuckGo)
-        if len(results) < max_results:
+        names = [n.strip() for n in settings.SEARCH_PROVIDERS.split(",") if n.strip() in SEARCH_PROVIDERS]
+        for name in search_breakers.ordered(names):
+            if len(results) >= max_results:
+                break
+            breaker = search_breakers.get(name)
+            if not breaker.allow():
+                ERRORS.inc(component=f"search.{name}", kind="circuit_open")
+                logger.info(f"⛔ {name} ignoré (disjoncteur {breaker.state})")
+                continue
+
+            needed = max_results - len(results)
+            started = time.perf_counter()
             try:
-                search_url = "https://html.duckduckgo.com/html/"
-                params = {"q": query}
-                logger.debug(f"Falling back to DuckDuckGo HTML scraping: {search_url} params={params}")
-                r = requests.get(search_url, params=params, timeout=10, headers={"User-Agent": "Mozilla/5.0"})
-                logger.debug(f"HTML search status={r.status_code} text_head={r.text[:1000]!r}")
-                r.raise_for_status()
-                soup = BeautifulSoup(r.text, "html.parser")
-
-                candidates = soup.select("a.result__a")
-                logger.debug(f"Found {len(candidates)} candidate links in DuckDuckGo HTML")
-                for link in candidates:
-                    if len(results) >= max_results:
-                        break
-                    try:
-                        title = link.get_text().strip()
-                        href = link.get("href")
-                        if not href or not href.startswith("http"):
-                            continue
-                        page_response = requests.get(href, headers={"User-Agent": "Mozilla/5.0"}, timeout=6)
-                        page_response.raise_for_status()
-                        page_soup = BeautifulSoup(page_response.text, "html.parser")
-                        paragraphs = [p.get_text().strip() for p in page_soup.find_all("p")]
-                        text = " ".join(paragraphs)
-                        text = self._clean_text(text, max_len=2000)
-                        if len(text) > 100:
-                            results.append({
-                                "url": href,
-                                "title": title[:200],
-                                "content": text
-                            })
-                    except Exception as e:
-                        logger.debug(f"Failed to fetch or parse page {href}: {e}")
-                        continue
-                logger.info(f"✅ DuckDuckGo HTML fallback added results; total {len(results)}")
+                found = getattr(self, f"_search_{name}")(query, needed)
             except Exception as e:
-                logger.debug(f"DuckDuckGo HTML fallback failed: {e}", exc_info=True)
-
-        # 3) Bing fallback (HTML) — often returns usable results for short/conversational queries
-        if len(results) < max_results:
-            try:
-                bing_url = "https://www.bing.com/search"
-                params = {"q": query}
-                logger.debug(f"Falling back to Bing scraping: {bing_url} params={params}")
-                r = requests.get(bing_url, params=params, timeout=10, headers={"User-Agent": "Mozilla/5.0"})
-                logger.debug(f"Bing status={r.status_code} text_head={r.text[:1000]!r}")
-                r.raise_for_status()
-                soup = BeautifulSoup(r.text, "html.parser")
-
-                candidates = soup.select("li.b_algo h2 a")
-                logger.debug(f"Found {len(candidates)} candidate links in Bing")
-                for a in candidates:
-                    if len(results) >= max_results:
-                        break
-                    try:
-                        href = a.get("href")
-                        title = a.get_text().strip()
-                        if not href or not href.startswith("http"):
-                            continue
-                        page_response = requests.get(href, headers={"User-Agent": "Mozilla/5.0"}, timeout=6)
-                        page_response.raise_for_status()
-                        page_soup = BeautifulSoup(page_response.text, "html.parser")
-                        paragraphs = [p.get_text().strip() for p in page_soup.find_all("p")]
-                        text = " ".join(paragraphs)
-                        text = self._clean_text(text, max_len=2000)
-                        if len(text) > 100:
-                            results.append({
-                                "url": href,
-                                "title": title[:200],
-                                "content": text
-                            })
-                    except Exception as e:
-                        logger.debug(f"Failed to fetch or parse page {href}: {e}")
-                        continue
-                logger.info(f"✅ Bing fallback added results; total {len(results)}")
-            except Exception as e:
-                logger.debug(f"Bing fallback failed: {e}", exc_info=True)
-
-        # Trim to requested number
-        if len(results) > max_results:
-            results = results[:max_results]
+                elapsed = time.perf_counter() - started
+                breaker.record_failure(elapsed)
+                WEB_SEARCH_SECONDS.observe(elapsed, provider=name)
+                ERRORS.inc(component=f"search.{name}", kind="error")
+                logger.debug(f"{name} search failed: {e}", exc_info=True)
+                continue
+            elapsed = time.perf_counter() - started
+            # Seule la page de résultats compte pour le disjoncteur, pas les pages candidates
+            breaker.record_success(elapsed)
+            WEB_SEARCH_SECONDS.observe(elapsed, provider=name)
+
+            if SEARCH_PROVIDERS[name] == "links":
+                logger.debug(f"Found {len(found)} candidate links in {name}")
+                found = self._extract_candidates(found, needed)
+            results.extend(found[:needed])
+            logger.info(f"✅ {name} added {len(found[:needed])} results; total {len(results)}")
 
         logger.info(f"🔎 Final web search results: {len(results)}")
         # For debugging: if still 0, log more diagnostic info
@@ -203,27 +267,36 @@ class RAGService:
             logger.debug("No web results after all fallbacks. Possible causes: network blocked, heavy anti-scraping, or query too conversational/short.")
         return results
 
+    def search_status(self) -> Dict[str, Dict]:
+        """Circuit breaker state per search provider"""
+        return search_breakers.status()
+
     # --------------------------
     # Indexing
     # --------------------------
-    def index_documents(self, documents: List[Dict[str, Any]], language: str = "es"):
+    def index_documents(self, documents: List[Dict[str, Any]], language: str = "es", pinned: bool = False):
+        """Add documents; pinned ones (curated content) are never evicted"""
         if not documents:
             logger.warning("No documents to index")
             return
         try:
-            ids, metadatas, contents, embeddings = [], [], [], []
+            now = int(time.time())
+            ids, metadatas, contents = [], [], []
             for doc in documents:
-                doc_id = str(uuid.uuid4())
-                content = doc.get("content", "")[:1500]
-                embedding = self.embedding_model.encode(content).tolist()
-                ids.append(doc_id)
-                contents.append(content)
+                ids.append(str(uuid.uuid4()))
+                contents.append(doc.get("content", "")[:1500])
                 metadatas.append({
                     "lang": language,
                     "source": doc.get("url", "unknown")[:300],
-                    "title": doc.get("title", "")[:200]
+                    "title": doc.get("title", "")[:200],
+                    "indexed_at": now,
+                    "last_hit": 0,
+                    "pinned": pinned,
                 })
-                embeddings.append(embedding)
+            
+            # Un seul appel encode() pour tout le lot
+            with EMBEDDING_SECONDS.time(op="index"):
+                embeddings = self.embedding_model.encode(contents).tolist()
 
             self.collection.add(
                 ids=ids,
@@ -232,35 +305,94 @@ class RAGService:
                 embeddings=embeddings
             )
             logger.info(f"📚 Indexed {len(documents)} documents")
+            RAG_DOCUMENTS.inc(len(documents), kind="pinned" if pinned else "web")
+            self._invalidate_snapshot()
         except Exception as e:
+            ERRORS.inc(component="rag.index", kind="error")
             logger.error(f"❌ Indexing failed: {e}")
             logger.exception("Detalles:")
 
+    def _invalidate_snapshot(self, rebuild: bool = False):
+        # Toute écriture invalide le snapshot (jamais servi s'il est en retard).
+        # L'export complet n'est pas refait à chaque tour indexé: après une éviction,
+        # périodiquement (refresh_snapshot) et à l'arrêt (save_snapshot)
+        bump_index_version()
+        self._snapshot = None
+        if rebuild and settings.VECTOR_SNAPSHOT_ENABLED:
+            self.snapshots.schedule_rebuild(lambda: self.collection, settings.EMBEDDING_MODEL)
+
+    def refresh_snapshot(self):
+        """Rebuild the snapshot if the index changed and the last build is old enough"""
+        if not settings.VECTOR_SNAPSHOT_ENABLED or not self.snapshots.is_stale():
+            return
+        if time.time() - self.snapshots.last_build >= settings.VECTOR_SNAPSHOT_REBUILD_HOURS * 3600:
+            self.snapshots.schedule_rebuild(lambda: self.collection, settings.EMBEDDING_MODEL)
+
+    def save_snapshot(self):
+        """Synchronous rebuild at shutdown, so the next start is warm"""
+        if not settings.VECTOR_SNAPSHOT_ENABLED or not self._chroma_ready.is_set() or self._chroma_error:
+            return
+        try:
+            if self.snapshots.is_stale():
+                self.snapshots.build(self._collection, settings.EMBEDDING_MODEL)
+        except Exception as e:
+            logger.warning(f"⚠️ Snapshot vectoriel non enregistré à l'arrêt: {e}")
+
     def search_context(self, query: str, n_results: int = 3) -> str:
         """Devuelve texto de contexto concatenado desde ChromaDB para la consulta dada."""
+        return self.probe(query, n_results)[1]
+
+    def probe(self, query: str, n_results: int = 3) -> Tuple[float, str]:
+        """Best cosine similarity in the local collection (0 if empty) and the context it yields"""
         if not query:
-            return ""
+            return 0.0, ""
 
         # Embedding de la consulta
         try:
-            query_embedding = self.embedding_model.encode(query).tolist()
+            with EMBEDDING_SECONDS.time(op="query"):
+                query_embedding = self.embedding_model.encode(query).tolist()
         except Exception as e:
+            ERRORS.inc(component="rag.embedding", kind="error")
             logger.error("Error encoding query for embeddings: %s", e)
-            return ""
+            return 0.0, ""
+
+        # Démarrage à chaud: ChromaDB pas encore chargé, snapshot à jour
+        snapshot = self._snapshot
+        if snapshot is not None and not self._chroma_ready.is_set():
+            try:
+                with VECTOR_QUERY_SECONDS.time():
+                    hits = [hit for hit in snapshot.search_hits(query_embedding, n_results) if hit[0]]
+                self._remember_snapshot_hits([doc_id for _, _, doc_id in hits if doc_id])
+                scored = [(d, score) for d, score, _ in hits]
+                if scored:
+                    logger.info("Retrieved %d context chunks from vector snapshot", len(scored))
+                    return scored[0][1], "\n\n".join(self._clean_text(d, max_len=1500) for d, _ in scored)
+                logger.warning("No context documents found for query")
+                return 0.0, ""
+            except Exception as e:
+                ERRORS.inc(component="rag.snapshot", kind="error")
+                logger.error("Error querying vector snapshot, falling back to ChromaDB: %s", e)
 
         # Consulta a la base vectorial
         try:
             logger.debug("Querying ChromaDB with n_results=%s", n_results)
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"],
-            )
+            with VECTOR_QUERY_SECONDS.time():
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=n_results,
+                    include=["documents", "metadatas", "distances"],
+                )
         except Exception as e:
+            ERRORS.inc(component="rag.chromadb", kind="error")
             logger.error("Error querying ChromaDB: %s", e)
-            return ""
+            return 0.0, ""
 
+        self._record_hits(results)
         documents: list[str] = []
+        similarity = 0.0
+        distances = results.get("distances") if isinstance(results, dict) else None
+        if distances and distances[0]:
+            similarity = 1.0 - float(distances[0][0])  # espace cosinus: distance = 1 - similarité
 
         # Ruta principal: usar `documents` si viene en el resultado
         if isinstance(results, dict) and results.get("documents"):
@@ -290,12 +422,145 @@ class RAGService:
 
         if not documents:
             logger.warning("No context documents found for query")
-            return ""
+            return 0.0, ""
 
-        context = "\n\n".join(documents)
-        context = self._clean_text(context, max_len=2000)
+        # Un extrait par paragraphe: le budget de tokens est appliqué par context_builder
+        context = "\n\n".join(self._clean_text(d, max_len=1500) for d in documents)
         logger.info("Retrieved %d context chunks from vector store", len(documents))
-        return context
+        return similarity, context
+
+    # --------------------------
+    # Maintenance (éviction)
+    # --------------------------
+    def _record_hits(self, results: Any):
+        """Refresh last_hit of retrieved documents, at most once per RAG_HIT_UPDATE_SECONDS each"""
+        if not isinstance(results, dict) or not results.get("ids") or not results.get("metadatas"):
+            return
+        ids, metas = results["ids"][0], results["metadatas"][0]
+        now = int(time.time())
+        stale = [
+            (doc_id, meta) for doc_id, meta in zip(ids, metas)
+            if isinstance(meta, dict) and now - (meta.get("last_hit") or 0) >= settings.RAG_HIT_UPDATE_SECONDS
+        ]
+        if not stale:
+            return
+        try:
+            self.collection.update(
+                ids=[doc_id for doc_id, _ in stale],
+                metadatas=[{**meta, "last_hit": now} for _, meta in stale],
+            )
+        except Exception as e:
+            # Document supprimé entre-temps par le janitor: sans importance
+            logger.debug(f"Could not record RAG hits: {e}")
+
+    def _remember_snapshot_hits(self, ids: List[str]):
+        if not ids:
+            return
+        now = int(time.time())
+        with self._snapshot_hits_lock:
+            for doc_id in ids:
+                self._snapshot_hits[doc_id] = now
+        if self._chroma_ready.is_set():
+            # ChromaDB prêt entre-temps: le vidage au chargement est déjà passé
+            self._flush_snapshot_hits()
+
+    def _flush_snapshot_hits(self):
+        """Write last_hit for documents served from the snapshot while ChromaDB was loading"""
+        with self._snapshot_hits_lock:
+            hits, self._snapshot_hits = self._snapshot_hits, {}
+        if not hits:
+            return
+        try:
+            # Les documents évincés depuis le snapshot ne sont simplement pas renvoyés
+            current = self._collection.get(ids=list(hits), include=["metadatas"])
+            ids = current.get("ids") or []
+            metas = current.get("metadatas") or [None] * len(ids)
+            updates = [
+                (doc_id, {**(meta or {}), "last_hit": max(hits[doc_id], (meta or {}).get("last_hit") or 0)})
+                for doc_id, meta in zip(ids, metas)
+            ]
+            if updates:
+                self._collection.update(ids=[i for i, _ in updates], metadatas=[m for _, m in updates])
+                logger.info(f"📸 last_hit de {len(updates)} documents servis par le snapshot enregistré")
+        except Exception as e:
+            logger.debug(f"Could not record snapshot hits: {e}")
+
+    def _scan_metadata(self, page_size: int = 1000) -> List[Tuple[str, Dict[str, Any]]]:
+        entries: List[Tuple[str, Dict[str, Any]]] = []
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=len(entries))
+            ids = page.get("ids") or []
+            if not ids:
+                return entries
+            metas = page.get("metadatas") or [None] * len(ids)
+            entries.extend((doc_id, meta or {}) for doc_id, meta in zip(ids, metas))
+
+    def evict_documents(self) -> Dict[str, int]:
+        """Delete stale, never-retrieved, then least recently used web documents down to RAG_MAX_DOCUMENTS"""
+        evicted = {"ttl": 0, "unused": 0, "lru": 0}
+        try:
+            now = time.time()
+            ttl = settings.RAG_DOCUMENT_TTL_DAYS * 86400
+            grace = settings.RAG_UNUSED_GRACE_HOURS * 3600
+            doomed: Dict[str, List[str]] = {reason: [] for reason in evicted}
+            candidates: List[Tuple[bool, float, str]] = []
+            backfill: List[Tuple[str, Dict[str, Any]]] = []
+            pinned = 0
+
+            for doc_id, meta in self._scan_metadata():
+                if meta.get("pinned"):
+                    pinned += 1
+                    continue
+                indexed_at = meta.get("indexed_at")
+                if indexed_at is None:
+                    # Indexé avant le suivi: l'horloge démarre maintenant
+                    indexed_at = int(now)
+                    backfill.append((doc_id, {**meta, "indexed_at": indexed_at, "last_hit": 0, "pinned": False}))
+                last_hit = meta.get("last_hit") or 0
+                last_used = max(indexed_at, last_hit)
+                if ttl > 0 and now - last_used > ttl:
+                    doomed["ttl"].append(doc_id)
+                elif grace > 0 and not last_hit and now - indexed_at > grace:
+                    doomed["unused"].append(doc_id)
+                else:
+                    candidates.append((bool(last_hit), last_used, doc_id))  # jamais retrouvés d'abord, puis LRU
+
+            excess = pinned + len(candidates) - settings.RAG_MAX_DOCUMENTS
+            if excess > 0:
+                candidates.sort()
+                doomed["lru"] = [doc_id for _, _, doc_id in candidates[:excess]]
+                if excess > len(candidates):
+                    logger.warning(f"⚠️ {pinned} documents épinglés dépassent RAG_MAX_DOCUMENTS")
+
+            for start in range(0, len(backfill), EVICTION_BATCH):
+                batch = backfill[start:start + EVICTION_BATCH]
+                self.collection.update(ids=[i for i, _ in batch], metadatas=[m for _, m in batch])
+            for reason, ids in doomed.items():
+                for start in range(0, len(ids), EVICTION_BATCH):
+                    self.collection.delete(ids=ids[start:start + EVICTION_BATCH])
+                evicted[reason] = len(ids)
+                if ids:
+                    RAG_EVICTIONS.inc(len(ids), reason=reason)
+
+            removed = sum(evicted.values())
+            RAG_DOCUMENTS.set(pinned, kind="pinned")
+            RAG_DOCUMENTS.set(len(candidates) - len(doomed["lru"]), kind="web")
+            if removed:
+                self._invalidate_snapshot(rebuild=True)
+            logger.info(f"🗑️ RAG: {removed} documents évincés {evicted}, "
+                        f"{pinned + len(candidates) - len(doomed['lru'])} conservés ({pinned} épinglés)")
+        except Exception as e:
+            ERRORS.inc(component="rag.evict", kind="error")
+            logger.error(f"❌ RAG eviction failed: {e}")
+        return evicted
+
+    async def run_index_janitor(self):
+        """Periodic eviction and snapshot refresh, started from the app lifespan next to the memory janitor"""
+        interval = max(1, settings.RAG_EVICTION_INTERVAL_MINUTES) * 60
+        while True:
+            await asyncio.to_thread(self.evict_documents)
+            await asyncio.to_thread(self.refresh_snapshot)
+            await asyncio.sleep(interval)
 
     # --------------------------
     # Full RAG pipeline
@@ -328,7 +593,19 @@ class RAGService:
     # --------------------------
     # Health / test
     # --------------------------
+    @property
+    def ready(self) -> bool:
+        """Cheap readiness for health polls: no ChromaDB call, no log"""
+        if self._chroma_ready.is_set():
+            return self._chroma_error is None
+        return self._snapshot is not None
+
     def test_connection(self) -> bool:
+        snapshot = self._snapshot
+        if snapshot is not None and not self._chroma_ready.is_set():
+            # Ne pas bloquer le démarrage sur le chargement de ChromaDB
+            logger.info(f"✅ Vector snapshot OK ({snapshot.manifest['count']} documents), ChromaDB loading")
+            return True
         try:
             collections = self.client.list_collections()
             names = [c.name for c in collections]
@@ -345,5 +622,10 @@ class RAGService:
             return False
 
 
-# Singleton
-rag_service = RAGService()
+# Singleton (mode multi-processus: proxy vers le serveur de modèles,
+# seul processus à ouvrir le PersistentClient ChromaDB)
+if settings.MODEL_SERVER_URL:
+    from backend.services.model_client import RemoteRAGService
+    rag_service = RemoteRAGService()
+else:
+    rag_service = RAGService()
@@ -0,0 +1,107 @@
+"""
+Request coalescing (single-flight) for identical concurrent work
+
+Les appels concurrents avec la même clé partagent une seule exécution
+(dans un thread) et reçoivent le même résultat ou la même exception.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from backend.services.metrics import CACHE_REQUESTS, ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts: Any, casefold: bool = True) -> str:
+    """
+    Normalized key: whitespace insensitive, and case insensitive unless casefold=False
+    (prompts LLM: la casse change la réponse, ex. correction des majuscules)
+    """
+    normalized = "\x1f".join(
+        " ".join((str(p).lower() if casefold else str(p)).split()) for p in parts
+    )
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.calls = 0        # appels reçus
+        self.executions = 0   # exécutions réelles
+        self.shared = 0       # appels servis par une exécution déjà en cours
+        self.errors = 0
+        self.timeouts = 0
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable,
+        *args,
+        timeout: Optional[float] = None,
+        prepare: Optional[Callable[[], Awaitable]] = None,
+    ) -> Any:
+        """
+        Run fn(*args) in a worker thread once per key.
+        prepare() is awaited by the shared run only, before fn (quota admission:
+        callers that join an execution in progress don't pay for it).
+        A waiter that times out gets asyncio.TimeoutError; the shared run continues.
+        """
+        self.calls += 1
+        future = self._inflight.get(key)
+        if future is None:
+            self.executions += 1
+            CACHE_REQUESTS.inc(cache=f"singleflight.{self.name}", result="miss")
+            future = asyncio.get_running_loop().create_future()
+            # Évite "exception was never retrieved" si tous les appelants ont expiré
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[key] = future
+            task = asyncio.create_task(self._run(key, future, fn, args, prepare))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.shared += 1
+            CACHE_REQUESTS.inc(cache=f"singleflight.{self.name}", result="hit")
+            logger.info(f"🔗 {self.name}: requête identique déjà en cours, résultat partagé")
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            ERRORS.inc(component=f"singleflight.{self.name}", kind="timeout")
+            raise
+
+    async def _run(self, key: str, future: asyncio.Future, fn: Callable, args: tuple,
+                   prepare: Optional[Callable[[], Awaitable]] = None):
+        try:
+            if prepare is not None:
+                await prepare()
+            result = await asyncio.to_thread(fn, *args)
+            future.set_result(result)
+        except asyncio.CancelledError:
+            # Exécution annulée (arrêt): les appelants en attente ne restent pas bloqués
+            if not future.done():
+                future.cancel()
+            raise
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "shared": self.shared,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "in_flight": len(self._inflight),
+        }
+
+
+# Instances partagées
+rag_flight = SingleFlight("rag")
+llm_flight = SingleFlight("llm")
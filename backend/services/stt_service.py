@@ -1,28 +1,74 @@
 """
 Speech-to-Text service using Faster Whisper
+
+Micro-batching: les clips qui arrivent dans la même fenêtre (STT_BATCH_MAX_WAIT_MS)
+partagent une passe encodeur + décodeur CTranslate2 au lieu de N décodages
+séparés. Le prétraitement (décodage audio, VAD, mel) reste parallèle, par requête.
+Les clips de plus de 30 s de parole passent par model.transcribe (fenêtres glissantes).
+
+transcribe_with_info() renvoie aussi la langue (détectée ou imposée), la durée et
+la confiance moyenne: /voice s'en sert pour le profil audio de la session.
 """
+import io
 import os
+import zlib
+import time
+import asyncio
 import tempfile
 import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-# Intentar importar Whisper de forma segura
-try:
-    from faster_whisper import WhisperModel  # type: ignore
-    WHISPER_AVAILABLE = True
-    logger.info("Faster Whisper importado correctamente.")
-except Exception as e:
-    logger.error(f"Whisper no disponible. Error al importar faster_whisper: {e}")
-    WHISPER_AVAILABLE = False
-
 from backend.config import settings
 
+# Intentar importar Whisper de forma segura (no en los workers web si hay servidor de modelos)
+WHISPER_AVAILABLE = False
+if not settings.MODEL_SERVER_URL:
+    try:
+        import numpy as np
+        from faster_whisper import WhisperModel, decode_audio  # type: ignore
+        from faster_whisper.audio import pad_or_trim
+        from faster_whisper.tokenizer import Tokenizer
+        from faster_whisper.transcribe import get_ctranslate2_storage
+        from faster_whisper.vad import VadOptions, collect_chunks, get_speech_timestamps
+        WHISPER_AVAILABLE = True
+        logger.info("Faster Whisper importado correctamente.")
+    except Exception as e:
+        logger.error(f"Whisper no disponible. Error al importar faster_whisper: {e}")
+from backend.services.metrics import (
+    WHISPER_SECONDS, WHISPER_BATCH_SIZE, WHISPER_BATCH_WAIT_SECONDS, WHISPER_DECODES, ERRORS
+)
+
+VAD_PARAMETERS = {"min_silence_duration_ms": 500}
+# Mêmes seuils que model.transcribe (silence / hallucination répétitive)
+NO_SPEECH_THRESHOLD = 0.6
+LOG_PROB_THRESHOLD = -1.0
+COMPRESSION_RATIO_THRESHOLD = 2.4
+
+
+@dataclass
+class _Clip:
+    audio: bytes
+    features: "np.ndarray"       # mel (n_mels, 3000): une fenêtre de 30 s
+    duration: float              # secondes, avant VAD
+    language: Optional[str]
+    beam_size: int
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
 
 class STTService:
     def __init__(self) -> None:
         self.model: WhisperModel | None = None
         self.is_loaded: bool = False
+        self.batch_enabled: bool = settings.STT_BATCH_ENABLED
+        self._tokenizers: Dict[Optional[str], "Tokenizer"] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self.batch_stats = {"batches": 0, "clips": 0}
 
     def load_model(self) -> None:
         """Carga el modelo Whisper al iniciar la aplicación."""
@@ -46,8 +92,176 @@ class STTService:
 
     async def transcribe(self, audio_file: bytes, language: str | None = None) -> str:
         """
-        Transcribe audio a texto.
+        Transcribe audio a texto (en un hilo: no bloquea el event loop).
+        Con STT_BATCH_ENABLED, el decodificado se agrupa con otras peticiones.
         """
+        return (await self.transcribe_with_info(audio_file, language))["text"]
+
+    async def transcribe_with_info(
+        self, audio_file: bytes, language: str | None = None, beam_size: int | None = None
+    ) -> Dict[str, Any]:
+        """Text plus language, language_probability, duration (s) and avg_logprob"""
+        beam_size = beam_size or settings.STT_BEAM_SIZE
+        WHISPER_DECODES.inc(language="pinned" if language else "detected", beam=str(beam_size))
+        if not self.batch_enabled:
+            return await asyncio.to_thread(self.transcribe_sync_info, audio_file, language, beam_size)
+
+        features, duration = await asyncio.to_thread(self._prepare, audio_file)
+        if features is None:
+            # Más de una ventana de 30 s de voz: camino clásico
+            return await asyncio.to_thread(self.transcribe_sync_info, audio_file, language, beam_size)
+        if features.size == 0:
+            logger.info("🎤 VAD: no speech in clip")
+            return _info("", language, None, duration, None)
+
+        self._ensure_collector()
+        clip = _Clip(audio_file, features, duration, language, beam_size, self._loop.create_future())
+        await self._queue.put(clip)
+        return await clip.future
+
+    # --------------------------
+    # Micro-batching
+    # --------------------------
+    def _ensure_collector(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._collector = None
+        if self._collector is None or self._collector.done():
+            self._collector = loop.create_task(self._collect())
+
+    async def _next_batch(self) -> List[_Clip]:
+        """Oldest clip + whatever arrives before its max-wait deadline (up to STT_BATCH_MAX_SIZE)"""
+        batch = [await self._queue.get()]
+        deadline = batch[0].enqueued + settings.STT_BATCH_MAX_WAIT_MS / 1000
+        max_size = max(1, settings.STT_BATCH_MAX_SIZE)
+        while len(batch) < max_size:
+            if not self._queue.empty():
+                # Arrivés pendant le lot précédent: pris sans attendre
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _collect(self):
+        while True:
+            batch = [clip for clip in await self._next_batch() if not clip.future.done()]
+            if not batch:
+                continue  # clients partis
+            now = time.monotonic()
+            for clip in batch:
+                WHISPER_BATCH_WAIT_SECONDS.observe(now - clip.enqueued)
+            WHISPER_BATCH_SIZE.observe(len(batch))
+            self.batch_stats["batches"] += 1
+            self.batch_stats["clips"] += len(batch)
+            # generate() n'a qu'une taille de faisceau: un sous-lot par profil de décodage
+            groups: Dict[int, List[_Clip]] = {}
+            for clip in batch:
+                groups.setdefault(clip.beam_size, []).append(clip)
+            for group in groups.values():
+                await self._run_group(group)
+
+    async def _run_group(self, group: List[_Clip]):
+        try:
+            results = await asyncio.to_thread(self._decode_batch, group)
+        except Exception as e:
+            ERRORS.inc(component="whisper", kind="error")
+            logger.error("❌ Batched transcription failed (%s clips): %s", len(group), e)
+            for clip in group:
+                if not clip.future.done():
+                    clip.future.set_exception(Exception(f"Error de transcripción: {e}"))
+            return
+        for clip, result in zip(group, results):
+            if not clip.future.done():
+                clip.future.set_result(result)
+
+    def _tokenizer(self, language: Optional[str]) -> "Tokenizer":
+        if language not in self._tokenizers:
+            self._tokenizers[language] = Tokenizer(
+                self.model.hf_tokenizer, self.model.model.is_multilingual,
+                task="transcribe", language=language,
+            )
+        return self._tokenizers[language]
+
+    def _prepare(self, audio_file: bytes) -> Tuple[Optional["np.ndarray"], float]:
+        """Decode + VAD + log-mel for one clip (None if speech exceeds one 30 s window), duration"""
+        self._check_ready(audio_file)
+        sampling_rate = self.model.feature_extractor.sampling_rate
+        try:
+            audio = decode_audio(io.BytesIO(audio_file), sampling_rate=sampling_rate)
+            duration = audio.shape[0] / sampling_rate
+            speech = get_speech_timestamps(audio, VadOptions(**VAD_PARAMETERS))
+            audio = collect_chunks(audio, speech)
+        except Exception as e:
+            ERRORS.inc(component="whisper", kind="error")
+            logger.error("❌ Audio decoding failed: %s", e)
+            raise Exception(f"Error de transcripción: {e}") from e
+        if audio.size == 0:
+            return audio, duration
+        window = self.model.feature_extractor.nb_max_frames
+        if audio.shape[0] > self.model.feature_extractor.n_samples:
+            return None, duration
+        # L'extracteur ajoute 30 s de silence: on garde exactement la première fenêtre
+        return pad_or_trim(self.model.feature_extractor(audio)[:, :window], window), duration
+
+    def _decode_batch(self, batch: List[_Clip]) -> List[Dict[str, Any]]:
+        """One encoder pass and one beam-search call for clips sharing a beam size (worker thread)"""
+        whisper = self.model.model
+        started = time.perf_counter()
+        encoder_output = whisper.encode(get_ctranslate2_storage(np.stack([c.features for c in batch])))
+
+        languages = [clip.language for clip in batch]
+        probabilities: List[Optional[float]] = [1.0 if lang else None for lang in languages]
+        if not whisper.is_multilingual:
+            languages, probabilities = ["en"] * len(batch), [1.0] * len(batch)
+        elif None in languages:
+            detected = whisper.detect_language(encoder_output)
+            for i, lang in enumerate(languages):
+                if lang is None:
+                    token, probabilities[i] = detected[i][0]
+                    languages[i] = token[2:-2]
+
+        tokenizers = [self._tokenizer(lang) for lang in languages]
+        results = whisper.generate(
+            encoder_output,
+            [tok.sot_sequence + [tok.no_timestamps] for tok in tokenizers],
+            beam_size=batch[0].beam_size,
+            max_length=self.model.max_length,
+            return_scores=True,
+            return_no_speech_prob=True,
+            suppress_blank=True,
+            suppress_tokens=[-1],
+        )
+        elapsed = time.perf_counter() - started
+
+        infos = []
+        for clip, language, probability, tokenizer, result in zip(batch, languages, probabilities, tokenizers, results):
+            tokens = result.sequences_ids[0]
+            text = tokenizer.decode(tokens).strip()
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOG_PROB_THRESHOLD:
+                text = ""
+            elif text and len(text) / len(zlib.compress(text.encode())) > COMPRESSION_RATIO_THRESHOLD:
+                # Boucle de répétition: model.transcribe a le repli en température
+                logger.warning("⚠️ Batched decode looks degenerate, retrying clip alone")
+                infos.append(self.transcribe_sync_info(clip.audio, clip.language, clip.beam_size))
+                continue
+            WHISPER_SECONDS.observe(elapsed)
+            infos.append(_info(text, language, probability, clip.duration, avg_logprob))
+        logger.info("🎤 Transcribed batch of %s clips (beam %s) in %.2fs", len(batch), batch[0].beam_size, elapsed)
+        return infos
+
+    # --------------------------
+    # Validación y transcripción clásica (una petición)
+    # --------------------------
+    def _check_ready(self, audio_file: bytes):
         if not WHISPER_AVAILABLE or not self.is_loaded or self.model is None:
             raise Exception("Servicio de transcripción no disponible")
 
@@ -65,6 +279,15 @@ class STTService:
         if audio_len < 4000:
             logger.warning("Audio relativamente corto (len=%s). Intentando transcribir igualmente.", audio_len)
 
+    def transcribe_sync(self, audio_file: bytes, language: str | None = None) -> str:
+        """Blocking transcription (used by the async wrapper and the model server)"""
+        return self.transcribe_sync_info(audio_file, language)["text"]
+
+    def transcribe_sync_info(
+        self, audio_file: bytes, language: str | None = None, beam_size: int | None = None
+    ) -> Dict[str, Any]:
+        self._check_ready(audio_file)
+
         tmp_path = None
         try:
             # Guardar audio en archivo temporal (usamos .webm porque el front envía WebM)
@@ -72,19 +295,25 @@ class STTService:
                 tmp_file.write(audio_file)
                 tmp_path = tmp_file.name
 
+            started = time.perf_counter()
             segments, info = self.model.transcribe(
                 tmp_path,
                 language=language,
-                beam_size=5,
+                beam_size=beam_size or settings.STT_BEAM_SIZE,
                 vad_filter=True,
-                vad_parameters={"min_silence_duration_ms": 500},
+                vad_parameters=VAD_PARAMETERS,
             )
 
+            # Le décodage a lieu pendant l'itération sur les segments
+            segments = list(segments)
             transcription = " ".join(segment.text for segment in segments).strip()
+            WHISPER_SECONDS.observe(time.perf_counter() - started)
             logger.info("🎤 Transcribed (%s): %s...", info.language, transcription[:50])
-            return transcription
+            avg_logprob = sum(seg.avg_logprob for seg in segments) / len(segments) if segments else None
+            return _info(transcription, info.language, info.language_probability, info.duration, avg_logprob)
 
         except Exception as e:
+            ERRORS.inc(component="whisper", kind="error")
             logger.error("❌ Transcription failed: %s", e)
             raise Exception(f"Error de transcripción: {e}") from e
         finally:
@@ -95,5 +324,20 @@ class STTService:
                     pass
 
 
-# Singleton instance
-stt_service = STTService()
+def _info(text: str, language: Optional[str], probability: Optional[float],
+          duration: float, avg_logprob: Optional[float]) -> Dict[str, Any]:
+    return {
+        "text": text,
+        "language": language,
+        "language_probability": probability,
+        "duration": round(duration, 2),
+        "avg_logprob": avg_logprob,
+    }
+
+
+# Singleton instance (modo multi-proceso: proxy hacia el servidor de modelos)
+if settings.MODEL_SERVER_URL:
+    from backend.services.model_client import RemoteSTTService
+    stt_service = RemoteSTTService()
+else:
+    stt_service = STTService()
@@ -5,16 +5,18 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# Intentar importar TTS
-try:
-    from TTS.api import TTS
-    TTS_AVAILABLE = True
-except Exception as e:
-    logger.error(f"TTS no disponible: {e}")
-    TTS_AVAILABLE = False
-
 from backend.config import settings
 
+# Intentar importar TTS (no en los workers web si hay servidor de modelos)
+TTS_AVAILABLE = False
+if not settings.MODEL_SERVER_URL:
+    try:
+        from TTS.api import TTS
+        TTS_AVAILABLE = True
+    except Exception as e:
+        logger.error(f"TTS no disponible: {e}")
+from backend.services.metrics import TTS_SECONDS, ERRORS
+
 
 class TTSService:
     def __init__(self):
@@ -44,12 +46,19 @@ class TTSService:
             raise Exception("TTS no está cargado")
 
         try:
-            wav = self.model.tts(text)
-            audio_bytes = self.model.save_wav_to_bytes(wav)
+            with TTS_SECONDS.time():
+                wav = self.model.tts(text)
+                audio_bytes = self.model.save_wav_to_bytes(wav)
             return audio_bytes
         except Exception as e:
+            ERRORS.inc(component="tts", kind="error")
             logger.error(f"❌ Error en TTS: {e}")
             raise Exception(f"Error generando voz: {str(e)}")
 
 
-tts_service = TTSService()
+# Singleton (modo multi-proceso: proxy hacia el servidor de modelos)
+if settings.MODEL_SERVER_URL:
+    from backend.services.model_client import RemoteTTSService
+    tts_service = RemoteTTSService()
+else:
+    tts_service = TTSService()
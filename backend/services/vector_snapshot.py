@@ -0,0 +1,231 @@
+"""
+Memory-mapped snapshot of the RAG collection for fast warm start
+
+Un snapshot est un dossier immuable:
+    vectors.npy   float32 (N, dim), normalisés (produit scalaire = cosinus)
+    offsets.npy   int64 (N + 1), bornes de chaque document dans docs.bin
+    docs.bin      textes UTF-8 concaténés
+    ids.txt       identifiants ChromaDB, un par ligne (last_hit des documents servis)
+    manifest.json version de l'index, modèle, N, dim
+
+Ouverture quasi instantanée (np.load mmap_mode="r" + mmap), sans charger
+les segments HNSW de ChromaDB. Chaque écriture dans la collection incrémente
+index_version.json (dans CHROMADB_PATH); un snapshot n'est servi que si sa
+version et son modèle d'embeddings correspondent exactement.
+"""
+import os
+import json
+import mmap
+import time
+import shutil
+import threading
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+VERSION_FILE = "index_version.json"
+
+
+def _write_json_atomic(path: str, data: Dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ========================================
+# Version de l'index (compteur d'écritures)
+# ========================================
+def read_index_version() -> int:
+    try:
+        with open(os.path.join(settings.CHROMADB_PATH, VERSION_FILE), encoding="utf-8") as f:
+            return int(json.load(f)["version"])
+    except (OSError, ValueError, KeyError):
+        return 0
+
+
+def bump_index_version() -> int:
+    version = read_index_version() + 1
+    os.makedirs(settings.CHROMADB_PATH, exist_ok=True)
+    _write_json_atomic(os.path.join(settings.CHROMADB_PATH, VERSION_FILE), {"version": version})
+    return version
+
+
+# ========================================
+# Lecture
+# ========================================
+class VectorSnapshot:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self._docs_file = open(os.path.join(path, "docs.bin"), "rb")
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.ids: Optional[List[str]] = None  # absents des snapshots plus anciens
+        ids_path = os.path.join(path, "ids.txt")
+        if os.path.exists(ids_path):
+            with open(ids_path, encoding="utf-8") as f:
+                self.ids = f.read().split("\n")
+
+    @property
+    def version(self) -> int:
+        return int(self.manifest["index_version"])
+
+    def matches(self, index_version: int, model: str) -> bool:
+        return self.version == index_version and self.manifest.get("model") == model
+
+    def document(self, i: int) -> str:
+        return self._docs[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def search(self, query_vector: np.ndarray, n_results: int) -> List[str]:
+        return [doc for doc, _ in self.search_scored(query_vector, n_results)]
+
+    def search_scored(self, query_vector: np.ndarray, n_results: int) -> List[Tuple[str, float]]:
+        """Top documents with their cosine similarity, best first"""
+        return [(doc, score) for doc, score, _ in self.search_hits(query_vector, n_results)]
+
+    def search_hits(self, query_vector: np.ndarray, n_results: int) -> List[Tuple[str, float, Optional[str]]]:
+        """Top (document, cosine similarity, ChromaDB id or None), best first"""
+        q = np.asarray(query_vector, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        scores = self.vectors @ q
+        k = min(n_results, scores.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = self.ids
+        return [(self.document(i), float(scores[i]), ids[i] if ids else None) for i in top]
+
+    def close(self):
+        self._docs.close()
+        self._docs_file.close()
+
+
+# ========================================
+# Construction / rotation
+# ========================================
+class SnapshotManager:
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.VECTOR_SNAPSHOT_DIR
+        self._build_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._timer_lock = threading.Lock()
+        self.last_build = 0.0
+
+    def open_current(self) -> Optional[VectorSnapshot]:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), encoding="utf-8") as f:
+                name = f.read().strip()
+            return VectorSnapshot(os.path.join(self.directory, name))
+        except (OSError, ValueError, KeyError) as e:
+            logger.debug(f"No usable vector snapshot: {e}")
+            return None
+
+    def current_version(self) -> Optional[int]:
+        """Index version of the current snapshot (None if there is none)"""
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), encoding="utf-8") as f:
+                name = f.read().strip()
+            with open(os.path.join(self.directory, name, "manifest.json"), encoding="utf-8") as f:
+                return int(json.load(f)["index_version"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_stale(self) -> bool:
+        return self.current_version() != read_index_version()
+
+    def build(self, collection, model: str, page_size: int = 1000) -> Optional[str]:
+        """Export the live collection; returns the new snapshot path (None if empty)"""
+        with self._build_lock:
+            # Version lue AVANT les données: au pire le snapshot contient plus que
+            # sa version, jamais moins, et il sera de toute façon reconstruit
+            version = read_index_version()
+            started = time.perf_counter()
+            # Nanosecondes: deux constructions de la même version dans la même seconde
+            name = f"snap-{version:08d}-{time.time_ns()}"
+            tmp = os.path.join(self.directory, f".{name}.tmp")
+            os.makedirs(tmp, exist_ok=True)
+            try:
+                vectors, offsets, doc_ids, count = [], [0], [], 0
+                with open(os.path.join(tmp, "docs.bin"), "wb") as docs:
+                    offset = 0
+                    while True:
+                        page = collection.get(
+                            include=["embeddings", "documents"], limit=page_size, offset=count
+                        )
+                        ids = page.get("ids") or []
+                        if not ids:
+                            break
+                        for embedding, document in zip(page["embeddings"], page["documents"]):
+                            data = (document or "").encode("utf-8")
+                            docs.write(data)
+                            offset += len(data)
+                            offsets.append(offset)
+                            vectors.append(embedding)
+                        doc_ids.extend(ids)
+                        count += len(ids)
+                if not count:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    return None
+
+                matrix = np.asarray(vectors, dtype=np.float32)
+                matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+                np.save(os.path.join(tmp, "vectors.npy"), matrix)
+                np.save(os.path.join(tmp, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+                with open(os.path.join(tmp, "ids.txt"), "w", encoding="utf-8") as f:
+                    f.write("\n".join(doc_ids))
+                _write_json_atomic(os.path.join(tmp, "manifest.json"), {
+                    "index_version": version,
+                    "model": model,
+                    "count": count,
+                    "dim": int(matrix.shape[1]),
+                    "created_at": datetime.utcnow().isoformat(),
+                })
+
+                final = os.path.join(self.directory, name)
+                os.replace(tmp, final)
+                with open(os.path.join(self.directory, f"{CURRENT_FILE}.tmp"), "w", encoding="utf-8") as f:
+                    f.write(name)
+                os.replace(os.path.join(self.directory, f"{CURRENT_FILE}.tmp"),
+                           os.path.join(self.directory, CURRENT_FILE))
+                self._cleanup(keep=name)
+                self.last_build = time.time()
+                logger.info(f"📸 Snapshot vectoriel v{version}: {count} documents "
+                            f"en {(time.perf_counter() - started) * 1000:.0f}ms")
+                return final
+            except Exception:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+
+    def _cleanup(self, keep: str):
+        for entry in os.listdir(self.directory):
+            if entry.startswith("snap-") and entry != keep:
+                # Un processus qui l'a ouvert garde son mmap valide (POSIX);
+                # sous Windows la suppression échoue et sera retentée plus tard
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    def schedule_rebuild(self, get_collection: Callable, model: str):
+        """Debounced background rebuild after writes (collection resolved when the timer fires)"""
+        with self._timer_lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            delay = max(0.0, self.last_build + settings.VECTOR_SNAPSHOT_MIN_INTERVAL_SECONDS - time.time())
+            self._timer = threading.Timer(delay, self._rebuild_quietly, args=(get_collection, model))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _rebuild_quietly(self, get_collection: Callable, model: str):
+        try:
+            self.build(get_collection(), model)
+        except Exception as e:
+            logger.warning(f"⚠️ Snapshot vectoriel non reconstruit: {e}")
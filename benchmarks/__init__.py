@@ -0,0 +1,6 @@
+"""
+Benchmarks reproductibles des chemins chauds (chat, voix, RAG)
+
+Tout tourne en local: faux serveur LLM (Groq / OpenAI), faux moteur de
+recherche + pages HTML, clips audio générés. Voir benchmarks/run.py.
+"""
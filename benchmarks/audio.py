@@ -0,0 +1,43 @@
+"""
+Canned audio clips for the /voice benchmark
+
+Par défaut: WAV 16 kHz mono synthétiques (harmoniques modulées, proches d'une
+voix pour le VAD). Pour mesurer la transcription réelle, passer un dossier de
+vrais enregistrements (--audio-dir).
+"""
+import io
+import math
+import wave
+from pathlib import Path
+from typing import Dict, Optional
+
+SAMPLE_RATE = 16000
+
+
+def synth_clip(seconds: float, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Voiced-like signal: 120 Hz harmonics with syllable-rate envelope"""
+    n = int(seconds * sample_rate)
+    frames = bytearray()
+    for i in range(n):
+        t = i / sample_rate
+        envelope = 0.5 * (1 + math.sin(2 * math.pi * 4 * t))   # ~4 syllabes/s
+        value = sum(math.sin(2 * math.pi * 120 * h * t) / h for h in range(1, 6))
+        sample = int(max(-1.0, min(1.0, 0.3 * envelope * value)) * 32767)
+        frames += sample.to_bytes(2, "little", signed=True)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def load_clips(audio_dir: Optional[str] = None, durations=(2, 5, 10)) -> Dict[str, bytes]:
+    """Clips by name: real recordings from audio_dir, otherwise synthetic ones"""
+    if audio_dir:
+        paths = sorted(p for p in Path(audio_dir).iterdir() if p.suffix.lower() in (".wav", ".webm", ".mp3", ".ogg"))
+        if paths:
+            return {p.name: p.read_bytes() for p in paths}
+    return {f"synth_{d}s.wav": synth_clip(d) for d in durations}
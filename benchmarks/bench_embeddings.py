@@ -0,0 +1,177 @@
+"""
+Embedding backend benchmark: torch vs ONNX vs ONNX int8
+
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --backends torch,onnx-int8 --repeats 50
+
+Chaque backend tourne dans un sous-processus (mémoire résidente mesurable
+proprement): temps de chargement, RSS après chargement et après encodage,
+latence d'encode (p50/p95) par taille de lot, textes/s, et accord cosinus
+avec torch sur le même corpus.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.fakes import lorem
+from benchmarks.run import RESULTS_DIR, git_info, percentile
+
+BATCH_SIZES = (1, 8, 32)
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def corpus(n: int) -> List[str]:
+    return [lorem(i, 12 + (i % 5) * 20) for i in range(n)]
+
+
+def child(backend: str, model: str, repeats: int, n_texts: int, out_dir: str) -> Dict:
+    from backend.services.embedding_service import build_local_encoder, AGREEMENT_SENTENCES
+
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    encoder = build_local_encoder(model, backend).load()
+    load_s = time.perf_counter() - started
+    loaded_rss = rss_mb()
+
+    texts = corpus(n_texts)
+    encoder.encode(texts[:8])  # chauffe
+    latency: Dict[str, Dict] = {}
+    for size in BATCH_SIZES:
+        samples = []
+        for r in range(repeats):
+            batch = [texts[(r * size + i) % len(texts)] for i in range(size)]
+            t0 = time.perf_counter()
+            encoder.encode(batch)
+            samples.append((time.perf_counter() - t0) * 1000)
+        samples.sort()
+        latency[f"batch_{size}"] = {
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "texts_per_s": round(size * len(samples) / (sum(samples) / 1000), 1),
+        }
+
+    t0 = time.perf_counter()
+    vectors = encoder.encode(AGREEMENT_SENTENCES + texts, batch_size=32)
+    bulk_s = time.perf_counter() - t0
+    np.save(os.path.join(out_dir, f"{backend}.npy"), np.asarray(vectors, dtype=np.float32))
+
+    return {
+        "backend": backend,
+        "effective": type(encoder).__name__ + (" int8" if getattr(encoder, "quantized", False) else ""),
+        "load_s": round(load_s, 3),
+        "rss_mb_before": round(baseline_rss, 1),
+        "rss_mb_loaded": round(loaded_rss, 1),
+        "rss_mb_after": round(rss_mb(), 1),
+        "bulk_texts_per_s": round(len(vectors) / bulk_s, 1),
+        "latency": latency,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Embedding backend benchmark")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--model", default=None, help="Défaut: settings.EMBEDDING_MODEL")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--out-dir", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.model is None:
+        from backend.config import settings
+        args.model = settings.EMBEDDING_MODEL
+
+    if args.child:
+        result = child(args.child, args.model, args.repeats, args.texts, args.out_dir)
+        print(json.dumps(result))
+        return 0
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    out_dir = tempfile.mkdtemp(prefix="walle-embed-bench-")
+    results: Dict[str, Dict] = {}
+    for backend in backends:
+        print(f"▶ {backend}", flush=True)
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_embeddings", "--child", backend,
+             "--model", args.model, "--repeats", str(args.repeats), "--texts", str(args.texts),
+             "--out-dir", out_dir],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            results[backend] = {"error": proc.stderr.strip().splitlines()[-1:] or ["échec"]}
+            continue
+        results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # Accord cosinus avec torch, texte par texte
+    reference_path = os.path.join(out_dir, "torch.npy")
+    if os.path.exists(reference_path):
+        reference = np.load(reference_path)
+        for backend in backends:
+            path = os.path.join(out_dir, f"{backend}.npy")
+            if backend == "torch" or not os.path.exists(path):
+                continue
+            a = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+            b = np.load(path)
+            b = b / np.linalg.norm(b, axis=1, keepdims=True)
+            cos = (a * b).sum(axis=1)
+            results[backend]["agreement_vs_torch"] = {
+                "min": round(float(cos.min()), 5),
+                "mean": round(float(cos.mean()), 5),
+                # Même plus proche voisin que torch pour chaque texte?
+                "top1_match": round(float(((a @ a.T).argsort(axis=1)[:, -2] ==
+                                           (b @ b.T).argsort(axis=1)[:, -2]).mean()), 4),
+            }
+
+    started_at = datetime.now(timezone.utc)
+    git = git_info()
+    report = {
+        "meta": {"timestamp": started_at.isoformat(), "git_sha": git["sha"], "git_dirty": git["dirty"],
+                 "model": args.model, "cpu_count": os.cpu_count(), "args": vars(args)},
+        "backends": results,
+    }
+    path = Path(args.output) if args.output else \
+        RESULTS_DIR / f"{started_at.strftime('%Y%m%dT%H%M%SZ')}_{git['sha']}_embeddings.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    print(f"\n{'backend':<12}{'load s':>8}{'RSS MB':>9}{'b1 p50':>9}{'b32 p50':>9}{'txt/s':>9}{'cos min':>9}")
+    for backend, r in results.items():
+        if "error" in r:
+            print(f"{backend:<12} erreur: {r['error']}")
+            continue
+        cos = r.get("agreement_vs_torch", {}).get("min")
+        print(f"{backend:<12}{r['load_s']:>8.2f}{r['rss_mb_loaded']:>9.0f}"
+              f"{r['latency']['batch_1']['p50_ms']:>9.2f}{r['latency']['batch_32']['p50_ms']:>9.2f}"
+              f"{r['bulk_texts_per_s']:>9.0f}{cos if cos is not None else '-':>9}")
+    print(f"\n📄 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
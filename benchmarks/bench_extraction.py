@@ -0,0 +1,167 @@
+"""
+Page extraction benchmark on saved HTML fixtures
+
+    python -m benchmarks.bench_extraction
+    python -m benchmarks.bench_extraction --fixtures ~/pages --pages 500 --workers 8
+
+Modes (chacun dans un sous-processus pour une mémoire mesurable proprement):
+    bs4        ancien chemin: page entière, BeautifulSoup html.parser, tous les <p>
+    lxml       extraction.extract_main_text sur le préfixe plafonné (PAGE_MAX_BYTES)
+    lxml-pool  idem, réparti sur un pool de threads (--workers)
+
+Les fixtures sont complétées de variantes « lourdes » (--inflate-kb) où du
+boilerplate est ajouté après le contenu, comme sur les vraies pages.
+Rapporte pages/s, pic tracemalloc (allocations Python) et croissance du RSS max.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.fakes import lorem
+from benchmarks.run import RESULTS_DIR, git_info
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "html"
+MODES = ("bs4", "lxml", "lxml-pool")
+
+
+def inflate(body: bytes, target_kb: int, seed: int) -> bytes:
+    """Append comment threads and link lists after the content up to target_kb"""
+    filler, i = [], 0
+    size = len(body)
+    while size < target_kb * 1024:
+        block = (
+            f'<div class="comment"><p>{lorem(seed + i, 60)}</p></div>'
+            f'<ul class="related">' + "".join(
+                f'<li><a href="/r/{i}/{j}">{lorem(seed + i + j, 8)}</a></li>' for j in range(10)
+            ) + "</ul>"
+        ).encode()
+        filler.append(block)
+        size += len(block)
+        i += 1
+    marker = body.lower().rfind(b"</body>")
+    marker = marker if marker >= 0 else len(body)
+    return body[:marker] + b"".join(filler) + body[marker:]
+
+
+def load_pages(directory: Path, inflate_kb: List[int]) -> List[bytes]:
+    pages = [p.read_bytes() for p in sorted(directory.glob("*.htm*"))]
+    if not pages:
+        raise SystemExit(f"Aucune fixture HTML dans {directory}")
+    heavy = [inflate(page, kb, seed) for kb in inflate_kb for seed, page in enumerate(pages)]
+    return pages + heavy
+
+
+def legacy_extract(body: bytes) -> str:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(body.decode("utf-8", errors="replace"), "html.parser")
+    text = " ".join(p.get_text().strip() for p in soup.find_all("p"))
+    return " ".join(text.split())[:2000]
+
+
+def capped_extract(body: bytes) -> str:
+    from backend.config import settings
+    from backend.services.extraction import extract_main_text
+    return extract_main_text(body[:settings.PAGE_MAX_BYTES])
+
+
+def run_workload(mode: str, pages: List[bytes], total: int, workers: int) -> List[str]:
+    work = [pages[i % len(pages)] for i in range(total)]
+    extract: Callable[[bytes], str] = legacy_extract if mode == "bs4" else capped_extract
+    if mode == "lxml-pool":
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(extract, work))
+    return [extract(body) for body in work]
+
+
+def child(mode: str, args) -> Dict:
+    pages = load_pages(Path(args.fixtures), [int(kb) for kb in args.inflate_kb.split(",") if kb])
+    run_workload(mode, pages, len(pages), args.workers)  # chauffe (imports, parseurs)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    texts = run_workload(mode, pages, args.pages, args.workers)
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Passe séparée: tracemalloc ralentit fortement l'exécution
+    tracemalloc.start()
+    run_workload(mode, pages, len(pages), args.workers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "mode": mode,
+        "pages": args.pages,
+        "elapsed_s": round(elapsed, 3),
+        "pages_per_s": round(args.pages / elapsed, 1),
+        "input_kb_avg": round(sum(len(p) for p in pages) / len(pages) / 1024, 1),
+        "chars_avg": round(sum(len(t) for t in texts) / len(texts), 1),
+        "tracemalloc_peak_mb": round(peak / (1024 * 1024), 2),
+        # ru_maxrss est en Ko sous Linux
+        "rss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Page extraction benchmark")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--fixtures", default=str(FIXTURES_DIR))
+    parser.add_argument("--inflate-kb", default="256,2048", help="Variantes lourdes des fixtures (Ko)")
+    parser.add_argument("--pages", type=int, default=200, help="Pages traitées par mode")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(child(args.child, args)))
+        return 0
+
+    results: Dict[str, Dict] = {}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        print(f"▶ {mode}", flush=True)
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_extraction", "--child", mode,
+             "--fixtures", args.fixtures, "--inflate-kb", args.inflate_kb,
+             "--pages", str(args.pages), "--workers", str(args.workers)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            results[mode] = {"error": proc.stderr.strip().splitlines()[-1:] or ["échec"]}
+            continue
+        results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    started_at = datetime.now(timezone.utc)
+    git = git_info()
+    report = {
+        "meta": {"timestamp": started_at.isoformat(), "git_sha": git["sha"], "git_dirty": git["dirty"],
+                 "cpu_count": os.cpu_count(), "args": vars(args)},
+        "modes": results,
+    }
+    path = Path(args.output) if args.output else \
+        RESULTS_DIR / f"{started_at.strftime('%Y%m%dT%H%M%SZ')}_{git['sha']}_extraction.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    print(f"\n{'mode':<12}{'pages/s':>10}{'in KB':>9}{'chars':>8}{'peak MB':>10}{'RSS +MB':>10}")
+    for mode, r in results.items():
+        if "error" in r:
+            print(f"{mode:<12} erreur: {r['error']}")
+            continue
+        print(f"{mode:<12}{r['pages_per_s']:>10.1f}{r['input_kb_avg']:>9.0f}{r['chars_avg']:>8.0f}"
+              f"{r['tracemalloc_peak_mb']:>10.2f}{r['rss_growth_mb']:>10.1f}")
+    print(f"\n📄 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
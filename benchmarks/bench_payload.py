@@ -0,0 +1,122 @@
+"""
+/chat payload benchmark: full response vs lean mode (cursor deltas + orjson)
+
+    python -m benchmarks.bench_payload
+    python -m benchmarks.bench_payload --turns 50 --answer-words 120
+
+Simule une conversation de --turns tours dans une base SQLite temporaire et,
+à chaque tour, construit la réponse des deux façons:
+    full  ChatResponse (10 derniers messages, horodatages ISO), chemin FastAPI
+          standard: modèle pydantic -> jsonable_encoder -> json.dumps
+    lean  get_history_since(curseur) -> dict -> orjson (ORJSONResponse)
+Rapporte par tour: octets bruts, octets gzip (si au-delà de COMPRESSION_MIN_BYTES)
+et temps de construction + sérialisation (lecture de l'historique comprise).
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.fakes import lorem
+from benchmarks.run import RESULTS_DIR, git_info, percentile
+
+
+def compressed_size(body: bytes, minimum: int) -> int:
+    return len(gzip.compress(body, compresslevel=6)) if len(body) >= minimum else len(body)
+
+
+def stats(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": round(percentile(ordered, 50), 3),
+        "p95": round(percentile(ordered, 95), 3),
+    }
+
+
+async def simulate(args, rows: Dict[str, Dict[str, List[float]]], minimum: int):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from backend.models.schemas import ChatResponse
+    from backend.services.memory_service import memory_service
+
+    session_id = memory_service.generate_session_id()
+    cursor = None
+    for turn in range(args.turns):
+        query = lorem(turn, 12)
+        answer = lorem(10_000 + turn, args.answer_words)
+        await memory_service.add_message(session_id, "user", query, "es")
+        await memory_service.add_message(session_id, "assistant", answer, "es")
+
+        async def full() -> bytes:
+            history = await memory_service.get_conversation_history(session_id, limit=10)
+            response = ChatResponse(answer=answer, session_id=session_id, memory=history, rag_used=True)
+            return JSONResponse(jsonable_encoder(response)).body
+
+        async def lean() -> bytes:
+            memory, new_cursor, _ = await memory_service.get_history_since(session_id, cursor, limit=10)
+            body = {"answer": answer, "session_id": session_id, "memory": memory,
+                    "cursor": new_cursor, "rag_used": True, "cached": False}
+            return ORJSONResponse(body).body
+
+        for mode, build in (("full", full), ("lean", lean)):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                body = await build()
+            rows[mode]["ms"].append((time.perf_counter() - started) * 1000 / args.repeat)
+            rows[mode]["bytes"].append(len(body))
+            rows[mode]["gzip_bytes"].append(compressed_size(body, minimum))
+        # Le client garde le curseur du dernier message reçu
+        cursor = json.loads(body)["cursor"]
+    await memory_service.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="/chat payload benchmark")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--answer-words", type=int, default=80, help="Longueur des réponses simulées")
+    parser.add_argument("--repeat", type=int, default=20, help="Sérialisations mesurées par tour")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="walle-payload-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'payload.db'}"
+
+    # Import après DATABASE_URL: les settings lisent l'environnement
+    from backend.config import settings
+
+    rows: Dict[str, Dict[str, List[float]]] = {
+        mode: {"bytes": [], "gzip_bytes": [], "ms": []} for mode in ("full", "lean")
+    }
+    asyncio.run(simulate(args, rows, settings.COMPRESSION_MIN_BYTES))
+
+    results = {mode: {metric: stats(values) for metric, values in data.items()} for mode, data in rows.items()}
+    started_at = datetime.now(timezone.utc)
+    git = git_info()
+    report = {
+        "meta": {"timestamp": started_at.isoformat(), "git_sha": git["sha"], "git_dirty": git["dirty"],
+                 "args": vars(args), "compression_min_bytes": settings.COMPRESSION_MIN_BYTES},
+        "modes": results,
+    }
+    path = Path(args.output) if args.output else \
+        RESULTS_DIR / f"{started_at.strftime('%Y%m%dT%H%M%SZ')}_{git['sha']}_payload.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    print(f"\n{'mode':<8}{'bytes p50':>12}{'gzip p50':>12}{'ms/turn p50':>14}{'ms/turn p95':>14}")
+    for mode, r in results.items():
+        print(f"{mode:<8}{r['bytes']['p50']:>12.0f}{r['gzip_bytes']['p50']:>12.0f}"
+              f"{r['ms']['p50']:>14.3f}{r['ms']['p95']:>14.3f}")
+    print(f"\n📄 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Whisper throughput benchmark: one decode per request vs micro-batching
+
+    python -m benchmarks.bench_stt
+    python -m benchmarks.bench_stt --concurrency 1,4,8,16 --requests 64 --audio-dir ./clips
+
+Charge le modèle WHISPER_MODEL dans le processus (faster-whisper requis) et,
+pour chaque niveau de concurrence, envoie --requests transcriptions avec
+N requêtes en vol:
+    single   STT_BATCH_ENABLED=false: model.transcribe par requête (thread)
+    batched  micro-batching (STT_BATCH_MAX_SIZE, STT_BATCH_MAX_WAIT_MS)
+Rapporte clips/s, latence p50/p95 et taille moyenne des lots.
+
+Puis, une requête à la fois, les profils de décodage d'une session (profil audio):
+    detect   langue détectée à chaque clip, STT_BEAM_SIZE (`lang` démentie par le profil)
+    pinned   langue imposée, STT_BEAM_SIZE (nouvelle session: `lang` de la requête)
+    fast     langue imposée, STT_FAST_BEAM_SIZE (apprenant récurrent, clips courts)
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.audio import load_clips
+from benchmarks.run import RESULTS_DIR, git_info, percentile
+
+
+async def run_level(stt, clips: List[bytes], requests: int, concurrency: int, language: str) -> Dict[str, float]:
+    pending = iter(range(requests))
+    latencies: List[float] = []
+    failures = 0
+    before = dict(stt.batch_stats)
+
+    async def worker():
+        nonlocal failures
+        for i in pending:
+            started = time.perf_counter()
+            try:
+                await stt.transcribe(clips[i % len(clips)], language=language)
+            except Exception:
+                failures += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    count = stt.batch_stats["batches"] - before["batches"]
+    clips_batched = stt.batch_stats["clips"] - before["clips"]
+    ordered = sorted(latencies)
+    return {
+        "clips_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(ordered, 50), 1),
+        "p95_ms": round(percentile(ordered, 95), 1),
+        "mean_batch": round(clips_batched / count, 2) if count else 1.0,
+        "failures": failures,
+    }
+
+
+async def run_profiles(stt, clips: List[bytes], repeat: int, language: str) -> Dict[str, Dict[str, float]]:
+    from backend.config import settings
+
+    profiles = {
+        "detect": (None, settings.STT_BEAM_SIZE),
+        "pinned": (language, settings.STT_BEAM_SIZE),
+        "fast": (language, settings.STT_FAST_BEAM_SIZE),
+    }
+    results: Dict[str, Dict[str, float]] = {}
+    for name, (pinned, beam_size) in profiles.items():
+        latencies: List[float] = []
+        for _ in range(repeat):
+            for clip in clips:
+                started = time.perf_counter()
+                await stt.transcribe_with_info(clip, language=pinned, beam_size=beam_size)
+                latencies.append((time.perf_counter() - started) * 1000)
+        ordered = sorted(latencies)
+        results[name] = {
+            "beam_size": beam_size,
+            "mean_ms": round(sum(ordered) / len(ordered), 1),
+            "p95_ms": round(percentile(ordered, 95), 1),
+        }
+        print(f"profile  {name:<7} {results[name]}")
+    return results
+
+
+async def benchmark(args, stt, clips: List[bytes]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    # Échauffement: première inférence (allocation, VAD) hors mesure
+    await stt.transcribe(clips[0], language=args.language)
+    for mode in ("single", "batched"):
+        stt.batch_enabled = mode == "batched"
+        results[mode] = {}
+        for level in args.concurrency:
+            results[mode][str(level)] = await run_level(stt, clips, args.requests, level, args.language)
+            print(f"{mode:<8} c={level:<4} {results[mode][str(level)]}")
+    if args.profile_repeat:
+        results["profiles"] = await run_profiles(stt, clips, args.profile_repeat, args.language)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Whisper micro-batching benchmark")
+    parser.add_argument("--concurrency", default="1,2,4,8,16",
+                        type=lambda v: [int(x) for x in v.split(",") if x])
+    parser.add_argument("--requests", type=int, default=48, help="Transcriptions par niveau")
+    parser.add_argument("--audio-dir", default=None, help="Enregistrements réels (sinon clips synthétiques)")
+    parser.add_argument("--language", default="es")
+    parser.add_argument("--profile-repeat", type=int, default=3, help="Passes par clip et par profil (0 = ignorer)")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    from backend.config import settings
+    from backend.services.stt_service import STTService
+
+    stt = STTService()
+    stt.load_model()
+    if not stt.is_loaded:
+        print("❌ Whisper non disponible (pip install faster-whisper)")
+        return 1
+    clips = list(load_clips(args.audio_dir).values())
+    results = asyncio.run(benchmark(args, stt, clips))
+
+    started_at = datetime.now(timezone.utc)
+    git = git_info()
+    report = {
+        "meta": {"timestamp": started_at.isoformat(), "git_sha": git["sha"], "git_dirty": git["dirty"],
+                 "args": vars(args), "model": settings.WHISPER_MODEL, "clips": len(clips),
+                 "batch_max_size": settings.STT_BATCH_MAX_SIZE,
+                 "batch_max_wait_ms": settings.STT_BATCH_MAX_WAIT_MS},
+        "modes": results,
+    }
+    path = Path(args.output) if args.output else \
+        RESULTS_DIR / f"{started_at.strftime('%Y%m%dT%H%M%SZ')}_{git['sha']}_stt.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    print(f"\n{'conc.':<7}{'single clips/s':>16}{'batched clips/s':>17}{'speedup':>9}"
+          f"{'single p95':>12}{'batched p95':>13}{'mean batch':>12}")
+    for level in args.concurrency:
+        single, batched = results["single"][str(level)], results["batched"][str(level)]
+        speedup = batched["clips_per_s"] / single["clips_per_s"] if single["clips_per_s"] else 0.0
+        print(f"{level:<7}{single['clips_per_s']:>16.2f}{batched['clips_per_s']:>17.2f}{speedup:>8.2f}x"
+              f"{single['p95_ms']:>12.0f}{batched['p95_ms']:>13.0f}{batched['mean_batch']:>12.2f}")
+    if "profiles" in results:
+        print(f"\n{'profile':<9}{'beam':>6}{'mean ms':>10}{'p95 ms':>10}")
+        for name, r in results["profiles"].items():
+            print(f"{name:<9}{r['beam_size']:>6}{r['mean_ms']:>10.1f}{r['p95_ms']:>10.1f}")
+    print(f"\n📄 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
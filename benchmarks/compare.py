@@ -0,0 +1,73 @@
+"""
+Compare two benchmark result files
+
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 10]
+
+Code de sortie 1 si un p95 régresse de plus du seuil (en %) ou si le débit
+baisse d'autant: utilisable en CI.
+"""
+import sys
+import json
+import argparse
+from typing import Dict, Optional
+
+
+def _delta(old: float, new: float) -> Optional[float]:
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def _fmt(delta: Optional[float]) -> str:
+    return "   n/a" if delta is None else f"{delta:+6.1f}%"
+
+
+def compare(baseline: Dict, candidate: Dict, threshold: float) -> int:
+    base, cand = baseline["scenarios"], candidate["scenarios"]
+    print(f"baseline : {baseline['meta']['git_sha']} ({baseline['meta']['timestamp']})")
+    print(f"candidate: {candidate['meta']['git_sha']} ({candidate['meta']['timestamp']})\n")
+    print(f"{'scénario':<22}{'p50':>18}{'p95':>18}{'p99':>18}{'rps':>16}")
+
+    regressions = []
+    for name in sorted(set(base) | set(cand)):
+        if name not in base or name not in cand:
+            print(f"{name:<22}  (absent de {'baseline' if name not in base else 'candidate'})")
+            continue
+        old, new = base[name], cand[name]
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            cells.append(f"{new[key]:>9.1f} {_fmt(_delta(old[key], new[key]))}")
+        rps_delta = _delta(old["throughput_rps"], new["throughput_rps"])
+        cells.append(f"{new['throughput_rps']:>7.1f} {_fmt(rps_delta)}")
+        print(f"{name:<22}" + "".join(f"{c:>18}" for c in cells[:3]) + f"{cells[3]:>16}")
+
+        p95_delta = _delta(old["p95_ms"], new["p95_ms"])
+        if p95_delta is not None and p95_delta > threshold:
+            regressions.append(f"{name}: p95 {p95_delta:+.1f}%")
+        if rps_delta is not None and rps_delta < -threshold:
+            regressions.append(f"{name}: débit {rps_delta:+.1f}%")
+
+    if regressions:
+        print(f"\n❌ Régressions (> {threshold:.0f}%):")
+        for line in regressions:
+            print(f"   - {line}")
+        return 1
+    print(f"\n✅ Aucune régression au-delà de {threshold:.0f}%")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Régression tolérée en %%")
+    args = parser.parse_args(argv)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    return compare(baseline, candidate, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Local stand-ins for the external services used by the backend
+
+- FakeLLMServer: /openai/v1/chat/completions (SDK Groq) et /v1/chat/completions
+  (OpenAI compatible), réponse en streaming SSE avec latence configurable
+- FakeWebServer: DuckDuckGo JSON/HTML, Bing et pages HTML déterministes,
+  avec injection de pannes par fournisseur (délai, taux d'erreurs)
+
+Serveurs HTTP de la bibliothèque standard, un thread par connexion.
+"""
+import sys
+import json
+import time
+import random
+import zlib
+import threading
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+WORDS = (
+    "hola bonjour hello apprendre aprender learn verbe verbo verb grammaire gramática "
+    "grammar exemple ejemplo example phrase frase sentence pratique práctica practice "
+    "conjugaison conjugación conjugation vocabulaire vocabulario vocabulary"
+).split()
+
+
+def lorem(seed: int, n_words: int) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Client parti avant la réponse (timeout côté client, pannes injectées): attendu
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class _Server:
+    """Base: start/stop a ThreadingHTTPServer on a free local port"""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = _QuietHTTPServer((host, port), self.handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.bench = self
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def bench(self):
+        return self.server.bench
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# ========================================
+# LLM
+# ========================================
+class _LLMHandler(_QuietHandler):
+    def do_POST(self):
+        bench = self.bench
+        bench.count()
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, b'{"error": "not found"}', "application/json")
+            return
+
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+        prompt_tokens = max(1, prompt_chars // 4)
+        n_tokens = min(int(payload.get("max_tokens") or bench.tokens), bench.tokens)
+        words = lorem(prompt_chars, n_tokens).split()
+        model = payload.get("model", "fake")
+
+        time.sleep(bench.ttft)
+        if not payload.get("stream"):
+            time.sleep(bench.token_delay * len(words))
+            body = {
+                "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                          "total_tokens": prompt_tokens + len(words)},
+            }
+            self._send(200, json.dumps(body).encode(), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+
+        def event(data):
+            self.wfile.write(f"data: {json.dumps(data)}\n\n".encode())
+            self.wfile.flush()
+
+        base = {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for i, word in enumerate(words):
+            event({**base, "choices": [{"index": 0, "delta": {"content": (" " if i else "") + word},
+                                        "finish_reason": None}]})
+            time.sleep(bench.token_delay)
+        # Dernier chunk: usage au format Groq (x_groq) et OpenAI (include_usage)
+        event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+               "x_groq": {"id": "fake", "usage": usage}})
+        event({**base, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class FakeLLMServer(_Server):
+    handler_class = _LLMHandler
+
+    def __init__(self, ttft: float = 0.15, token_delay: float = 0.002, tokens: int = 120, **kwargs):
+        super().__init__(**kwargs)
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.tokens = tokens
+
+
+# ========================================
+# Recherche web + pages
+# ========================================
+PROVIDER_PATHS = {"/ddg/api": "ddg_json", "/ddg/html": "ddg_html", "/bing": "bing"}
+
+
+class _WebHandler(_QuietHandler):
+    def do_GET(self):
+        bench = self.bench
+        bench.count()
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query).get("q", [""])[0]
+        time.sleep(bench.latency)
+
+        provider = PROVIDER_PATHS.get(parsed.path, "")
+        if provider:
+            bench.hit(provider)
+        fault = bench.faults.get(provider)
+        if fault:
+            time.sleep(fault["delay"])
+            if bench.roll() < fault["error_rate"]:
+                self._send(fault["status"], b"injected failure", "text/plain")
+                return
+
+        if parsed.path == "/ddg/api":
+            # Comme l'API réelle pour une requête conversationnelle: rien d'exploitable
+            body = {"AbstractText": "", "RelatedTopics": []}
+            self._send(200, json.dumps(body).encode(), "application/json")
+        elif parsed.path == "/ddg/html":
+            links = "".join(
+                f'<div class="result"><a class="result__a" href="{self._page_url(query, i)}">'
+                f"{escape(query)} {i}</a></div>"
+                for i in range(bench.results)
+            )
+            self._send(200, f"<html><body>{links}</body></html>".encode(), "text/html; charset=utf-8")
+        elif parsed.path == "/bing":
+            links = "".join(
+                f'<li class="b_algo"><h2><a href="{self._page_url(query, i)}">{escape(query)} {i}</a></h2></li>'
+                for i in range(bench.results)
+            )
+            self._send(200, f"<html><body><ol>{links}</ol></body></html>".encode(), "text/html; charset=utf-8")
+        elif parsed.path.startswith("/page/"):
+            seed = zlib.crc32(f"{query}|{parsed.path}".encode())
+            paragraphs = "".join(f"<p>{lorem(seed + i, 60)}</p>" for i in range(bench.paragraphs))
+            html = (
+                "<html><head><title>page</title><script>var x = 1;</script></head><body>"
+                f"<nav>menu</nav><article>{paragraphs}</article><footer>footer</footer></body></html>"
+            )
+            time.sleep(bench.page_latency)
+            self._send(200, html.encode(), "text/html; charset=utf-8")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def _page_url(self, query: str, i: int) -> str:
+        return f"{self.bench.url}/page/{i}?q={quote(query)}"
+
+
+class FakeWebServer(_Server):
+    handler_class = _WebHandler
+
+    def __init__(self, latency: float = 0.03, page_latency: float = 0.05, results: int = 3,
+                 paragraphs: int = 8, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.page_latency = page_latency
+        self.results = results
+        self.paragraphs = paragraphs
+        self.faults: dict = {}
+        self.hits: dict = {name: 0 for name in PROVIDER_PATHS.values()}  # requêtes par fournisseur
+        self._rng = random.Random(0)
+
+    def inject(self, provider: str, delay: float = 0.0, error_rate: float = 0.0, status: int = 503):
+        """Slow down and/or fail a search provider (ddg_json, ddg_html, bing)"""
+        self.faults[provider] = {"delay": delay, "error_rate": error_rate, "status": status}
+
+    def clear_faults(self):
+        self.faults = {}
+
+    def hit(self, provider: str):
+        with self._lock:
+            self.hits[provider] += 1
+
+    def roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def env(self) -> dict:
+        """Settings overrides pointing the RAG service at this server"""
+        return {
+            "SEARCH_DDG_API_URL": f"{self.url}/ddg/api",
+            "SEARCH_DDG_HTML_URL": f"{self.url}/ddg/html",
+            "SEARCH_BING_URL": f"{self.url}/bing",
+        }
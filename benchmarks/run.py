@@ -0,0 +1,411 @@
+"""
+Benchmark harness for the chat, voice and RAG hot paths
+
+    python -m benchmarks.run                       # tous les scénarios
+    python -m benchmarks.run --scenarios chat_no_rag,chat_rag --requests 200 --concurrency 16
+    python -m benchmarks.compare benchmarks/results/A.json benchmarks/results/B.json
+
+L'application (backend.main.app) tourne sous uvicorn dans un thread; Groq et la
+recherche web sont remplacés par des faux serveurs locaux, la base SQLite et
+ChromaDB vivent dans un dossier temporaire. Le résultat (p50/p95/p99, débit,
+codes HTTP) est écrit en JSON, nommé par date et commit git.
+
+chat_batch envoie des lots /chat/batch (--batch-size éléments d'un même sujet,
+comme les réponses d'une classe) et mesure la durée du lot entier.
+
+chat_rag_faults injecte des pannes dans la fausse recherche web (DuckDuckGo JSON
+en 503, DuckDuckGo HTML au-delà de son timeout) et relève l'état des
+disjoncteurs sur /health à la fin.
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fakes import FakeLLMServer, FakeWebServer, lorem
+from benchmarks.audio import load_clips
+
+RESULTS_DIR = Path(__file__).parent / "results"
+ALL_SCENARIOS = ("chat_no_rag", "chat_rag", "chat_batch", "chat_rag_faults", "voice", "rag_index", "rag_search")
+TOPICS = ("subjonctif", "pretérito", "present perfect", "passé composé", "ser y estar", "phrasal verbs")
+
+
+# ========================================
+# Statistiques
+# ========================================
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile on an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies_ms: List[float], elapsed: float, statuses: Dict[str, int], **extra) -> Dict:
+    values = sorted(latencies_ms)
+    ok = sum(n for code, n in statuses.items() if code.startswith("2"))
+    return {
+        "n": len(values),
+        "ok": ok,
+        "status_codes": statuses,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "max_ms": round(values[-1], 2) if values else 0.0,
+        "throughput_rps": round(ok / elapsed, 2) if elapsed > 0 else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        **extra,
+    }
+
+
+def git_info() -> Dict[str, object]:
+    def run(*args) -> str:
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            return ""
+    return {
+        "sha": run("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(run("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+# ========================================
+# Environnement isolé
+# ========================================
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def configure_env(workdir: Path, llm: FakeLLMServer, web: FakeWebServer, args) -> Dict[str, str]:
+    """Settings overrides; must run before backend is imported"""
+    env = {
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": llm.url,
+        "LLM_PROVIDERS": "groq",
+        "DATABASE_URL": f"sqlite:///{workdir / 'bench.db'}",
+        "CHROMADB_PATH": str(workdir / "chromadb"),
+        "SEMANTIC_CACHE_ENABLED": str(args.semantic_cache).lower(),
+        "RAG_GATE_POLICY": args.rag_gate,
+        "RESEARCH_AGENT_ENABLED": "false",
+        # Le faux LLM n'a pas de quota: mesurer l'app, pas la file d'admission
+        "LLM_RPM_LIMIT": "0",
+        "LLM_TPM_LIMIT": "0",
+        **web.env(),
+    }
+    os.environ.update(env)
+    return env
+
+
+class AppServer:
+    """uvicorn in a background thread (lifespan included)"""
+
+    def __init__(self, app, port: int):
+        import uvicorn
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+        self.server = uvicorn.Server(config)
+        self.url = f"http://127.0.0.1:{port}"
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout: float = 300.0):
+        self._thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if not self._thread.is_alive() or time.time() > deadline:
+                raise RuntimeError("Le serveur de l'application n'a pas démarré")
+            time.sleep(0.1)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self._thread.join(timeout=30)
+
+
+# ========================================
+# Scénarios HTTP
+# ========================================
+async def drive(send: Callable, n: int, concurrency: int, warmup: int) -> Dict:
+    """Run n requests (after warmup ones) with at most `concurrency` in flight"""
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+        for i in range(warmup):
+            await send(client, -1 - i)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+
+        async def one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    code = str((await send(client, i)).status_code)
+                except Exception as e:
+                    code = type(e).__name__
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, statuses, concurrency=concurrency)
+
+
+def chat_sender(base_url: str, use_rag: bool, sessions: int, lang: str):
+    async def send(client, i: int):
+        # Requêtes toutes différentes: ni le cache ni la coalescence ne faussent la mesure
+        query = f"{TOPICS[i % len(TOPICS)]}: {lorem(i, 8)} #{i}"
+        body = {"query": query, "lang": lang, "use_rag": use_rag, "session_id": f"bench-{i % sessions}"}
+        return await client.post(f"{base_url}/chat", json=body)
+    return send
+
+
+def batch_sender(base_url: str, batch_size: int, lang: str):
+    failures = {"items": 0}
+
+    async def send(client, i: int):
+        topic = TOPICS[i % len(TOPICS)]
+        items = [
+            {"query": f"{topic}: {lorem(i * batch_size + j, 8)} #{i}.{j}", "lang": lang,
+             "session_id": f"bench-batch-{i}-{j}"}
+            for j in range(batch_size)
+        ]
+        # Le lot n'est terminé qu'à la dernière ligne NDJSON
+        response = await client.post(f"{base_url}/chat/batch", json={"items": items, "topic": topic})
+        failures["items"] += sum(1 for line in response.text.splitlines()
+                                 if line and json.loads(line).get("status", 200) != 200)
+        return response
+    return send, failures
+
+
+def voice_sender(base_url: str, clips: Dict[str, bytes], lang: str):
+    names = sorted(clips)
+
+    async def send(client, i: int):
+        name = names[i % len(names)]
+        files = {"audio": (name, clips[name], "audio/wav")}
+        params = {"lang": lang, "use_rag": "false", "session_id": f"bench-voice-{i % 8}"}
+        return await client.post(f"{base_url}/voice", files=files, params=params)
+    return send
+
+
+# ========================================
+# Scénarios RAG (en processus, par taille de corpus)
+# ========================================
+def make_corpus(size: int, lang: str) -> List[Dict[str, str]]:
+    return [
+        {"url": f"http://bench.local/doc/{i}", "title": f"{TOPICS[i % len(TOPICS)]} {i}",
+         "content": lorem(i, 180)}
+        for i in range(size)
+    ]
+
+
+def bench_rag(corpus_sizes: List[int], batch: int, queries: int, lang: str, do_index: bool, do_search: bool) -> Dict:
+    from backend.services.rag_service import rag_service
+
+    original = rag_service.collection
+    results: Dict[str, Dict] = {}
+    try:
+        for size in corpus_sizes:
+            name = f"bench_{size}_{int(time.time())}"
+            rag_service.collection = rag_service.client.get_or_create_collection(
+                name=name, metadata={"hnsw:space": "cosine"}
+            )
+            corpus = make_corpus(size, lang)
+
+            index_ms: List[float] = []
+            started = time.perf_counter()
+            for offset in range(0, size, batch):
+                t0 = time.perf_counter()
+                rag_service.index_documents(corpus[offset:offset + batch], lang)
+                index_ms.append((time.perf_counter() - t0) * 1000)
+            elapsed = time.perf_counter() - started
+            if do_index:
+                results[f"rag_index[{size}]"] = summarize(
+                    index_ms, elapsed, {"200": len(index_ms)},
+                    corpus_size=size, batch_size=batch,
+                    docs_per_s=round(size / elapsed, 2) if elapsed > 0 else 0.0,
+                )
+
+            if do_search:
+                search_ms: List[float] = []
+                started = time.perf_counter()
+                for i in range(queries):
+                    t0 = time.perf_counter()
+                    rag_service.search_context(f"{TOPICS[i % len(TOPICS)]} {lorem(10_000 + i, 6)}")
+                    search_ms.append((time.perf_counter() - t0) * 1000)
+                elapsed = time.perf_counter() - started
+                results[f"rag_search[{size}]"] = summarize(
+                    search_ms, elapsed, {"200": len(search_ms)}, corpus_size=size
+                )
+            rag_service.client.delete_collection(name)
+            print(f"  corpus {size}: ok", flush=True)
+    finally:
+        rag_service.collection = original
+    return results
+
+
+# ========================================
+# Entrée
+# ========================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="WALL-E / Ardy hot path benchmarks")
+    parser.add_argument("--scenarios", default=",".join(ALL_SCENARIOS),
+                        help=f"Liste séparée par des virgules parmi {', '.join(ALL_SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=100, help="Requêtes mesurées par scénario HTTP")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=16, help="Sessions distinctes pour /chat")
+    parser.add_argument("--batch-size", type=int, default=30, help="chat_batch: éléments par lot")
+    parser.add_argument("--lang", default="es")
+    parser.add_argument("--corpus-sizes", default="100,1000,5000")
+    parser.add_argument("--index-batch", type=int, default=100)
+    parser.add_argument("--search-queries", type=int, default=200)
+    parser.add_argument("--audio-dir", default=None, help="Vrais enregistrements pour /voice (sinon clips synthétiques)")
+    parser.add_argument("--llm-ttft", type=float, default=0.15, help="Faux LLM: délai avant le premier token (s)")
+    parser.add_argument("--llm-token-delay", type=float, default=0.002)
+    parser.add_argument("--llm-tokens", type=int, default=120)
+    parser.add_argument("--search-latency", type=float, default=0.03)
+    parser.add_argument("--page-latency", type=float, default=0.05)
+    parser.add_argument("--fault-delay", type=float, default=12.0,
+                        help="chat_rag_faults: délai injecté sur DuckDuckGo HTML (au-delà de son timeout)")
+    parser.add_argument("--fault-error-rate", type=float, default=1.0,
+                        help="chat_rag_faults: part de réponses 503 sur l'API DuckDuckGo JSON")
+    parser.add_argument("--semantic-cache", action="store_true", help="Laisser le cache sémantique actif")
+    parser.add_argument("--rag-gate", default="always", choices=("always", "auto", "never"),
+                        help="RAG_GATE_POLICY (always: chat_rag mesure toujours la recherche web)")
+    parser.add_argument("--label", default="", help="Étiquette libre ajoutée au nom du fichier")
+    parser.add_argument("--output", default=None, help="Chemin du JSON (défaut: benchmarks/results/)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(ALL_SCENARIOS)
+    if unknown:
+        print(f"Scénarios inconnus: {sorted(unknown)}", file=sys.stderr)
+        return 2
+
+    llm = FakeLLMServer(ttft=args.llm_ttft, token_delay=args.llm_token_delay, tokens=args.llm_tokens).start()
+    web = FakeWebServer(latency=args.search_latency, page_latency=args.page_latency).start()
+    workdir = Path(tempfile.mkdtemp(prefix="walle-bench-"))
+    env = configure_env(workdir, llm, web, args)
+
+    started_at = datetime.now(timezone.utc)
+    results: Dict[str, Dict] = {}
+    notes: List[str] = []
+
+    # Import après configure_env: les settings lisent l'environnement
+    from backend.main import app
+    from backend.services.stt_service import stt_service
+
+    app_server = None
+    try:
+        http_scenarios = [s for s in scenarios if s in ("chat_no_rag", "chat_rag", "chat_batch", "voice", "chat_rag_faults")]
+        if http_scenarios:
+            app_server = AppServer(app, free_port()).start()
+
+        for name in http_scenarios:
+            print(f"▶ {name}", flush=True)
+            if name == "voice":
+                if not stt_service.is_loaded:
+                    notes.append("voice: faster-whisper non chargé, scénario ignoré")
+                    continue
+                clips = load_clips(args.audio_dir)
+                send = voice_sender(app_server.url, clips, args.lang)
+                n = max(1, args.requests // 4)   # transcription: beaucoup plus lent
+                results[name] = asyncio.run(drive(send, n, args.concurrency, args.warmup))
+                results[name]["clips"] = sorted(clips)
+            elif name == "chat_batch":
+                send, failures = batch_sender(app_server.url, args.batch_size, args.lang)
+                n = max(1, args.requests // args.batch_size)
+                results[name] = asyncio.run(drive(send, n, max(1, args.concurrency // 4), 0))
+                results[name]["batch_size"] = args.batch_size
+                results[name]["items_failed"] = failures["items"]
+                results[name]["items_per_s"] = round(n * args.batch_size / results[name]["elapsed_s"], 2)
+            elif name == "chat_rag_faults":
+                # DDG JSON en erreur, DDG HTML bloqué au-delà de son timeout: les disjoncteurs
+                # doivent les écarter et laisser Bing servir après les premières requêtes
+                web.inject("ddg_json", error_rate=args.fault_error_rate)
+                web.inject("ddg_html", delay=args.fault_delay)
+                import httpx
+                try:
+                    send = chat_sender(app_server.url, True, args.sessions, args.lang)
+                    results[name] = asyncio.run(drive(send, args.requests, args.concurrency, args.warmup))
+                    results[name]["search_providers"] = httpx.get(
+                        f"{app_server.url}/health", timeout=30).json().get("search_providers", {})
+                finally:
+                    web.clear_faults()
+            else:
+                send = chat_sender(app_server.url, name == "chat_rag", args.sessions, args.lang)
+                results[name] = asyncio.run(drive(send, args.requests, args.concurrency, args.warmup))
+
+        if {"rag_index", "rag_search"} & set(scenarios):
+            print("▶ rag (index / search)", flush=True)
+            sizes = [int(s) for s in args.corpus_sizes.split(",") if s.strip()]
+            results.update(bench_rag(
+                sizes, args.index_batch, args.search_queries, args.lang,
+                "rag_index" in scenarios, "rag_search" in scenarios
+            ))
+    finally:
+        if app_server is not None:
+            app_server.stop()
+        llm.stop()
+        web.stop()
+
+    git = git_info()
+    report = {
+        "meta": {
+            "timestamp": started_at.isoformat(),
+            "git_sha": git["sha"],
+            "git_dirty": git["dirty"],
+            "label": args.label,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "env": {k: v for k, v in env.items() if k != "GROQ_API_KEY"},
+            "fake_llm_requests": llm.requests,
+            "fake_web_requests": web.requests,
+            "notes": notes,
+        },
+        "scenarios": results,
+    }
+
+    if args.output:
+        path = Path(args.output)
+    else:
+        suffix = f"_{args.label}" if args.label else ""
+        path = RESULTS_DIR / f"{started_at.strftime('%Y%m%dT%H%M%SZ')}_{git['sha']}{suffix}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    print(f"\n{'scénario':<22}{'n':>6}{'ok':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>9}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['n']:>6}{r['ok']:>6}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['throughput_rps']:>9.1f}")
+    for note in notes:
+        print(f"⚠️ {note}")
+    print(f"\n📄 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
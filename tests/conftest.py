@@ -0,0 +1,8 @@
+"""
+Les tests n'importent ni torch, ni Whisper, ni TTS: comme un worker web en mode
+multi-processus, rag_service / stt_service / tts_service sont des proxys vers un
+serveur de modèles (jamais appelé ici). À définir avant le premier import de backend.
+"""
+import os
+
+os.environ.setdefault("MODEL_SERVER_URL", "http://127.0.0.1:9")
@@ -0,0 +1,145 @@
+"""
+LLM admission control: token buckets, fair queue, rejection, settlement
+"""
+import asyncio
+import time
+
+import pytest
+
+from backend.config import settings
+from backend.services import admission
+from backend.services.admission import PRIORITIES, AdmissionController, AdmissionRejected, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refill(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    bucket = TokenBucket(per_minute=60)             # 1 par seconde, capacité 60
+    assert bucket.time_for(60) == 0
+    bucket.consume(60)
+    assert bucket.time_for(1) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.time_for(1) == pytest.approx(0.5)
+    clock.now += 600                                # plafonné à la capacité
+    assert bucket.time_for(60) == 0 and bucket.time_for(61) == pytest.approx(1.0)
+    bucket.consume(70)                              # dette: estimation trop basse
+    assert bucket.time_for(1) == pytest.approx(11.0)
+
+
+def drained(rpm: float = 600, **kwargs) -> AdmissionController:
+    controller = AdmissionController(rpm=rpm, tpm=0, workers=1, **kwargs)
+    controller.requests.level = 0                   # seau vide: tout passe par la file
+    return controller
+
+
+def test_round_robin_between_sessions():
+    controller = drained(max_wait=5)                # 10 admissions par seconde
+    served = []
+
+    async def call(session_id: str, n: int):
+        await controller.admit(session_id, "text")
+        served.append(f"{session_id}{n}")
+
+    async def main():
+        tasks = [asyncio.create_task(call("A", n)) for n in range(3)]
+        await asyncio.sleep(0)
+        # Position estimée du nouveau venu B: un seul appel de A passe avant lui
+        assert controller._ahead(PRIORITIES["text"], "B") == (1, pytest.approx(controller.tokens_per_call))
+        assert controller._ahead(PRIORITIES["text"], "A")[0] == 3
+        assert controller._ahead(PRIORITIES["voice"], "C")[0] == 0
+        tasks.append(asyncio.create_task(call("B", 0)))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert served == ["A0", "B0", "A1", "A2"]
+
+
+def test_voice_served_before_text():
+    controller = drained(max_wait=5)
+    served = []
+
+    async def call(session_id: str, kind: str):
+        await controller.admit(session_id, kind)
+        served.append(kind)
+
+    async def main():
+        tasks = [asyncio.create_task(call(f"t{i}", "text")) for i in range(2)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("v", "voice")))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert served == ["voice", "text", "text"]
+
+
+def test_rejected_when_estimated_wait_exceeds_deadline():
+    controller = drained(rpm=60, max_wait=0.5)      # 1 par seconde
+
+    async def main():
+        with pytest.raises(AdmissionRejected) as raised:
+            await controller.admit("s", "text")
+        return raised.value
+
+    rejected = asyncio.run(main())
+    assert rejected.reason == "deadline"
+    assert rejected.retry_after == pytest.approx(1.0, abs=0.05)
+    assert rejected.retry_after_header == "1"
+
+
+def test_rejected_when_queue_is_full():
+    controller = drained(max_wait=5, max_queue=1)
+
+    async def main():
+        first = asyncio.create_task(controller.admit("a", "text"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as raised:
+            await controller.admit("b", "text")
+        await first
+        return raised.value
+
+    assert asyncio.run(main()).reason == "queue_full"
+
+
+def test_settle_corrects_estimate_and_refunds_fallback():
+    controller = AdmissionController(rpm=600, tpm=100000, workers=1)
+    estimate = controller.tokens_per_call
+
+    async def admitted(provider: str, prompt: int, completion: int):
+        await controller.admit("s", "text")
+        tokens_before = controller.tokens.level
+        requests_before = controller.requests.level
+        controller.settle(provider, prompt, completion)
+        return controller.tokens.level - tokens_before, controller.requests.level - requests_before
+
+    # Servi par le fournisseur compté: écart entre estimation et réel
+    tokens_delta, _ = asyncio.run(admitted(settings.LLM_ADMISSION_PROVIDER, 300, 200))
+    assert tokens_delta == pytest.approx(estimate - 500, abs=0.5)
+    assert controller.tokens_per_call == pytest.approx(0.8 * estimate + 0.2 * 500)
+
+    # Servi par un secours: requête et tokens rendus
+    estimate = controller.tokens_per_call
+    tokens_delta, requests_delta = asyncio.run(admitted("local", 300, 200))
+    assert tokens_delta == pytest.approx(estimate, abs=0.5)
+    assert requests_delta == pytest.approx(1, abs=0.05)
+
+
+def test_penalize_pauses_admissions():
+    controller = AdmissionController(rpm=600, tpm=0, workers=1)
+    assert controller._wait_for(1, 0) == 0
+    controller.penalize(3)
+    assert controller._wait_for(1, 0) == pytest.approx(3, abs=0.05)
+    assert controller.stats()["paused_s"] == pytest.approx(3, abs=0.1)
+
+
+def test_disabled_without_limits():
+    controller = AdmissionController(rpm=0, tpm=0, workers=1)
+    assert not controller.enabled
+    assert asyncio.run(controller.admit("s")) is None
@@ -0,0 +1,74 @@
+"""Search provider circuit breakers against the fake web server (benchmarks.fakes)"""
+import threading
+import time
+
+import pytest
+
+from backend.config import settings
+from backend.services import rag_service as rag_module
+from backend.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, BreakerRegistry
+from benchmarks.fakes import FakeWebServer
+
+COOLDOWN = 0.5
+
+
+@pytest.fixture
+def web(monkeypatch):
+    server = FakeWebServer(latency=0.0, page_latency=0.0, results=2, paragraphs=4).start()
+    for name, value in server.env().items():
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(settings, "SEARCH_PROVIDERS", "ddg_html,bing")
+    monkeypatch.setattr(settings, "SEARCH_BREAKER_MIN_CALLS", 3)
+    monkeypatch.setattr(settings, "SEARCH_BREAKER_COOLDOWN_SECONDS", COOLDOWN)
+    monkeypatch.setattr(rag_module, "search_breakers", BreakerRegistry())
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def rag():
+    # web_search n'utilise ni l'encodeur ni ChromaDB
+    return rag_module.RAGService.__new__(rag_module.RAGService)
+
+
+def _search(rag):
+    # Plus de résultats qu'un seul fournisseur n'en donne: les deux sont sollicités
+    return rag.web_search("subjuntivo presente", num_results=4)
+
+
+def test_failing_provider_opens_is_skipped_probed_once_and_recovers(web, rag):
+    breakers = rag_module.search_breakers
+    web.inject("ddg_html", error_rate=1.0)
+
+    for _ in range(3):
+        assert len(_search(rag)) == 2  # Bing seul
+    ddg = breakers.get("ddg_html")
+    assert ddg.state == OPEN
+    assert web.hits["ddg_html"] == 3
+    # Fournisseur en panne essayé après les fournisseurs sains
+    assert breakers.ordered(["ddg_html", "bing"]) == ["bing", "ddg_html"]
+
+    # Pendant le cooldown: ignoré sans requête
+    _search(rag)
+    assert web.hits["ddg_html"] == 3
+    assert web.hits["bing"] == 4
+
+    # Après le cooldown: un seul appel d'essai, même avec des recherches concurrentes
+    time.sleep(COOLDOWN + 0.1)
+    web.inject("ddg_html", delay=0.3, error_rate=1.0)
+    threads = [threading.Thread(target=_search, args=(rag,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.15)
+    assert ddg.state == HALF_OPEN
+    for thread in threads:
+        thread.join()
+    assert web.hits["ddg_html"] == 4
+    assert ddg.state == OPEN  # essai raté: rouvert
+
+    # Fournisseur rétabli: l'essai suivant referme le disjoncteur
+    web.clear_faults()
+    time.sleep(COOLDOWN + 0.1)
+    assert len(_search(rag)) == 4
+    assert ddg.state == CLOSED
+    assert breakers.ordered(["ddg_html", "bing"]) == ["ddg_html", "bing"]
@@ -0,0 +1,72 @@
+"""
+Token budget of the prompt context (comptage approximatif: 4 caractères/token)
+"""
+import pytest
+
+from backend.services import context_builder
+from backend.services.context_builder import RAG_HEADER, SUMMARY_HEADER, ContextBuilder
+
+
+@pytest.fixture(autouse=True)
+def approximate_tokens(monkeypatch):
+    # Comptage déterministe, sans télécharger le vocabulaire tiktoken
+    monkeypatch.setattr(context_builder, "_get_encoding", lambda: None)
+
+
+def turn(role: str, words: int, tag: str) -> dict:
+    return {"role": role, "content": " ".join([tag] * words)}
+
+
+def test_take_never_overruns_the_budget():
+    builder = ContextBuilder(budget=10, recent_turns=4, max_item_tokens=100)
+    assert builder._take("x" * 36) == "x" * 36        # 9 tokens + saut de ligne
+    assert builder.remaining == 0
+    assert builder._take("abcd") is None
+
+    builder = ContextBuilder(budget=10, recent_turns=4, max_item_tokens=100)
+    assert builder._take("x" * 40).endswith("…")       # 10 tokens: tronqué pour tenir
+    assert builder.remaining == 0
+
+
+def test_priority_recent_summary_rag_older():
+    history = [turn("user" if i % 2 == 0 else "assistant", 10, f"t{i}") for i in range(8)]
+    chunks = "\n\n".join(["rag " * 20, "more " * 20])
+
+    roomy = ContextBuilder(budget=2000, recent_turns=4, max_item_tokens=300)
+    built = roomy.build(history, chunks, summary="résumé " * 10)
+    assert built.sections == {"recent": 4, "summary": 1, "rag": 2, "older": 4}
+    assert built.text.startswith(SUMMARY_HEADER) and RAG_HEADER in built.text
+
+    # Budget serré (4 tours x 9 + résumé 25): RAG et anciens tours restent dehors
+    tight = ContextBuilder(budget=61, recent_turns=4, max_item_tokens=300)
+    built = tight.build(history, chunks, summary="résumé " * 10)
+    assert built.sections["recent"] == 4 and built.sections["summary"] == 1
+    assert built.sections["rag"] == 0 and built.sections["older"] == 0
+    assert tight.remaining == 0
+    assert "t7" in built.text and "t3" not in built.text
+
+
+def test_budget_exhausted_by_recent_turns_keeps_the_newest():
+    history = [turn("user", 30, f"m{i}") for i in range(4)]  # 24 tokens chacun
+    builder = ContextBuilder(budget=40, recent_turns=4, max_item_tokens=300)
+    built = builder.build(history)
+    # Le plus récent entier, le précédent tronqué au reste du budget
+    assert built.sections["recent"] == 2
+    assert "m3 m3" in built.text and "m2" in built.text and built.text.endswith("m3")
+    assert "m1" not in built.text
+    assert builder.remaining == 0
+
+
+def test_current_query_is_not_repeated():
+    history = [turn("assistant", 3, "hola"), {"role": "user", "content": "¿qué tal?"}]
+    built = ContextBuilder(budget=500).build(history, query="¿qué tal?")
+    assert built.sections["recent"] == 1 and "qué tal" not in built.text
+
+
+def test_rag_header_refunded_when_no_chunk_fits():
+    # 7 tokens: l'en-tête RAG (6) passe, aucun extrait ensuite -> en-tête rendu
+    builder = ContextBuilder(budget=20, recent_turns=4, max_item_tokens=300)
+    builder.remaining = 7
+    built = builder.build([], "x" * 400)
+    assert built.sections["rag"] == 0 and RAG_HEADER not in built.text
+    assert builder.remaining == 7
@@ -0,0 +1,36 @@
+"""Main-text extraction on the saved HTML fixtures (python -m pytest tests)"""
+from pathlib import Path
+
+from backend.services.extraction import extract_main_text
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "html"
+
+
+def _extract(name: str) -> str:
+    return extract_main_text((FIXTURES / name).read_bytes())
+
+
+def test_wrapper_with_boilerplate_class_keeps_content():
+    text = _extract("wrapper_has_sidebar.html")
+    assert "auxiliaire avoir" in text
+    assert "verbes pronominaux" in text
+    assert "Accueil" not in text
+
+
+def test_class_words_are_matched_whole():
+    # "canvas", "navy", "unavailable" ne sont pas du boilerplate; "top-menu", "footer-links" si
+    text = _extract("class_false_positives.html")
+    assert "two hundred common verbs" in text
+    assert "Privacy" not in text and "Lessons" not in text
+
+
+def test_inline_wrapper_holding_all_paragraphs():
+    paragraph = "La plupart des verbes forment leur passé composé avec avoir, " * 5
+    body = f"<html><body><div class='page has-sidebar'><p>{paragraph}</p></div></body></html>"
+    assert extract_main_text(body.encode()).startswith("La plupart des verbes")
+
+
+def test_existing_fixtures_still_extract():
+    assert "subjuntivo" in _extract("news_article.html")
+    assert "participe passé" in _extract("wiki_page.html")
+    assert "podcasts" in _extract("blog_no_landmarks.html")
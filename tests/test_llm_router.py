@@ -0,0 +1,78 @@
+"""
+LLM provider routing: fallback order and rate limits surfaced to the API
+"""
+from typing import Dict, List, Optional
+
+import pytest
+
+from backend.agents import language_tutor
+from backend.services.llm_service import (
+    LLMProvider, LLMRateLimitError, LLMResult, LLMRouter, LLMUnavailableError
+)
+
+
+class FakeProvider(LLMProvider):
+    def __init__(self, name: str, error: Optional[Exception] = None):
+        super().__init__()
+        self.name = name
+        self.error = error
+        self.calls = 0
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    def is_configured(self) -> bool:
+        return True
+
+    def complete(self, messages: List[Dict], max_tokens: int, temperature: float) -> LLMResult:
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return LLMResult(text=f"réponse de {self.name}", provider=self.name, model="fake", latency=0.01, ttft=0.01)
+
+
+def make_router(*providers: FakeProvider) -> LLMRouter:
+    router = LLMRouter(["groq"])
+    router.providers = list(providers)
+    return router
+
+
+def test_fallback_serves_when_primary_is_rate_limited():
+    primary = FakeProvider("primary", LLMRateLimitError("429", retry_after=7))
+    backup = FakeProvider("backup")
+    router = make_router(primary, backup)
+
+    assert router.complete([{"role": "user", "content": "hola"}]).provider == "backup"
+    assert not primary.is_healthy()
+    # Fournisseur limité mis de côté: le secours passe en premier
+    assert router.complete([{"role": "user", "content": "hola"}]).provider == "backup"
+    assert primary.calls == 1
+
+
+def test_unreachable_fallback_keeps_the_rate_limit():
+    router = make_router(
+        FakeProvider("primary", LLMRateLimitError("429", retry_after=7)),
+        FakeProvider("backup", LLMUnavailableError("connection refused")),
+    )
+    with pytest.raises(LLMRateLimitError) as raised:
+        router.complete([{"role": "user", "content": "hola"}])
+    assert raised.value.retry_after == 7
+    assert raised.value.retry_after_header == "7"
+
+
+def test_soonest_retry_after_wins():
+    router = make_router(
+        FakeProvider("primary", LLMRateLimitError("429", retry_after=30)),
+        FakeProvider("backup", LLMRateLimitError("429", retry_after=2.5)),
+    )
+    with pytest.raises(LLMRateLimitError) as raised:
+        router.complete([{"role": "user", "content": "hola"}])
+    assert raised.value.retry_after_header == "3"
+
+
+def test_call_llm_raises_rate_limit_instead_of_answering(monkeypatch):
+    router = make_router(FakeProvider("primary", LLMRateLimitError("429", retry_after=4)))
+    monkeypatch.setattr(language_tutor, "llm_router", router)
+    with pytest.raises(LLMRateLimitError):
+        language_tutor.call_llm("hola", "system")
@@ -0,0 +1,175 @@
+"""
+Conversation memory on each storage backend
+
+SQLite toujours; PostgreSQL si DATABASE_URL pointe vers un serveur
+(postgresql+asyncpg://...): chaque test y crée une base jetable, supprimée après.
+"""
+import os
+import uuid
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, String, Text, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from backend.services.memory_service import MemoryService
+from backend.services.memory_store import MIGRATIONS, async_url, create_store
+
+POSTGRES_URL = async_url(os.environ.get("DATABASE_URL", ""))
+if not POSTGRES_URL.startswith("postgresql"):
+    POSTGRES_URL = ""
+
+# Schéma d'avant les migrations (première version de memory_service)
+LegacyBase = declarative_base()
+
+
+class LegacyMessage(LegacyBase):
+    __tablename__ = "messages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(100), index=True)
+    role = Column(String(20))
+    content = Column(Text)
+    language = Column(String(10))
+    timestamp = Column(DateTime)
+
+
+class LegacySession(LegacyBase):
+    __tablename__ = "sessions"
+
+    session_id = Column(String(100), primary_key=True)
+    created_at = Column(DateTime)
+    last_activity = Column(DateTime)
+    message_count = Column(Integer)
+
+
+async def _admin(sql: str):
+    engine = create_async_engine(POSTGRES_URL, isolation_level="AUTOCOMMIT")
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text(sql))
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def database_url(request, tmp_path):
+    if request.param == "sqlite":
+        yield f"sqlite+aiosqlite:///{tmp_path / 'memory.db'}"
+        return
+    if not POSTGRES_URL:
+        pytest.skip("DATABASE_URL PostgreSQL non défini")
+    name = f"walle_test_{uuid.uuid4().hex[:12]}"
+    asyncio.run(_admin(f'CREATE DATABASE "{name}"'))
+    try:
+        yield make_url(POSTGRES_URL).set(database=name).render_as_string(hide_password=False)
+    finally:
+        asyncio.run(_admin(f'DROP DATABASE IF EXISTS "{name}"'))
+
+
+def run(database_url: str, scenario):
+    """Run scenario(service) on a fresh MemoryService for this database"""
+    async def main():
+        service = MemoryService(create_store(database_url))
+        try:
+            await service.start()
+            return await scenario(service)
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+
+def test_migrations_upgrade_legacy_database(database_url):
+    async def create_legacy():
+        engine = create_async_engine(database_url)
+        async with engine.begin() as conn:
+            await conn.run_sync(LegacyBase.metadata.create_all)
+            now = datetime.utcnow()
+            await conn.execute(LegacySession.__table__.insert().values(
+                session_id="legacy", created_at=now, last_activity=now, message_count=1
+            ))
+            await conn.execute(LegacyMessage.__table__.insert().values(
+                session_id="legacy", role="user", content="hola", language="es", timestamp=now
+            ))
+        await engine.dispose()
+
+    asyncio.run(create_legacy())
+
+    async def scenario(service):
+        async with service.store.engine.connect() as conn:
+            versions = (await conn.execute(
+                text("SELECT version FROM schema_migrations ORDER BY version")
+            )).scalars().all()
+            columns = await conn.run_sync(
+                lambda sync: {c["name"] for c in inspect(sync).get_columns("sessions")}
+            )
+        assert versions == [version for version, _, _ in MIGRATIONS]
+        assert {"summary", "summarized_until", "audio_profile"} <= columns
+
+        # Données d'avant la migration toujours lisibles et modifiables
+        assert [m["content"] for m in await service.get_conversation_history("legacy")] == ["hola"]
+        await service.add_message("legacy", "assistant", "¡Hola!")
+        summary, history = await service.get_prompt_context("legacy")
+        assert summary == "" and [m["content"] for m in history] == ["hola", "¡Hola!"]
+
+    run(database_url, scenario)
+    # Deuxième démarrage (autre processus): rien à rejouer
+    run(database_url, lambda service: service.get_conversation_history("legacy"))
+
+
+def test_concurrent_first_messages_create_one_session(database_url):
+    async def scenario(service):
+        await asyncio.gather(*(service.add_message("race", "user", f"m{i}") for i in range(20)))
+        async with service.store.engine.connect() as conn:
+            count = (await conn.execute(
+                text("SELECT message_count FROM sessions WHERE session_id = 'race'")
+            )).scalar_one()
+        assert count == 20
+        assert len(await service.get_conversation_history("race")) == 20
+
+    run(database_url, scenario)
+
+
+def test_history_deltas(database_url):
+    async def scenario(service):
+        for i in range(15):
+            await service.add_message("s1", "user" if i % 2 == 0 else "assistant", f"t{i}")
+        await service.add_message("other", "user", "ailleurs")
+
+        messages, cursor, truncated = await service.get_history_since("s1", None, 10)
+        assert [m["content"] for m in messages] == [f"t{i}" for i in range(5, 15)]
+        assert truncated and cursor == messages[-1]["id"]
+
+        assert await service.get_history_since("s1", cursor, 10) == ([], cursor, False)
+        await service.add_message("s1", "user", "t15")
+        await service.add_message("s1", "assistant", "t16")
+        messages, new_cursor, truncated = await service.get_history_since("s1", cursor, 10)
+        assert [m["content"] for m in messages] == ["t15", "t16"] and not truncated
+        assert new_cursor == messages[-1]["id"]
+
+        # Client trop en retard: seulement les derniers, et le signaler
+        messages, _, truncated = await service.get_history_since("s1", cursor, 1)
+        assert [m["content"] for m in messages] == ["t16"] and truncated
+
+    run(database_url, scenario)
+
+
+def test_delete_session(database_url):
+    async def scenario(service):
+        for i in range(3):
+            await service.add_message("doomed", "user", f"m{i}")
+        await service.add_message("kept", "user", "reste")
+        await service.update_audio_profile(
+            "doomed", {"language": "es", "language_probability": 1.0, "duration": 3.0}, True
+        )
+
+        assert await service.delete_session("doomed") is True
+        assert await service.get_conversation_history("doomed") == []
+        assert await service.get_audio_profile("doomed") == {}
+        assert await service.delete_session("doomed") is False
+        assert [m["content"] for m in await service.get_conversation_history("kept")] == ["reste"]
+
+    run(database_url, scenario)
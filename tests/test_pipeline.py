@@ -0,0 +1,103 @@
+"""
+Per-request stage graph: parallelism, deadlines, defaults and ctx.skip
+"""
+import asyncio
+import time
+
+import pytest
+
+from backend.services.pipeline import Pipeline, PipelineContext, Stage
+
+
+def sleeper(seconds: float, value):
+    async def fn(ctx: PipelineContext):
+        await asyncio.sleep(seconds)
+        return value
+    return fn
+
+
+def test_independent_stages_run_concurrently_and_deps_wait():
+    order = []
+
+    async def combine(ctx: PipelineContext):
+        order.append("combine")
+        return ctx.results["a"] + ctx.results["b"]
+
+    pipeline = Pipeline("test", [
+        Stage("a", sleeper(0.1, 1)),
+        Stage("b", sleeper(0.1, 2)),
+        Stage("sum", combine, deps=("a", "b")),
+    ])
+    started = time.perf_counter()
+    ctx = asyncio.run(pipeline.run(x=1))
+    assert time.perf_counter() - started < 0.18
+    assert ctx.results == {"a": 1, "b": 2, "sum": 3} and ctx.inputs == {"x": 1}
+    assert ctx.status == {"a": "ok", "b": "ok", "sum": "ok"}
+    assert set(ctx.timings) == {"a", "b", "sum", "total"}
+
+
+def test_optional_stage_timeout_and_error_yield_default():
+    async def fail(ctx):
+        raise RuntimeError("boom")
+
+    pipeline = Pipeline("test", [
+        Stage("slow", sleeper(1, "late"), timeout=0.05, optional=True, default=""),
+        Stage("broken", fail, optional=True, default=[]),
+        Stage("after", sleeper(0, "ok"), deps=("slow", "broken")),
+    ])
+    ctx = asyncio.run(pipeline.run())
+    assert ctx.results == {"slow": "", "broken": [], "after": "ok"}
+    assert ctx.status["slow"] == "timeout" and ctx.status["broken"] == "error"
+    assert ctx.timings["slow"] < 500
+
+
+def test_required_stage_failure_fails_the_run_and_cancels_the_rest():
+    cancelled = []
+
+    async def fail(ctx):
+        raise ValueError("required")
+
+    async def long(ctx):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    pipeline = Pipeline("test", [Stage("bad", fail), Stage("long", long)])
+
+    async def main():
+        with pytest.raises(ValueError):
+            await pipeline.run()
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == [True]
+
+
+def test_required_stage_timeout_raises():
+    pipeline = Pipeline("test", [Stage("slow", sleeper(1, None), timeout=0.05)])
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(pipeline.run())
+
+
+def test_skip_cancels_a_stage_that_became_useless():
+    async def cache(ctx: PipelineContext):
+        ctx.skip("rag")
+        return "hit"
+
+    pipeline = Pipeline("test", [
+        Stage("rag", sleeper(1, "context"), default=""),
+        Stage("cache", cache),
+        Stage("llm", sleeper(0, "answer"), deps=("rag", "cache")),
+    ])
+    started = time.perf_counter()
+    ctx = asyncio.run(pipeline.run())
+    assert time.perf_counter() - started < 0.5
+    assert ctx.results == {"rag": "", "cache": "hit", "llm": "answer"}
+    assert ctx.status["rag"] == "skipped"
+
+
+def test_dependencies_must_be_declared_first():
+    with pytest.raises(ValueError):
+        Pipeline("test", [Stage("b", sleeper(0, 1), deps=("a",)), Stage("a", sleeper(0, 1))])
@@ -0,0 +1,111 @@
+"""
+Per-request RAG decision: heuristics, local probe, policy and load shedding
+"""
+import pytest
+
+from backend.config import settings
+from backend.services.rag_gate import RagGate
+
+LOCAL = "El subjuntivo se usa tras verbos de deseo."
+
+
+def probe_returning(similarity: float, context: str = LOCAL):
+    calls = []
+
+    def probe():
+        calls.append(1)
+        return similarity, context
+    probe.calls = calls
+    return probe
+
+
+@pytest.mark.parametrize("query, reason, lookup", [
+    ("¡Hola! ¿Qué tal?", "smalltalk", False),
+    ("Muchas gracias", "smalltalk", False),
+    ("ok ok", "smalltalk", False),
+    ("vale bueno", "too_short", False),
+    ("...", "empty", False),
+    ("¿Cuál es la diferencia entre ser y estar?", None, True),
+    ("Explain the subjunctive", None, True),
+    ("qu'est-ce que le subjonctif", None, True),
+    ("Ayer fui al mercado con mi hermana", None, False),
+])
+def test_classify(query, reason, lookup):
+    assert RagGate.classify(query) == (reason, lookup)
+
+
+def test_heuristic_skip_does_not_probe():
+    probe = probe_returning(0.9)
+    decision, context = RagGate("auto").decide("hola, buenos días", probe)
+    assert (decision.mode, decision.reason, context) == ("skip", "smalltalk", "")
+    assert probe.calls == []
+
+
+def test_decisions_from_probe():
+    gate = RagGate("auto")
+    close = settings.RAG_GATE_LOCAL_SIMILARITY + 0.05
+    middle = (settings.RAG_GATE_LOCAL_SIMILARITY + settings.RAG_GATE_MIN_SIMILARITY) / 2
+    far = settings.RAG_GATE_MIN_SIMILARITY - 0.05
+    statement = "Ayer fui al mercado con mi hermana"
+    question = "¿Cuál es la diferencia entre ser y estar?"
+
+    decision, context = gate.decide(question, probe_returning(close))
+    assert (decision.mode, decision.reason, context) == ("local", "local_hit", LOCAL)
+    assert gate.decide(question, probe_returning(far))[0].mode == "web"
+    assert gate.decide(statement, probe_returning(far))[0].reason == "off_topic"
+    assert gate.decide(statement, probe_returning(middle))[0].reason == "uncertain"
+
+
+def test_policies_bypass_heuristics():
+    probe = probe_returning(0.9)
+    assert RagGate("always").decide("hola", probe)[0].mode == "web"
+    assert RagGate("never").decide("¿Qué es el subjuntivo?", probe)[0].mode == "skip"
+    assert RagGate("bogus").policy == "auto"
+    assert probe.calls == []
+
+
+def test_probe_error_falls_back_to_web_for_lookups():
+    def broken():
+        raise RuntimeError("model server down")
+
+    gate = RagGate("auto")
+    assert gate.decide("¿Cuál es la diferencia entre ser y estar?", broken)[0].mode == "web"
+    assert gate.decide("Ayer fui al mercado con mi hermana", broken)[0].mode == "skip"
+
+
+def test_shedding_uses_local_context_only():
+    gate = RagGate("auto")
+    gate.shedding = True
+    middle = (settings.RAG_GATE_LOCAL_SIMILARITY + settings.RAG_GATE_MIN_SIMILARITY) / 2
+    question = "¿Cuál es la diferencia entre ser y estar?"
+    decision, context = gate.decide(question, probe_returning(middle))
+    assert (decision.mode, decision.reason, context) == ("local", "shed", LOCAL)
+    assert gate.decide(question, probe_returning(0.0, ""))[0].mode == "skip"
+
+
+def test_slo_hysteresis(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_GATE_SLO_P95_MS", 1000)
+    gate = RagGate("auto")
+
+    def feed(seconds: float, n: int):
+        for _ in range(n):
+            gate._p95_checked = 0.0            # pas d'attente d'une seconde entre deux calculs
+            gate.observe(seconds)
+
+    feed(0.5, 19)
+    assert not gate.shedding                   # moins de 20 mesures: pas de décision
+    feed(2.0, 20)
+    assert gate.shedding
+    feed(0.9, gate._latencies.maxlen)          # sous le SLO mais au-dessus de 80 %: reste délesté
+    assert gate.shedding
+    feed(0.5, gate._latencies.maxlen)
+    assert not gate.shedding
+    assert gate.stats()["shedding"] is False
+
+
+def test_slo_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_GATE_SLO_P95_MS", 0)
+    gate = RagGate("auto")
+    for _ in range(50):
+        gate.observe(60.0)
+    assert not gate.shedding and len(gate._latencies) == 0
@@ -0,0 +1,105 @@
+"""
+Request coalescing: one execution per key, shared result, error or cancellation
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.singleflight import SingleFlight, make_key
+
+
+def test_make_key_normalization():
+    assert make_key("¿Qué  es el\tSubjuntivo?", "es") == make_key("¿qué es el subjuntivo?", "es")
+    assert make_key("a", "b") != make_key("a b")
+    # Clé LLM: espaces normalisés, casse conservée
+    assert make_key("Hola  Juan", casefold=False) == make_key("Hola Juan ", casefold=False)
+    assert make_key("Hola Juan", casefold=False) != make_key("hola juan", casefold=False)
+
+
+def test_identical_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+    admitted = []
+
+    def work(x):
+        calls.append(x)
+        time.sleep(0.05)
+        return x * 2
+
+    async def prepare():
+        admitted.append(1)
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", work, 21, prepare=prepare) for _ in range(5)))
+
+    assert asyncio.run(main()) == [42] * 5
+    assert calls == [21] and admitted == [1]
+    assert flight.stats() == {"calls": 5, "executions": 1, "shared": 4, "errors": 0, "timeouts": 0, "in_flight": 0}
+
+
+def test_distinct_keys_and_later_calls_run_again():
+    flight = SingleFlight("test")
+
+    async def main():
+        first = await asyncio.gather(flight.do("a", str.upper, "x"), flight.do("b", str.upper, "y"))
+        again = await flight.do("a", str.upper, "z")
+        return first, again
+
+    assert asyncio.run(main()) == (["X", "Y"], "Z")
+    assert flight.executions == 3
+
+
+def test_error_is_shared_by_all_callers():
+    flight = SingleFlight("test")
+
+    def fail():
+        time.sleep(0.02)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.errors == 1 and flight.stats()["in_flight"] == 0
+
+
+def test_waiter_timeout_does_not_stop_the_shared_run():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def slow():
+        release.wait(2)
+        return "done"
+
+    async def main():
+        patient = asyncio.create_task(flight.do("k", slow, timeout=2))
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("k", slow, timeout=0.05)
+        release.set()
+        return await patient
+
+    assert asyncio.run(main()) == "done"
+    assert flight.timeouts == 1 and flight.executions == 1
+
+
+def test_cancelled_run_releases_waiters():
+    flight = SingleFlight("test")
+
+    async def never():
+        await asyncio.sleep(10)
+
+    async def main():
+        waiters = [asyncio.create_task(flight.do("k", str, prepare=never, timeout=5)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        for task in list(flight._tasks):
+            task.cancel()
+        started = time.monotonic()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(main())
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
+    assert elapsed < 1 and flight.stats()["in_flight"] == 0
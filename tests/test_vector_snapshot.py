@@ -0,0 +1,148 @@
+"""
+Memory-mapped vector snapshot: build, version checks, atomic swap, search
+"""
+import os
+
+import numpy as np
+import pytest
+
+from backend.config import settings
+from backend.services.vector_snapshot import (
+    CURRENT_FILE, SnapshotManager, VectorSnapshot, bump_index_version, read_index_version
+)
+
+MODEL = "test-model"
+
+
+class Collection:
+    """Minimal stand-in for a ChromaDB collection (paged get)"""
+
+    def __init__(self, docs):
+        self.ids = [f"id{i}" for i in range(len(docs))]
+        self.documents = [text for text, _ in docs]
+        self.embeddings = [list(vector) for _, vector in docs]
+        self.pages = 0
+
+    def get(self, include=None, limit=None, offset=0):
+        self.pages += 1
+        end = offset + limit
+        return {"ids": self.ids[offset:end], "documents": self.documents[offset:end],
+                "embeddings": self.embeddings[offset:end]}
+
+
+DOCS = [
+    ("el subjuntivo", (1.0, 0.0, 0.0)),
+    ("ser y estar", (0.0, 2.0, 0.0)),      # non normalisé: le snapshot normalise
+    ("el pretérito ñ", (0.7, 0.7, 0.0)),
+]
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHROMADB_PATH", str(tmp_path / "chroma"))
+    monkeypatch.setattr(settings, "VECTOR_SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(settings, "VECTOR_SNAPSHOT_MIN_INTERVAL_SECONDS", 0.0)
+    os.makedirs(settings.VECTOR_SNAPSHOT_DIR)
+    return SnapshotManager()
+
+
+def test_index_version_counter(manager):
+    assert read_index_version() == 0
+    assert bump_index_version() == 1 and bump_index_version() == 2
+    assert read_index_version() == 2
+
+
+def test_build_and_search(manager):
+    bump_index_version()
+    collection = Collection(DOCS)
+    path = manager.build(collection, MODEL, page_size=2)
+    assert collection.pages == 3                     # 2 + 1 + page vide
+
+    snapshot = manager.open_current()
+    assert snapshot.path == path and snapshot.manifest["count"] == 3 and snapshot.manifest["dim"] == 3
+    assert snapshot.matches(1, MODEL)
+    assert not snapshot.matches(2, MODEL) and not snapshot.matches(1, "other-model")
+    assert [snapshot.document(i) for i in range(3)] == [text for text, _ in DOCS]
+
+    hits = snapshot.search_hits(np.array([0.0, 1.0, 0.0]), 2)
+    assert [(doc, doc_id) for doc, _, doc_id in hits] == [("ser y estar", "id1"), ("el pretérito ñ", "id2")]
+    assert hits[0][1] == pytest.approx(1.0)
+    assert snapshot.search(np.array([1.0, 0.0, 0.0]), 10)[0] == "el subjuntivo"
+    assert snapshot.search_scored(np.array([1.0, 0.0, 0.0]), 0) == []
+    snapshot.close()
+
+
+def test_staleness_follows_the_index_version(manager):
+    assert manager.is_stale() and manager.current_version() is None
+    manager.build(Collection(DOCS), MODEL)
+    assert manager.current_version() == 0 and not manager.is_stale()
+    bump_index_version()
+    assert manager.is_stale()
+
+
+def test_rebuild_swaps_current_and_removes_old(manager):
+    first = manager.build(Collection(DOCS), MODEL)
+    old = manager.open_current()                     # un lecteur garde l'ancien ouvert
+    bump_index_version()
+    second = manager.build(Collection(DOCS[:2]), MODEL)
+
+    assert second != first and not os.path.exists(first)
+    with open(os.path.join(settings.VECTOR_SNAPSHOT_DIR, CURRENT_FILE), encoding="utf-8") as f:
+        assert f.read() == os.path.basename(second)
+    assert manager.open_current().manifest["count"] == 2
+    assert old.document(0) == "el subjuntivo"        # mmap toujours valide (POSIX)
+    old.close()
+    assert not [e for e in os.listdir(settings.VECTOR_SNAPSHOT_DIR) if e.endswith(".tmp")]
+
+
+def test_back_to_back_builds_do_not_collide(manager):
+    paths = {manager.build(Collection(DOCS), MODEL) for _ in range(3)}
+    assert len(paths) == 3 and manager.open_current().manifest["count"] == 3
+
+
+def test_failed_build_keeps_the_current_snapshot(manager):
+    good = manager.build(Collection(DOCS), MODEL)
+
+    class Broken(Collection):
+        def get(self, **kwargs):
+            raise RuntimeError("chroma down")
+
+    bump_index_version()
+    with pytest.raises(RuntimeError):
+        manager.build(Broken(DOCS), MODEL)
+    assert manager.open_current().path == good
+    assert sorted(os.listdir(settings.VECTOR_SNAPSHOT_DIR)) == sorted([CURRENT_FILE, os.path.basename(good)])
+
+
+def test_empty_collection_builds_nothing(manager):
+    assert manager.build(Collection([]), MODEL) is None
+    assert manager.open_current() is None
+    assert os.listdir(settings.VECTOR_SNAPSHOT_DIR) == []
+
+
+def test_snapshot_without_ids_still_searches(manager):
+    path = manager.build(Collection(DOCS), MODEL)
+    os.remove(os.path.join(path, "ids.txt"))        # snapshot d'une version antérieure
+    snapshot = VectorSnapshot(path)
+    assert snapshot.ids is None
+    assert snapshot.search_hits(np.array([1.0, 0.0, 0.0]), 1)[0][2] is None
+    snapshot.close()
+
+
+def test_corrupt_current_is_ignored(manager):
+    with open(os.path.join(settings.VECTOR_SNAPSHOT_DIR, CURRENT_FILE), "w", encoding="utf-8") as f:
+        f.write("snap-missing")
+    assert manager.open_current() is None and manager.current_version() is None
+
+
+def test_schedule_rebuild_is_debounced(manager):
+    calls = []
+
+    def get_collection():
+        calls.append(1)
+        return Collection(DOCS)
+
+    manager.schedule_rebuild(get_collection, MODEL)
+    manager.schedule_rebuild(get_collection, MODEL)  # minuterie déjà active: ignoré
+    manager._timer.join(2)
+    assert calls == [1] and manager.open_current() is not None